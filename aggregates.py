@@ -0,0 +1,315 @@
+"""
+Агрегаты аналитики архива: OVER/UNDER, отклонение и темп по турнирам,
+форматам матча и периодам. OVER/UNDER и отклонение периода - очки за
+период против линии периода, как в /api/periods (match_periods.py).
+
+Таблицы обновляются инкрементально, когда матч завершается: вклад матча
+(analytics_facts) сначала вычитается из сумм, если матч уже учитывался,
+затем добавляется заново. Поэтому повторное завершение матча не
+задваивает статистику.
+
+Полный пересчет: python aggregates.py --rebuild
+"""
+import argparse
+import logging
+import math
+
+import numpy as np
+
+import analytics
+import match_periods
+from config import DATABASE_CONFIG
+from database import ARCHIVE_BASE_SQL, Database, expand_clock_runs
+
+DIMENSIONS = ('tournament', 'format', 'period')
+
+# Гистограммы: ширина корзины и пределы (значения за пределами
+# попадают в крайние корзины)
+HISTOGRAMS = {
+    'deviation': {'width': 5.0, 'min': -50.0, 'max': 50.0},
+    'pace': {'width': 10.0, 'min': 50.0, 'max': 300.0},
+}
+
+
+def histogram_bin(metric, value):
+    """Левая граница корзины гистограммы для значения"""
+    config = HISTOGRAMS[metric]
+    value = min(max(value, config['min']), config['max'] - config['width'])
+    return math.floor(value / config['width']) * config['width']
+
+
+def result_and_deviation(points, total_value):
+    """OVER/UNDER и отклонение очков от тотала (%), как в архиве"""
+    if not points or not total_value:
+        return None, None
+    deviation = (points - total_value) / total_value * 100
+    return ('OVER' if points > total_value else 'UNDER'), deviation
+
+
+def match_facts(db, match_id):
+    """Вклад завершенного матча в группы: [(dimension, key, result, deviation, pace)]"""
+    match = db.conn.execute('''
+        SELECT m.tournament, m.total_match_time,
+               ms_final.total_points, ms_final.total_value
+    ''' + ARCHIVE_BASE_SQL + ' AND m.id = ?', (match_id,)).fetchone()
+
+    # Матч не доигран или не завершен - в аналитику не попадает
+    if not match:
+        return []
+
+    tournament, total_match_time, final_points, final_total = match
+    total_match_time = total_match_time or 40
+
+    history = db.conn.execute('''
+        SELECT timestamp, period, score, total_points, total_value, clock_run
+        FROM match_stats
+        WHERE match_id = ?
+        ORDER BY id ASC
+    ''', (match_id,)).fetchall()
+    history = expand_clock_runs(history, 0)
+
+    if not history:
+        return []
+
+    timestamps, _, total_points, total_values, _ = analytics.chart_series(
+        [(row[0], None, row[3], row[4]) for row in history], total_match_time)
+    pace = analytics.record_pace(
+        analytics.clock_minutes(timestamps), total_points, total_match_time, total_values)
+
+    final_pace = pace[-1] if not np.isnan(pace[-1]) else None
+    result, deviation = result_and_deviation(final_points, final_total)
+
+    facts = [
+        ('tournament', tournament or 'Неизвестно', result, deviation, final_pace),
+        ('format', str(total_match_time), result, deviation, final_pace),
+    ]
+
+    # По периодам: темп матча на последней записи периода, OVER/UNDER и
+    # отклонение - очки за период против линии периода (те же строки, что
+    # в match_periods)
+    last_index_by_period = {}
+    for index, row in enumerate(history):
+        if row[1] is not None:
+            last_index_by_period[str(row[1])] = index
+
+    for row in match_periods.fold_periods(match_id, history):
+        index = last_index_by_period[row[2]]
+        period_pace = pace[index] if not np.isnan(pace[index]) else None
+        points_before, end_points, start_total = row[5], row[9], row[10]
+        line = match_periods.period_line(row[1], start_total, total_match_time)
+        period_result, period_deviation = None, None
+        # Матч найден посреди периода - очки за период неизвестны
+        if points_before is not None and line:
+            points = end_points - points_before
+            period_result = 'OVER' if points > line else 'UNDER'
+            period_deviation = (points - line) / line * 100
+        facts.append(('period', row[2], period_result, period_deviation, period_pace))
+
+    return facts
+
+
+def _apply_facts(conn, facts, sign):
+    """Добавить (sign=1) или вычесть (sign=-1) вклад матча из сумм"""
+    for dimension, key, result, deviation, pace in facts:
+        conn.execute('''
+            INSERT INTO analytics_groups
+                (dimension, key, matches, over_count, under_count,
+                 deviation_sum, deviation_count, pace_sum, pace_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (dimension, key) DO UPDATE SET
+                matches = matches + excluded.matches,
+                over_count = over_count + excluded.over_count,
+                under_count = under_count + excluded.under_count,
+                deviation_sum = deviation_sum + excluded.deviation_sum,
+                deviation_count = deviation_count + excluded.deviation_count,
+                pace_sum = pace_sum + excluded.pace_sum,
+                pace_count = pace_count + excluded.pace_count
+        ''', (
+            dimension, key, sign,
+            sign if result == 'OVER' else 0,
+            sign if result == 'UNDER' else 0,
+            sign * deviation if deviation is not None else 0,
+            sign if deviation is not None else 0,
+            sign * pace if pace is not None else 0,
+            sign if pace is not None else 0
+        ))
+
+        for metric, value in (('deviation', deviation), ('pace', pace)):
+            if value is None:
+                continue
+            conn.execute('''
+                INSERT INTO analytics_histograms (dimension, key, metric, bin, count)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (dimension, key, metric, bin) DO UPDATE SET
+                    count = count + excluded.count
+            ''', (dimension, key, metric, histogram_bin(metric, value), sign))
+
+
+def replace_facts(conn, match_id, new_facts):
+    """Заменить вклад матча в агрегатах новыми фактами (без commit)"""
+    old_facts = conn.execute('''
+        SELECT dimension, key, result, deviation, pace
+        FROM analytics_facts WHERE match_id = ?
+    ''', (match_id,)).fetchall()
+
+    if old_facts:
+        _apply_facts(conn, old_facts, -1)
+        conn.execute('DELETE FROM analytics_facts WHERE match_id = ?', (match_id,))
+
+    if new_facts:
+        _apply_facts(conn, new_facts, 1)
+        conn.executemany('''
+            INSERT INTO analytics_facts
+                (match_id, dimension, key, result, deviation, pace)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(match_id,) + tuple(fact) for fact in new_facts])
+
+
+def update_matches(db, match_ids, commit=True):
+    """Учесть завершенные матчи в агрегатах (повторный вызов безопасен)"""
+    conn = db.conn
+    updated = 0
+
+    try:
+        for match_id in match_ids:
+            new_facts = match_facts(db, match_id)
+            replace_facts(conn, match_id, new_facts)
+            if new_facts:
+                updated += 1
+
+        if commit:
+            conn.commit()
+
+    except Exception as e:
+        conn.rollback()
+        logging.error(f"Ошибка обновления агрегатов аналитики: {e}")
+        return 0
+
+    return updated
+
+
+AGGREGATE_TABLES = ('analytics_facts', 'analytics_groups', 'analytics_histograms')
+
+
+def rebuild(db, batch_size=500):
+    """Полный пересчет агрегатов по всем завершенным матчам.
+
+    Агрегаты собираются во временных таблицах с теми же именами (TEMP
+    перекрывает main для этого соединения), а основные заменяются одной
+    транзакцией в конце - /api/analytics все время отдает прежние данные.
+    """
+    conn = db.conn
+    for table in AGGREGATE_TABLES:
+        ddl = conn.execute(
+            "SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        conn.execute(f'DROP TABLE IF EXISTS temp.{table}')
+        conn.execute(ddl.replace('CREATE TABLE', 'CREATE TEMP TABLE', 1))
+    conn.commit()
+
+    try:
+        match_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM matches WHERE status = 'finished' ORDER BY id")]
+
+        updated = 0
+        for start in range(0, len(match_ids), batch_size):
+            updated += update_matches(db, match_ids[start:start + batch_size])
+            logging.info(
+                f"Пересчет аналитики: {min(start + batch_size, len(match_ids))}/{len(match_ids)}")
+
+        # Замена под блокировкой записи: матчи, завершенные за время
+        # пересчета (их парсер учел в основных таблицах), досчитываются здесь
+        conn.execute('BEGIN IMMEDIATE')
+        counted = set(match_ids)
+        late_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM matches WHERE status = 'finished' ORDER BY id")
+            if row[0] not in counted]
+        # Без update_matches: его rollback при ошибке завершил бы транзакцию,
+        # и замена таблиц прошла бы без блокировки - ошибка откатывает все ниже
+        for match_id in late_ids:
+            new_facts = match_facts(db, match_id)
+            replace_facts(conn, match_id, new_facts)
+            if new_facts:
+                updated += 1
+
+        for table in AGGREGATE_TABLES:
+            conn.execute(f'DELETE FROM main.{table}')
+            conn.execute(f'INSERT INTO main.{table} SELECT * FROM temp.{table}')
+        conn.commit()
+
+    except Exception:
+        conn.rollback()
+        raise
+
+    finally:
+        for table in AGGREGATE_TABLES:
+            conn.execute(f'DROP TABLE IF EXISTS temp.{table}')
+        conn.commit()
+
+    return updated
+
+
+def get_breakdowns(db, dimension=None, min_matches=1):
+    """Готовые разбивки из агрегатных таблиц (без обращения к match_stats)"""
+    dimensions = [dimension] if dimension else list(DIMENSIONS)
+    placeholders = ', '.join('?' for _ in dimensions)
+
+    groups = db.conn.execute(f'''
+        SELECT dimension, key, matches, over_count, under_count,
+               deviation_sum, deviation_count, pace_sum, pace_count
+        FROM analytics_groups
+        WHERE dimension IN ({placeholders}) AND matches >= ?
+        ORDER BY dimension, matches DESC
+    ''', (*dimensions, min_matches)).fetchall()
+
+    histograms = {}
+    for dim, key, metric, bin_start, count in db.conn.execute(f'''
+        SELECT dimension, key, metric, bin, count
+        FROM analytics_histograms
+        WHERE dimension IN ({placeholders}) AND count > 0
+        ORDER BY bin
+    ''', dimensions):
+        histograms.setdefault((dim, key), {}).setdefault(metric, []).append(
+            {'bin': bin_start, 'width': HISTOGRAMS[metric]['width'], 'count': count})
+
+    breakdowns = {dim: [] for dim in dimensions}
+    for (dim, key, matches, over_count, under_count,
+         deviation_sum, deviation_count, pace_sum, pace_count) in groups:
+        decided = over_count + under_count
+        group_histograms = histograms.get((dim, key), {})
+        breakdowns[dim].append({
+            'key': key,
+            'matches': matches,
+            'over_matches': over_count,
+            'under_matches': under_count,
+            'over_percentage': round(over_count / decided * 100, 1) if decided else None,
+            'avg_deviation': round(deviation_sum / deviation_count, 1) if deviation_count else None,
+            'avg_pace': round(pace_sum / pace_count, 1) if pace_count else None,
+            'deviation_histogram': group_histograms.get('deviation', []),
+            'pace_histogram': group_histograms.get('pace', []),
+        })
+
+    return breakdowns
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Агрегаты аналитики архива')
+    parser.add_argument('--rebuild', action='store_true',
+                        help='пересчитать агрегаты по всем завершенным матчам')
+    parser.add_argument('--db', default=DATABASE_CONFIG['DB_PATH'])
+    args = parser.parse_args()
+
+    if args.rebuild:
+        db = Database(args.db)
+        updated = rebuild(db)
+        logging.info(f"Пересчет завершен: учтено матчей {updated}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
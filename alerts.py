@@ -0,0 +1,271 @@
+"""
+Правила оповещений по live-матчам, проверяемые при записи каждого тика.
+
+Правила (alert_rules.json) индексируются по турниру, формату матча и
+периоду, а внутри - по полям записи, от которых зависит метрика. Для
+новой записи матча проверяются только правила его турнира/формата/периода
+(или "любых"), у которых изменилось хотя бы одно поле, поэтому время тика
+почти не зависит от числа правил.
+
+Правило срабатывает, когда условие становится истинным, и не чаще раза в
+cooldown секунд для матча; условие, ставшее истинным во время паузы,
+срабатывает после нее, если еще выполняется. Оповещения сохраняются в таблицу alerts, а
+веб-сервер рассылает их клиентам /ws.
+
+Пример правила:
+    {"id": "q3_pace", "metric": "pace_deviation", "op": ">", "value": 15,
+     "abs": true, "total_match_time": 40, "period": "3"}
+"""
+import itertools
+import json
+import logging
+import operator
+import os
+import time
+from collections import deque
+
+import numpy as np
+
+import analytics
+from database import safe_float, safe_int
+
+# Метрика -> поля записи, при изменении которых она пересчитывается.
+# pace_deviation - отклонение темпа от текущего тотала, % (меняется и
+# со временем матча без очков); total_move - изменение тотала за
+# window_seconds; score_diff - П1 минус П2
+METRICS = {
+    'pace_deviation': ('time', 'total_points', 'total_value'),
+    'total_move': ('total_value',),
+    'total_value': ('total_value',),
+    'total_points': ('total_points',),
+    'score_diff': ('score',),
+}
+
+OPERATORS = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+# Правило без условия на турнир/формат/период
+ANY = '*'
+
+
+class AlertRule:
+    __slots__ = ('id', 'metric', 'op', 'value', 'use_abs', 'tournament',
+                 'total_match_time', 'period', 'window', 'cooldown', 'message')
+
+    def __init__(self, spec, default_cooldown=300):
+        self.id = str(spec['id'])
+        self.metric = spec['metric']
+        if self.metric not in METRICS:
+            raise ValueError(f"неизвестная метрика: {self.metric}")
+        self.op = spec.get('op', '>')
+        if self.op not in OPERATORS:
+            raise ValueError(f"неизвестное сравнение: {self.op}")
+        self.value = float(spec['value'])
+        self.use_abs = bool(spec.get('abs', False))
+        self.tournament = spec.get('tournament') or ANY
+        self.total_match_time = int(spec['total_match_time']) if spec.get('total_match_time') else ANY
+        self.period = str(spec['period']) if spec.get('period') is not None else ANY
+        self.window = float(spec.get('window_seconds', 120))
+        self.cooldown = float(spec.get('cooldown', default_cooldown))
+        self.message = spec.get('message')
+
+    def check(self, value):
+        if value is None:
+            return False
+        return OPERATORS[self.op](abs(value) if self.use_abs else value, self.value)
+
+
+def load_rules(path, default_cooldown=300):
+    """Правила из JSON-файла (список); ошибочные правила пропускаются"""
+    with open(path, encoding='utf-8') as f:
+        specs = json.load(f)
+
+    rules = []
+    for spec in specs:
+        try:
+            rules.append(AlertRule(spec, default_cooldown))
+        except (KeyError, TypeError, ValueError) as e:
+            logging.error(f"Ошибка в правиле оповещения {spec}: {e}")
+    return rules
+
+
+class MatchState:
+    """Последние значения матча и состояние его правил"""
+
+    __slots__ = ('values', 'totals', 'active', 'fired_at')
+
+    def __init__(self):
+        self.values = {}
+        # (время, тотал) за окно самого длинного правила total_move
+        self.totals = deque()
+        # Правила, условие которых сейчас истинно
+        self.active = set()
+        self.fired_at = {}
+
+
+class AlertEngine:
+    def __init__(self, rules=(), rules_file=None, default_cooldown=300):
+        self.rules_file = rules_file
+        self.default_cooldown = default_cooldown
+        self.rules_mtime = None
+        # {(турнир, формат, период): {поле: [правила]}}
+        self.index = {}
+        self.max_window = 0.0
+        self.rules_count = 0
+        self.matches = {}
+        self.set_rules(rules)
+        if rules_file:
+            self.reload_if_changed()
+
+    def set_rules(self, rules):
+        index = {}
+        for rule in rules:
+            fields = index.setdefault(
+                (rule.tournament, rule.total_match_time, rule.period), {})
+            for field in METRICS[rule.metric]:
+                fields.setdefault(field, []).append(rule)
+        self.index = index
+        self.rules_count = len(rules)
+        self.max_window = max(
+            (rule.window for rule in rules if rule.metric == 'total_move'), default=0.0)
+
+    def reload_if_changed(self):
+        """Перечитать файл правил, если он изменился (вызывается раз в тик)"""
+        try:
+            mtime = os.path.getmtime(self.rules_file)
+        except OSError:
+            mtime = None
+        if mtime == self.rules_mtime:
+            return
+        self.rules_mtime = mtime
+        if mtime is None:
+            self.set_rules([])
+            return
+        try:
+            self.set_rules(load_rules(self.rules_file, self.default_cooldown))
+            logging.info(f"Загружено правил оповещений: {self.rules_count}")
+        except (OSError, ValueError) as e:
+            logging.error(f"Ошибка загрузки правил оповещений: {e}")
+
+    def forget(self, match_ids):
+        """Удалить состояние завершенных матчей"""
+        for match_id in match_ids:
+            self.matches.pop(match_id, None)
+
+    def evaluate(self, match_id, match_data, now=None):
+        """Новая запись матча (данные парсера); возвращает сработавшие оповещения"""
+        now = time.time() if now is None else now
+        state = self.matches.get(match_id)
+        if state is None:
+            state = self.matches[match_id] = MatchState()
+
+        # Прочерк (нет значения) не считается изменением
+        values = {
+            'total_points': safe_int(match_data.get('total_points'), None),
+            'total_value': safe_float(match_data.get('total')),
+            'score': match_data.get('score') if match_data.get('score') != '-' else None,
+            'time': match_data.get('time') if match_data.get('time') != '-' else None,
+        }
+        changed = [field for field, value in values.items()
+                   if value is not None and value != state.values.get(field)]
+        for field in changed:
+            state.values[field] = values[field]
+
+        if 'total_value' in changed and self.max_window:
+            state.totals.append((now, values['total_value']))
+        # Последнее изменение до начала окна остается: это тотал,
+        # действовавший на начало окна
+        while len(state.totals) > 1 and state.totals[1][0] <= now - self.max_window:
+            state.totals.popleft()
+
+        if not changed or not self.index:
+            return []
+
+        total_match_time = safe_int(match_data.get('total_match_time'), 40)
+        period = str(match_data.get('period'))
+        candidates = {}
+        for key in itertools.product((match_data.get('tournament'), ANY),
+                                     (total_match_time, ANY), (period, ANY)):
+            fields = self.index.get(key)
+            if not fields:
+                continue
+            for field in changed:
+                for rule in fields.get(field, ()):
+                    candidates[rule.id] = rule
+
+        alerts = []
+        metric_values = {}
+        for rule in candidates.values():
+            if rule.metric == 'total_move':
+                value = self._total_move(state, now, rule.window)
+            else:
+                if rule.metric not in metric_values:
+                    metric_values[rule.metric] = self._metric(
+                        rule.metric, state, match_data, total_match_time)
+                value = metric_values[rule.metric]
+
+            if not rule.check(value):
+                state.active.discard(rule.id)
+                continue
+            if rule.id in state.active:
+                continue
+            # Во время паузы правило не активно - сработает после нее
+            if now - state.fired_at.get(rule.id, float('-inf')) < rule.cooldown:
+                continue
+            state.active.add(rule.id)
+            state.fired_at[rule.id] = now
+            alerts.append(self._alert(rule, match_id, match_data, period, value))
+
+        return alerts
+
+    def _metric(self, metric, state, match_data, total_match_time):
+        if metric == 'total_value':
+            return state.values.get('total_value')
+        if metric == 'total_points':
+            return state.values.get('total_points')
+        if metric == 'score_diff':
+            parts = (state.values.get('score') or '').split(':')
+            if len(parts) != 2:
+                return None
+            return safe_int(parts[0]) - safe_int(parts[1])
+
+        # pace_deviation - как в live-таблице
+        points = state.values.get('total_points')
+        total_value = state.values.get('total_value')
+        if points is None or total_value is None:
+            return None
+        _, deviation = analytics.live_pace(
+            [analytics.clock_to_minutes(match_data.get('time'))], [points],
+            total_match_time, [total_value])
+        return None if np.isnan(deviation[0]) else float(deviation[0])
+
+    @staticmethod
+    def _total_move(state, now, window):
+        """Наибольшее по модулю изменение тотала за окно (со знаком):
+        к значениям, установленным в окне, и к действовавшему на его начало"""
+        current = state.values.get('total_value')
+        if current is None:
+            return None
+        start = now - window
+        values = [value for at, value in state.totals if at > start]
+        # Тотал на начало окна - последнее изменение не позже start
+        before = [value for at, value in state.totals if at <= start]
+        if before:
+            values.append(before[-1])
+        return max((current - value for value in values), key=abs, default=0.0)
+
+    @staticmethod
+    def _alert(rule, match_id, match_data, period, value):
+        value = round(value, 2)
+        message = rule.message or (
+            f"{match_data.get('teams')}: {rule.metric} = {value} "
+            f"({rule.op} {rule.value:g})")
+        return {
+            'rule_id': rule.id,
+            'match_id': match_id,
+            'metric': rule.metric,
+            'value': value,
+            'threshold': rule.value,
+            'period': period,
+            'match_time': match_data.get('time'),
+            'message': message,
+        }
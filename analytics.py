@@ -0,0 +1,292 @@
+"""
+Векторные расчеты темпа и прогнозов (NumPy) по целой истории матча
+или по набору матчей сразу
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from database import safe_int
+
+# Пределы разумного темпа для баскетбола
+MIN_PACE = 50.0
+MAX_PACE = 300.0
+# Темп не может превышать тотал более чем на 50%
+MAX_PACE_TO_TOTAL = 1.5
+# Длительность овертайма (минуты)
+OVERTIME_MINUTES = 5
+
+
+@lru_cache(maxsize=8192)
+def clock_to_minutes(timestamp):
+    """Время матча "MM:SS" в минутах (NaN, если время не распознано)"""
+    if not timestamp or timestamp == '-' or ':' not in timestamp:
+        return np.nan
+
+    time_parts = timestamp.split(':')
+    minutes_elapsed = safe_int(time_parts[0])
+    seconds_elapsed = safe_int(time_parts[1]) if len(time_parts) > 1 else 0
+    return minutes_elapsed + (seconds_elapsed / 60)
+
+
+def clock_minutes(timestamps):
+    """Массив минут для списка временных меток"""
+    return np.fromiter(
+        (clock_to_minutes(timestamp) for timestamp in timestamps),
+        dtype=float, count=len(timestamps))
+
+
+def as_float_array(values):
+    """Массив float, None превращается в NaN"""
+    return np.array([np.nan if value is None else value for value in values],
+                    dtype=float)
+
+
+def record_pace(minutes, points, total_match_time, total_values):
+    """Темп для каждой записи истории (как в графике матча).
+
+    Если темп выше 150% тотала, возвращается 150% тотала без
+    дополнительного ограничения, иначе темп зажимается в [50, 300].
+    NaN - темп не определен.
+    """
+    minutes = np.asarray(minutes, dtype=float)
+    points = np.asarray(points, dtype=float)
+    total_values = np.asarray(total_values, dtype=float)
+
+    valid = (points != 0) & (minutes > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pace = points * total_match_time / minutes
+
+    max_allowed_pace = total_values * MAX_PACE_TO_TOTAL
+    capped = (total_values > 0) & (pace > max_allowed_pace)
+    pace = np.where(capped, max_allowed_pace, np.clip(pace, MIN_PACE, MAX_PACE))
+    return np.where(valid, pace, np.nan)
+
+
+def live_pace(minutes, points, total_match_time, total_values):
+    """Темп и отклонение от тотала для live-таблицы.
+
+    В отличие от record_pace ограничение по тоталу применяется до
+    зажима в [50, 300]. Возвращает (pace, deviation), NaN - нет значения.
+    """
+    minutes = np.asarray(minutes, dtype=float)
+    points = np.asarray(points, dtype=float)
+    total_values = np.asarray(total_values, dtype=float)
+
+    valid = (points != 0) & (minutes > 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pace = points * total_match_time / minutes
+
+        max_allowed_pace = total_values * MAX_PACE_TO_TOTAL
+        capped = (total_values > 0) & (pace > max_allowed_pace)
+        pace = np.clip(np.where(capped, max_allowed_pace, pace),
+                       MIN_PACE, MAX_PACE)
+
+        has_total = ~np.isnan(total_values) & (total_values != 0)
+        deviation = np.where(
+            has_total, (pace - total_values) / total_values * 100, np.nan)
+
+    pace = np.where(valid, pace, np.nan)
+    deviation = np.where(valid, deviation, np.nan)
+    return pace, deviation
+
+
+def period_minutes(total_match_time):
+    """Длина основного периода: 12 минут для 4x12, иначе 10 (4x10, 2x10)"""
+    return 12 if total_match_time == 48 else 10
+
+
+def period_numbers(minutes, total_match_time):
+    """Номер периода для каждой точки: 1-4, 5+ - овертаймы (OT1, OT2...)"""
+    period_length = period_minutes(total_match_time)
+    seconds = np.nan_to_num(np.asarray(minutes, dtype=float)) * 60
+    period_ends = np.arange(1, 5) * period_length * 60
+
+    periods = np.searchsorted(period_ends, seconds, side='left') + 1
+    overtime = seconds > period_ends[-1]
+    ot_number = (seconds - period_ends[-1]) // (OVERTIME_MINUTES * 60) + 1
+    return np.where(overtime, 4 + ot_number, periods).astype(int)
+
+
+def period_boundaries(minutes, total_match_time):
+    """Индексы точек, с которых начинается новый период"""
+    periods = period_numbers(minutes, total_match_time)
+    if len(periods) == 0:
+        return np.array([], dtype=int)
+    return np.concatenate(([0], np.flatnonzero(np.diff(periods)) + 1))
+
+
+def rounded_list(values, digits=1):
+    """Список округленных значений, NaN превращается в None"""
+    return [None if value != value else round(value, digits)
+            for value in np.asarray(values, dtype=float).tolist()]
+
+
+def chart_series(records, total_match_time):
+    """Серии графика из строк (timestamp, score, total_points, total_value)"""
+    timestamps = [record[0] if record[0] else '0:00' for record in records]
+    scores = [record[1] if record[1] else '-' for record in records]
+    total_points = [record[2] if record[2] is not None else 0
+                    for record in records]
+    total_values = [record[3] if record[3] is not None else 0
+                    for record in records]
+
+    pace = record_pace(
+        clock_minutes(timestamps), total_points, total_match_time, total_values)
+
+    return timestamps, scores, total_points, total_values, rounded_list(pace)
+
+
+def live_pace_batch(current_times, scores, total_points, total_match_times, total_values):
+    """Темп и аналитика для live-матчей по столбцам (формат /api/matches).
+
+    Возвращает для каждого матча (current_pace, total_deviation,
+    minutes_elapsed) или None, если темп не посчитан.
+    """
+    if not current_times:
+        return []
+
+    minutes = np.array([
+        np.nan if score == '-' else clock_to_minutes(current_time)
+        for current_time, score in zip(current_times, scores)
+    ], dtype=float)
+    points = as_float_array(total_points)
+    total_match_time = as_float_array(total_match_times)
+    total_values = as_float_array(total_values)
+
+    pace, deviation = live_pace(minutes, points, total_match_time, total_values)
+
+    results = []
+    for current_pace, total_deviation, minutes_elapsed in zip(
+            pace.tolist(), deviation.tolist(), minutes.tolist()):
+        if current_pace != current_pace:
+            results.append(None)
+            continue
+
+        results.append((
+            round(current_pace, 1),
+            round(total_deviation, 1)
+            if total_deviation == total_deviation and total_deviation else None,
+            round(minutes_elapsed, 1),
+        ))
+
+    return results
+
+
+def archive_deviations(final_points, final_totals):
+    """Отклонение финального счета от тотала (%), NaN - нет данных"""
+    final_points = as_float_array(final_points)
+    final_totals = as_float_array(final_totals)
+
+    valid = (np.nan_to_num(final_points) != 0) & (np.nan_to_num(final_totals) != 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        deviation = (final_points - final_totals) / final_totals * 100
+    return np.where(valid, deviation, np.nan)
+
+
+def _lttb_segment(x, y, start, end, n_out):
+    """LTTB внутри отрезка [start, end]: концы сохраняются, внутри n_out точек.
+
+    y - матрица (точки x серии), серии уже нормированы.
+    """
+    inner = end - start - 1
+    if n_out >= inner:
+        return list(range(start + 1, end))
+    if n_out <= 0:
+        return []
+
+    selected = []
+    edges = np.linspace(start + 1, end, n_out + 1).astype(int)
+    previous = start
+    for bucket in range(n_out):
+        lo, hi = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+        # Опорная точка - среднее следующей корзины (или конец отрезка)
+        if bucket + 1 < n_out:
+            next_lo, next_hi = edges[bucket + 1], max(edges[bucket + 2], edges[bucket + 1] + 1)
+            anchor_x = x[next_lo:next_hi].mean()
+            anchor_y = y[next_lo:next_hi].mean(axis=0)
+        else:
+            anchor_x, anchor_y = x[end], y[end]
+
+        # Площадь треугольника (предыдущая, кандидат, опорная) по всем сериям
+        area = np.abs(
+            (x[previous] - anchor_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi, None]) * (anchor_y - y[previous])
+        ).sum(axis=1)
+        previous = lo + int(np.argmax(area))
+        selected.append(previous)
+
+    return selected
+
+
+def downsample_indices(minutes, series, max_points, keep=()):
+    """Индексы точек после прореживания Largest-Triangle-Three-Buckets.
+
+    minutes - ось X, series - список серий одинаковой длины (очки, тотал,
+    темп), keep - индексы, которые сохраняются всегда (границы периодов,
+    изменения счета). Если keep вместе с крайними точками не меньше
+    max_points, возвращаются только они - тогда точек больше max_points.
+    """
+    count = len(minutes)
+    if max_points is None or count <= max_points:
+        return np.arange(count)
+
+    # Ось X без пропусков: нераспознанное время берем от предыдущей точки
+    x = np.fmax.accumulate(np.nan_to_num(np.asarray(minutes, dtype=float), nan=0.0))
+
+    # Серии нормируются по размаху, чтобы ни одна не доминировала в площади
+    columns = []
+    for values in series:
+        values = np.nan_to_num(np.asarray(values, dtype=float), nan=0.0)
+        spread = values.max() - values.min()
+        columns.append((values - values.min()) / spread if spread else values * 0)
+    y = np.column_stack(columns)
+
+    anchors = np.unique(np.concatenate(([0, count - 1], np.asarray(keep, dtype=int))))
+    anchors = anchors[(anchors >= 0) & (anchors < count)]
+    if len(anchors) >= max_points:
+        return anchors
+
+    # Оставшийся бюджет распределяется по отрезкам между опорными точками
+    budget = max_points - len(anchors)
+    gaps = np.diff(anchors) - 1
+    allocation = np.floor(gaps / max(gaps.sum(), 1) * budget).astype(int)
+
+    selected = [anchors[:1]]
+    for index in range(len(anchors) - 1):
+        start, end = anchors[index], anchors[index + 1]
+        selected.append(np.array(
+            _lttb_segment(x, y, start, end, allocation[index]), dtype=int))
+        selected.append(anchors[index + 1:index + 2])
+
+    return np.concatenate(selected)
+
+
+def chart_keep_indices(minutes, total_points, total_match_time):
+    """Обязательные точки графика: границы периодов (с точкой перед каждой)
+    и изменения счета. Их число ограничено числом результативных атак
+    матча, поэтому они сохраняются всегда, даже сверх max_points.
+    """
+    boundaries = period_boundaries(minutes, total_match_time)
+    boundaries = np.unique(np.concatenate((boundaries, np.maximum(boundaries - 1, 0))))
+
+    points = np.asarray(total_points, dtype=float)
+    score_changes = np.flatnonzero(np.diff(points)) + 1
+    return np.union1d(boundaries, score_changes)
+
+
+def downsample_chart(timestamps, scores, total_points, total_values, pace_data,
+                     total_match_time, max_points):
+    """Прореживание серий графика до max_points с сохранением формы
+    (границы периодов и изменения счета остаются всегда)"""
+    if max_points is None or len(timestamps) <= max_points:
+        return timestamps, scores, total_points, total_values, pace_data
+
+    minutes = clock_minutes(timestamps)
+    keep = chart_keep_indices(minutes, total_points, total_match_time)
+    indices = downsample_indices(
+        minutes, [total_points, total_values, as_float_array(pace_data)],
+        max_points, keep).tolist()
+
+    return tuple([values[index] for index in indices] for values in
+                 (timestamps, scores, total_points, total_values, pace_data))
@@ -2,10 +2,17 @@
 """
 Главный модуль приложения
 """
+import signal
 import time
 import logging
+import aggregates
+import metrics
+import tracing
+from alerts import AlertEngine
 from basketball_parser import BasketballParser
+from config import ALERT_CONFIG, IPC_CONFIG, METRICS_CONFIG, TRACE_CONFIG
 from database import Database
+from notifications import TickPublisher
 
 # Настройка логирования
 logging.basicConfig(
@@ -18,7 +25,27 @@ class BasketballApp:
     def __init__(self):
         self.parser = BasketballParser()
         self.db = Database()
+        self.publisher = None
+        if IPC_CONFIG['ENABLED']:
+            self.publisher = TickPublisher(IPC_CONFIG['HOST'], IPC_CONFIG['PORT'])
         self.is_running = False
+        self.alert_engine = None
+        if ALERT_CONFIG['ENABLED']:
+            self.alert_engine = AlertEngine(
+                rules_file=ALERT_CONFIG['RULES_FILE'],
+                default_cooldown=ALERT_CONFIG['DEFAULT_COOLDOWN'])
+
+        self.trace_log = None
+        if TRACE_CONFIG['ENABLED']:
+            self.trace_log = tracing.SlowTraceLog(
+                TRACE_CONFIG['PARSER_TRACE_FILE'], TRACE_CONFIG['TICK_BUDGET'],
+                TRACE_CONFIG['MAX_BYTES'], TRACE_CONFIG['BACKUP_COUNT'])
+        self.profiler = tracing.Profiler(
+            TRACE_CONFIG['PROFILE_DIR'], 'parser', TRACE_CONFIG['PROFILE_REQUEST_FILE'])
+        # На Windows SIGUSR1 нет - там профиль запрашивается через веб-сервер
+        if hasattr(signal, 'SIGUSR1'):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.profiler.request(
+                TRACE_CONFIG['PROFILE_TICKS']))
 
     def start(self):
         """Запуск приложения"""
@@ -47,6 +74,8 @@ class BasketballApp:
         self.parser.close_driver()
         if hasattr(self.db, 'conn'):
             self.db.conn.close()
+        if self.publisher:
+            self.publisher.close()
         logging.info("Парсер остановлен")
 
     def _main_loop(self):
@@ -55,24 +84,14 @@ class BasketballApp:
 
         while self.is_running:
             try:
-                # Парсим матчи
-                matches = self.parser.parse_matches()
-                logging.info(
-                    f"Обновление #{update_count}: найдено {len(matches)} матчей")
+                self.profiler.poll_request_file()
+                with self.profiler.tick(), tracing.trace(
+                        'tick', 'parser', self.trace_log, tick=update_count) as tick:
+                    saved_count = self._run_tick(update_count)
+                    tick.attrs['saved'] = saved_count
 
-                # Собираем список текущих матчей для синхронизации
-                current_teams = [match['teams'] for match in matches]
-
-                # Синхронизируем статусы
-                self.db.sync_match_statuses(current_teams)
-
-                # Сохраняем в БД
-                saved_count = 0
-                for match in matches:
-                    success, match_type, timestamp_type = self.db.save_match_data(
-                        match)
-                    if success:
-                        saved_count += 1
+                metrics.observe('tick_seconds', tick.duration, stage='total')
+                self._export_metrics()
 
                 logging.info(f"Сохранено матчей: {saved_count}")
                 update_count += 1
@@ -82,6 +101,67 @@ class BasketballApp:
                 logging.error(f"Ошибка в основном цикле: {e}")
                 time.sleep(5)
 
+    def _run_tick(self, update_count):
+        """Один тик: парсинг, синхронизация статусов, запись, уведомление"""
+        # Парсим матчи
+        with tracing.span('parse', metric='tick_seconds'):
+            matches = self.parser.parse_matches()
+        logging.info(
+            f"Обновление #{update_count}: найдено {len(matches)} матчей")
+
+        # Собираем список текущих матчей для синхронизации
+        current_teams = [match['teams'] for match in matches]
+
+        # Синхронизируем статусы
+        with tracing.span('sync', metric='tick_seconds'):
+            changed_ids = self.db.sync_match_statuses(current_teams)
+
+        # Завершенные матчи сразу учитываем в агрегатах аналитики
+        if changed_ids:
+            with tracing.span('aggregates', metric='tick_seconds',
+                              matches=len(changed_ids)):
+                aggregates.update_matches(self.db, changed_ids)
+            if self.alert_engine:
+                self.alert_engine.forget(changed_ids)
+
+        if self.alert_engine:
+            self.alert_engine.reload_if_changed()
+
+        # Сохраняем в БД; правила оповещений проверяем по каждой новой записи
+        saved_count = 0
+        fired_alerts = []
+        with tracing.span('save', metric='tick_seconds', matches=len(matches)):
+            for match in matches:
+                success, match_type, timestamp_type, match_id = self.db.save_match_data(
+                    match)
+                if success:
+                    saved_count += 1
+                if timestamp_type == 'new_timestamp':
+                    changed_ids.append(match_id)
+                    if self.alert_engine:
+                        fired_alerts.extend(self.alert_engine.evaluate(match_id, match))
+
+        if fired_alerts:
+            with tracing.span('alerts', metric='tick_seconds', alerts=len(fired_alerts)):
+                self.db.save_alerts(fired_alerts)
+            metrics.inc('alerts_fired_total', len(fired_alerts))
+
+        # Сообщаем веб-серверу, что тик записан
+        if self.publisher:
+            with tracing.span('publish'):
+                self.publisher.publish(changed_ids)
+
+        return saved_count
+
+    def _export_metrics(self):
+        """Снимок метрик парсера для /metrics веб-сервера"""
+        if not METRICS_CONFIG['ENABLED']:
+            return
+        try:
+            metrics.REGISTRY.write_snapshot(METRICS_CONFIG['PARSER_METRICS_FILE'])
+        except OSError as e:
+            logging.debug(f"Не удалось сохранить метрики парсера: {e}")
+
 
 def main():
     app = BasketballApp()
@@ -3,6 +3,7 @@
 Простой парсер матчей
 """
 import logging
+import os
 import time
 
 from selenium import webdriver
@@ -12,6 +13,7 @@ from selenium.webdriver.support.ui import WebDriverWait
 
 from config import (BROWSER_CONFIG, MATCH_TIME_CONFIG, PARSER_CONFIG,
                     SITE_CONFIG, MATCH_FILTERS)
+import metrics
 
 
 class BasketballParser:
@@ -24,6 +26,17 @@ class BasketballParser:
         """Настройка браузера"""
         options = webdriver.ChromeOptions()
 
+        # Уже запущенный Chrome: параметры запуска задает он сам
+        if BROWSER_CONFIG.get('DEBUGGER_ADDRESS'):
+            options.debugger_address = BROWSER_CONFIG['DEBUGGER_ADDRESS']
+            self.driver = webdriver.Chrome(options=options)
+            self.wait = WebDriverWait(
+                self.driver, PARSER_CONFIG['PAGE_LOAD_TIMEOUT'])
+            self._setup_lean_mode()
+            logging.info(
+                f"Подключение к запущенному Chrome: {BROWSER_CONFIG['DEBUGGER_ADDRESS']}")
+            return
+
         if BROWSER_CONFIG['HEADLESS']:
             options.add_argument('--headless')
 
@@ -40,19 +53,54 @@ class BasketballParser:
             options.add_experimental_option(
                 'excludeSwitches', ['enable-logging'])
 
+        if BROWSER_CONFIG.get('PROFILE_DIR'):
+            options.add_argument(
+                f"--user-data-dir={os.path.abspath(BROWSER_CONFIG['PROFILE_DIR'])}")
+        if BROWSER_CONFIG.get('CACHE_DIR'):
+            options.add_argument(
+                f"--disk-cache-dir={os.path.abspath(BROWSER_CONFIG['CACHE_DIR'])}")
+
+        if BROWSER_CONFIG.get('LEAN_MODE'):
+            # Картинки отключаются и настройкой, и блокировкой запросов
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_experimental_option('prefs', {
+                'profile.managed_default_content_settings.images': 2,
+            })
+
         self.driver = webdriver.Chrome(options=options)
         self.wait = WebDriverWait(
             self.driver, PARSER_CONFIG['PAGE_LOAD_TIMEOUT'])
+        self._setup_lean_mode()
+
+    def _setup_lean_mode(self):
+        """Блокировка тяжелых и сторонних ресурсов через CDP"""
+        if not BROWSER_CONFIG.get('LEAN_MODE'):
+            return
+        try:
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {
+                'urls': BROWSER_CONFIG['BLOCKED_URL_PATTERNS']
+            })
+        except Exception as e:
+            logging.warning(f"Не удалось включить блокировку ресурсов: {e}")
 
     def close_driver(self):
         """Закрытие браузера"""
-        if self.driver:
+        if not self.driver:
+            return
+        if BROWSER_CONFIG.get('DEBUGGER_ADDRESS'):
+            # Чужой Chrome не закрываем - останавливаем только chromedriver
+            self.driver.service.stop()
+        else:
             self.driver.quit()
 
     def load_page(self):
         """Загрузка страницы"""
         try:
-            self.driver.get(SITE_CONFIG['URL'])
+            # В запущенном Chrome страница уже может быть открыта
+            if not (BROWSER_CONFIG.get('DEBUGGER_ADDRESS')
+                    and self.driver.current_url.startswith(SITE_CONFIG['URL'])):
+                self.driver.get(SITE_CONFIG['URL'])
             self.wait.until(
                 EC.presence_of_element_located(
                     (By.CSS_SELECTOR, SITE_CONFIG['MATCH_CONTAINER']))
@@ -76,8 +124,13 @@ class BasketballParser:
                 if match_data and self._is_tournament_allowed(match_data):
                     parsed_data.append(match_data)
                 elif match_data:
+                    metrics.inc('matches_skipped_total', reason='filter')
                     logging.debug(
                         f"Пропущен матч из запрещенного турнира: {match_data['teams']}")
+                else:
+                    metrics.inc('matches_skipped_total', reason='invalid')
+
+            metrics.inc('matches_parsed_total', len(parsed_data))
 
             return parsed_data
 
@@ -210,6 +263,7 @@ class BasketballParser:
             logging.debug(f"Ошибка определения времени матча: {e}")
             return MATCH_TIME_CONFIG['DEFAULT_TIME']
 
+    @metrics.timed('find_tournament_seconds')
     def _find_tournament(self, match_element):
         """Поиск названия турнира для конкретного матча"""
         try:
@@ -0,0 +1,232 @@
+"""
+Бенчмарк запросов к БД на синтетических данных разного масштаба.
+
+Для каждого масштаба база генерируется один раз (synthetic_data.py) и
+кэшируется в --data-dir; изменяющие базу замеры идут на копии. Результат -
+JSON с медианой/p95 по каждой операции, его удобно сравнивать между
+коммитами.
+
+Пример:
+    python benchmark_db.py --scales 1000,10000 --output bench.json
+    python benchmark_db.py --compare old.json new.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import time
+from datetime import datetime
+
+import synthetic_data
+from database import Database
+
+# Замедление относительно базового прогона, после которого операция
+# считается регрессией (--compare)
+REGRESSION_THRESHOLD = 1.2
+
+
+def measure(func, repeat, setup=None):
+    """Статистика времени вызова func (миллисекунды)"""
+    durations = []
+    for index in range(repeat):
+        args = setup(index) if setup else ()
+        started = time.perf_counter()
+        func(*args)
+        durations.append((time.perf_counter() - started) * 1000)
+
+    durations.sort()
+    return {
+        'repeat': repeat,
+        'min_ms': round(durations[0], 4),
+        'median_ms': round(durations[len(durations) // 2], 4),
+        'p95_ms': round(durations[min(int(len(durations) * 0.95), len(durations) - 1)], 4),
+        'mean_ms': round(sum(durations) / len(durations), 4),
+    }
+
+
+def prepare_database(data_dir, matches, ticks, seed):
+    """Путь к базе заданного масштаба (генерируется при первом запуске)"""
+    os.makedirs(data_dir, exist_ok=True)
+    path = os.path.join(data_dir, f"bench_{matches}_{ticks}_{seed}.db")
+    if not os.path.exists(path):
+        logging.info(f"Генерация базы: {matches} матчей по {ticks} записей")
+        tmp_path = path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        synthetic_data.generate(tmp_path, matches, ticks, seed=seed)
+        os.replace(tmp_path, path)
+    return path
+
+
+def run_scale(path, repeat, seed):
+    """Замеры всех операций на копии базы path"""
+    work_path = path + '.work'
+    shutil.copyfile(path, work_path)
+    rng = random.Random(seed)
+
+    try:
+        db = Database(work_path)
+        conn = db.conn
+
+        finished_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM matches WHERE status = 'finished' ORDER BY id")]
+        active = conn.execute('''
+            SELECT id, teams, tournament, total_match_time FROM matches
+            WHERE status = 'active' AND updated_at > datetime('now', '-30 minutes')
+        ''').fetchall()
+        active_teams = [row[1] for row in active]
+        sample_ids = [rng.choice(finished_ids) for _ in range(repeat)] if finished_ids else []
+        sample_team = rng.choice(active_teams or ['Команда 1'])
+
+        results = {}
+        results['get_active_matches'] = measure(db.get_active_matches, repeat)
+        if sample_ids:
+            results['get_initial_total'] = measure(
+                db.get_initial_total, repeat, lambda index: (sample_ids[index],))
+            results['chart_query'] = measure(
+                db.get_chart_histories, repeat, lambda index: ([sample_ids[index]],))
+            results['chart_query_bulk_20'] = measure(
+                db.get_chart_histories, repeat,
+                lambda index: (rng.sample(finished_ids, min(20, len(finished_ids))),))
+            results['chart_points_after'] = measure(
+                db.get_chart_points_after, repeat, lambda index: (sample_ids[index], 0))
+
+        results['archive_page'] = measure(
+            lambda: db.get_archive_matches({}, None, 100), repeat)
+        results['archive_page_team_filter'] = measure(
+            lambda: db.get_archive_matches({'team': sample_team.split(' - ')[0]}, None, 100),
+            repeat)
+        results['archive_stats'] = measure(lambda: db.get_archive_stats({}), repeat)
+
+        # Установившийся режим: после первого вызова статусы уже синхронизированы
+        db.sync_match_statuses(active_teams)
+        results['sync_match_statuses'] = measure(
+            db.sync_match_statuses, repeat, lambda index: (active_teams,))
+
+        # Новая запись для активного матча на каждой итерации
+        if active:
+            def next_tick(index):
+                match_id, teams, tournament, total_match_time = active[index % len(active)]
+                # Время после конца матча - не совпадает с записями генератора
+                tick = total_match_time * 60 + 1 + index
+                return ({
+                    'teams': teams, 'tournament': tournament,
+                    'time': f"{tick // 60:02d}:{tick % 60:02d}",
+                    'total_match_time': total_match_time, 'period': 4,
+                    'score': f"{index}:{index}", 'total_points': 2 * index,
+                    'p1': '1.85', 'p2': '1.95', 'total': '170.5',
+                    'under': '1.9', 'over': '1.9',
+                },)
+            results['save_match_data'] = measure(db.save_match_data, repeat, next_tick)
+
+        db.conn.close()
+    finally:
+        for suffix in ('', '-journal', '-wal', '-shm'):
+            if os.path.exists(work_path + suffix):
+                os.remove(work_path + suffix)
+
+    return results
+
+
+def database_info(path):
+    conn = sqlite3.connect(path)
+    try:
+        return {
+            'matches': conn.execute('SELECT COUNT(*) FROM matches').fetchone()[0],
+            'match_stats': conn.execute('SELECT COUNT(*) FROM match_stats').fetchone()[0],
+            'db_size_bytes': os.path.getsize(path),
+        }
+    finally:
+        conn.close()
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def compare(baseline_path, current_path):
+    """Сравнение двух прогонов по медиане; возвращает список регрессий"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {scale['matches']: scale['results'] for scale in json.load(f)['scales']}
+    with open(current_path, encoding='utf-8') as f:
+        current = {scale['matches']: scale['results'] for scale in json.load(f)['scales']}
+
+    regressions = []
+    for matches in sorted(set(baseline) & set(current)):
+        for name in sorted(set(baseline[matches]) & set(current[matches])):
+            before = baseline[matches][name]['median_ms']
+            after = current[matches][name]['median_ms']
+            ratio = after / before if before else float('inf')
+            mark = ' <-- регрессия' if ratio > REGRESSION_THRESHOLD else ''
+            print(f"{matches:>8} {name:<28} {before:>10.3f} -> {after:>10.3f} ms "
+                  f"(x{ratio:.2f}){mark}")
+            if mark:
+                regressions.append((matches, name, ratio))
+    return regressions
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Бенчмарк запросов к БД')
+    parser.add_argument('--scales', default='1000,10000',
+                        help='число матчей через запятую (до 1000000)')
+    parser.add_argument('--ticks', type=int, default=120, help='записей на матч')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--data-dir', default='bench_data')
+    parser.add_argument('--output', help='файл JSON (по умолчанию - stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='сравнить два JSON-отчета')
+    args = parser.parse_args()
+
+    if args.compare:
+        regressions = compare(*args.compare)
+        raise SystemExit(1 if regressions else 0)
+
+    report = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'ticks': args.ticks,
+        'repeat': args.repeat,
+        'scales': [],
+    }
+
+    for matches in (int(scale) for scale in args.scales.split(',')):
+        path = prepare_database(args.data_dir, matches, args.ticks, args.seed)
+        logging.info(f"Замеры: {matches} матчей")
+        # Логи save_match_data/sync_match_statuses искажают замеры
+        logging.disable(logging.INFO)
+        try:
+            results = run_scale(path, args.repeat, args.seed)
+        finally:
+            logging.disable(logging.NOTSET)
+        report['scales'].append(dict(database_info(path), results=results))
+        for name, stats in results.items():
+            logging.info(f"  {name:<28} median {stats['median_ms']:.3f} ms, "
+                         f"p95 {stats['p95_ms']:.3f} ms")
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Кэш готовых (сериализованных и сжатых) графиков завершенных матчей
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+
+import serializers
+
+
+class ChartCacheEntry:
+    """Готовый ответ графика: gzip-байты, ETag, формат и версия матча"""
+
+    __slots__ = ('body_gzip', 'etag', 'media_type', 'version')
+
+    def __init__(self, body_gzip, etag, version, media_type=serializers.JSON_MEDIA_TYPE):
+        self.body_gzip = body_gzip
+        self.etag = etag
+        self.media_type = media_type
+        self.version = version
+
+    @property
+    def size(self):
+        return len(self.body_gzip)
+
+    def body(self):
+        """Несжатое тело для клиентов без поддержки gzip"""
+        return gzip.decompress(self.body_gzip)
+
+
+class ChartCache:
+    """LRU-кэш, ограниченный суммарным размером сжатых ответов"""
+
+    def __init__(self, max_bytes=32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        # (match_id, variant) -> ChartCacheEntry
+        self._entries = OrderedDict()
+        # match_id -> варианты графика в кэше (max_points и формат ответа)
+        self._variants = {}
+        self._lock = threading.Lock()
+
+    def get(self, match_id, version, variant=None):
+        """Запись из кэша, если матч не менялся с момента сохранения"""
+        key = (match_id, variant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry.version != version:
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, match_id, version, payload, variant=None,
+            media_type=serializers.JSON_MEDIA_TYPE):
+        """Сериализация (JSON или MessagePack), сжатие и сохранение ответа графика"""
+        body = serializers.encode(payload, media_type)
+        entry = ChartCacheEntry(
+            body_gzip=gzip.compress(body, compresslevel=6),
+            etag='"%s"' % hashlib.sha1(body).hexdigest(),
+            version=version,
+            media_type=media_type
+        )
+
+        key = (match_id, variant)
+        with self._lock:
+            self._remove(key)
+            if entry.size > self.max_bytes:
+                return entry
+
+            self._entries[key] = entry
+            self._variants.setdefault(match_id, set()).add(variant)
+            self.current_bytes += entry.size
+            while self.current_bytes > self.max_bytes:
+                oldest_key = next(iter(self._entries))
+                self._remove(oldest_key)
+
+        return entry
+
+    def invalidate(self, match_id):
+        """Удалить все варианты графика матча"""
+        with self._lock:
+            for variant in list(self._variants.get(match_id, ())):
+                self._remove((match_id, variant))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._variants.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry.size
+            match_id, variant = key
+            variants = self._variants.get(match_id)
+            if variants is not None:
+                variants.discard(variant)
+                if not variants:
+                    del self._variants[match_id]
+
+    def __len__(self):
+        return len(self._entries)
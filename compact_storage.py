@@ -0,0 +1,96 @@
+"""
+Перевод накопленной истории match_stats в хранение "только изменения".
+
+Подряд идущие записи матча с одинаковыми значениями (TRACKED_STATS_COLUMNS)
+сворачиваются в первую запись серии: времена остальных дописываются в ее
+clock_run, сами записи удаляются. Графики и аналитика восстанавливают
+полную историю через expand_clock_runs, поэтому результат не меняется.
+
+Обрабатываются только завершенные матчи (live пишет парсер). Повторный
+запуск безопасен: уже свернутые матчи не меняются.
+
+Пример: python compact_storage.py --vacuum
+"""
+import argparse
+import logging
+import os
+
+from config import DATABASE_CONFIG
+from database import TRACKED_STATS_COLUMNS, Database
+
+
+def compact_match(conn, match_id):
+    """Свернуть серии одинаковых записей матча; возвращает число удаленных"""
+    rows = conn.execute(f'''
+        SELECT id, timestamp, clock_run, clock_seqs, {', '.join(TRACKED_STATS_COLUMNS)}
+        FROM match_stats
+        WHERE match_id = ?
+        ORDER BY id ASC
+    ''', (match_id,)).fetchall()
+
+    runs = []
+    for row in rows:
+        clocks = row[2].split(',') if row[2] else []
+        # Номера отсчетов сохраняются: по ним читаются графики по курсору
+        seqs = row[3].split(',') if row[3] else [str(row[0])] * len(clocks)
+        samples = [(row[1], str(row[0]))] + list(zip(clocks, seqs))
+        if runs and runs[-1][1] == row[4:]:
+            runs[-1][2].extend(samples)
+            runs[-1][3].append(row[0])
+        else:
+            # [id первой записи, значения, (время, номер) после первого, удаляемые id]
+            runs.append([row[0], row[4:], samples[1:], []])
+
+    removed = 0
+    for first_id, _, samples, duplicate_ids in runs:
+        if not duplicate_ids:
+            continue
+        conn.execute('''
+            UPDATE match_stats SET clock_run = ?, clock_seqs = ?, last_seq = ? WHERE id = ?
+        ''', (','.join(clock for clock, _ in samples), ','.join(seq for _, seq in samples),
+              int(samples[-1][1]), first_id))
+        conn.executemany('DELETE FROM match_stats WHERE id = ?',
+                         [(row_id,) for row_id in duplicate_ids])
+        removed += len(duplicate_ids)
+    return removed
+
+
+def compact(db, batch_size=500):
+    """Свернуть историю всех завершенных матчей; возвращает (матчей, удалено записей)"""
+    match_ids = [row[0] for row in db.conn.execute(
+        "SELECT id FROM matches WHERE status = 'finished' ORDER BY id")]
+
+    removed = 0
+    for index, match_id in enumerate(match_ids, 1):
+        removed += compact_match(db.conn, match_id)
+        if index % batch_size == 0:
+            db.conn.commit()
+            logging.info(f"Обработано матчей: {index}/{len(match_ids)}, удалено записей: {removed}")
+    db.conn.commit()
+    return len(match_ids), removed
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Сжатие истории match_stats')
+    parser.add_argument('--db', default=DATABASE_CONFIG['DB_PATH'])
+    parser.add_argument('--vacuum', action='store_true',
+                        help='вернуть освободившееся место файлу (VACUUM)')
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    size_before = os.path.getsize(args.db)
+    matches, removed = compact(db)
+    logging.info(f"Готово: матчей {matches}, удалено записей {removed}")
+
+    if args.vacuum:
+        db.conn.execute('VACUUM')
+        logging.info(f"Размер базы: {size_before / 1e6:.1f} -> {os.path.getsize(args.db) / 1e6:.1f} МБ")
+    db.conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -15,7 +15,22 @@ BROWSER_CONFIG = {
     'USER_AGENT': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
     'WINDOW_SIZE': '1920,1080',
     'DISABLE_LOGS': True,             # отключить логи браузера
-    'SCALE_FACTOR': 0.5
+    'SCALE_FACTOR': 0.5,
+    # Облегченный режим: без картинок, шрифтов, видео и трекеров (через CDP)
+    'LEAN_MODE': False,
+    'BLOCKED_URL_PATTERNS': [
+        '*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.svg', '*.ico',
+        '*.woff', '*.woff2', '*.ttf', '*.otf',
+        '*.mp4', '*.webm', '*.mp3',
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*',
+        '*mc.yandex.ru*', '*top-fwz1.mail.ru*', '*facebook.net*', '*hotjar.com*',
+    ],
+    # Постоянный профиль и кэш: повторный запуск не грузит сайт с нуля
+    'PROFILE_DIR': None,              # например 'chrome_profile'
+    'CACHE_DIR': None,                # например 'chrome_cache'
+    # Подключение к уже запущенному Chrome (start_browser.bat),
+    # например '127.0.0.1:9222'; остальные настройки браузера не применяются
+    'DEBUGGER_ADDRESS': None,
 }
 #1920,1080
 #3840,2160
@@ -36,6 +51,81 @@ SITE_CONFIG = {
 # Настройки БД
 DATABASE_CONFIG = {
     'DB_PATH': 'basketball.db',
+    # Новая строка match_stats только при изменении счета, тотала или
+    # коэффициентов; повторные отсчеты времени дописываются в clock_run
+    'CHANGE_ONLY_STORAGE': False,
+}
+
+# Настройки веб-сервера
+WEB_CONFIG = {
+    'CHART_CACHE_MAX_BYTES': 32 * 1024 * 1024,  # лимит кэша графиков (gzip)
+    'ARCHIVE_CHART_MAX_AGE': 7 * 24 * 3600,     # Cache-Control для завершенных
+    'LIVE_CHART_MAX_AGE': 3,                    # Cache-Control для live-матчей
+    'WS_QUEUE_SIZE': 16,                        # очередь отправки на клиента
+    'WS_SEND_TIMEOUT': 10,                      # секунды на отправку сообщения
+}
+
+# Несколько процессов веб-сервера (uvicorn web_app:app --workers N):
+# live-снимок строит один процесс, остальные читают его из общего файла
+MULTI_WORKER_CONFIG = {
+    'ENABLED': False,
+    'SNAPSHOT_FILE': 'live_snapshot.bin',
+    'LOCK_FILE': 'live_snapshot.lock',
+    'CAPACITY': 16 * 1024 * 1024,     # байт под снимок
+    'POLL_INTERVAL': 0.05,            # проверка версии снимка, секунды
+    'ELECTION_INTERVAL': 2,           # попытка стать сборщиком, секунды
+    'CHART_TAIL': 50,                 # последних точек графика на матч в снимке
+    'CHANGE_BACKLOG': 100,            # последних версий с измененными матчами в снимке
+    'ALERT_BACKLOG': 200,             # последних оповещений в снимке
+}
+
+# Оповещения по правилам (alerts.py), проверяются парсером на каждой записи
+ALERT_CONFIG = {
+    'ENABLED': True,
+    'RULES_FILE': 'alert_rules.json',   # перечитывается при изменении
+    'DEFAULT_COOLDOWN': 300,            # секунд между оповещениями правила по матчу
+}
+
+# Уведомления парсер -> веб-сервер (UDP на localhost)
+IPC_CONFIG = {
+    'ENABLED': True,
+    'HOST': '127.0.0.1',
+    'PORT': 8765,
+    'HEARTBEAT_TIMEOUT': 15,          # без событий дольше - канал считается упавшим
+    'FALLBACK_POLL_INTERVAL': 3,      # опрос БД, когда канал недоступен
+    'SAFETY_POLL_INTERVAL': 30,       # контрольный опрос при живом канале
+}
+
+# Движение линий live-матчей (line_movement.py)
+LINE_MOVEMENT_CONFIG = {
+    'EWMA_WINDOWS': (60, 300),        # окна EWMA значений линий (секунды)
+    'RATE_WINDOW': 300,               # окно частоты изменений (секунды)
+}
+
+# Прогноз итогового тотала live-матча (projection.py)
+PROJECTION_CONFIG = {
+    'TAU_MINUTES': 4.0,               # постоянная EWMA темпа (игровые минуты)
+    'DISPERSION': 2.0,                # дисперсия очков / среднее
+}
+
+# Метрики (/metrics на веб-сервере)
+METRICS_CONFIG = {
+    'ENABLED': True,
+    'PARSER_METRICS_FILE': 'parser_metrics.json',  # снимок метрик парсера
+}
+
+# Трассировка медленных тиков/запросов и профилирование
+TRACE_CONFIG = {
+    'ENABLED': True,
+    'PARSER_TRACE_FILE': 'parser_slow_ticks.jsonl',
+    'WEB_TRACE_FILE': 'web_slow_requests.jsonl',
+    'TICK_BUDGET': 10.0,              # секунды: тик дольше - пишем трассу
+    'REQUEST_BUDGET': 1.0,            # секунды для HTTP-запроса
+    'MAX_BYTES': 10 * 1024 * 1024,    # размер файла трасс до ротации
+    'BACKUP_COUNT': 5,
+    'PROFILE_DIR': 'profiles',
+    'PROFILE_REQUEST_FILE': 'profile_request.json',  # запрос профиля парсера
+    'PROFILE_TICKS': 5,               # тиков по сигналу SIGUSR1
 }
 
 # Настройки фильтрации матчей
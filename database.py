@@ -3,6 +3,30 @@ import sqlite3
 import logging
 from datetime import datetime
 
+import metrics
+from config import DATABASE_CONFIG
+
+
+# Завершенные матчи, доигранные почти до конца, с первой и последней записью
+ARCHIVE_BASE_SQL = '''
+    FROM matches m
+    JOIN match_stats ms_final ON ms_final.id = (
+        SELECT MAX(id) FROM match_stats WHERE match_id = m.id
+    )
+    JOIN match_stats ms_first ON ms_first.id = (
+        SELECT MIN(id) FROM match_stats WHERE match_id = m.id
+    )
+    WHERE m.status = 'finished'
+    AND (
+        -- МАТЧ СЧИТАЕТСЯ ЗАВЕРШЕННЫМ ЕСЛИ:
+        -- 1. Время матча близко к полному (39+/47+ минут)
+        (m.total_match_time = 40 AND CAST(SUBSTR(m.current_time, 1, 2) AS INTEGER) >= 39) OR
+        (m.total_match_time = 48 AND CAST(SUBSTR(m.current_time, 1, 2) AS INTEGER) >= 47) OR
+        (m.total_match_time != 40 AND m.total_match_time != 48 AND 
+        CAST(SUBSTR(m.current_time, 1, 2) AS INTEGER) >= m.total_match_time - 1)
+    )
+'''
+
 
 def safe_int(value, default=0):
     """Безопасное преобразование в int"""
@@ -24,11 +48,88 @@ def safe_float(value, default=None):
         return default
 
 
+def period_index(period):
+    """Порядковый номер периода: 1-4 для четвертей, 5, 6... для 'OT1', 'OT2'..."""
+    if period is None:
+        return None
+    period = str(period)
+    try:
+        if period.startswith('OT'):
+            return 4 + int(period[2:])
+        return int(period)
+    except ValueError:
+        return None
+
+
+# Похожие кириллические и латинские буквы приводятся к одному виду,
+# чтобы "ЦСКА" и "ЦCKA" (латиница) находились одинаково
+SEARCH_HOMOGLYPHS = str.maketrans({
+    'а': 'a', 'в': 'b', 'е': 'e', 'ё': 'e', 'к': 'k', 'м': 'm', 'н': 'h',
+    'о': 'o', 'р': 'p', 'с': 'c', 'т': 't', 'у': 'y', 'х': 'x', 'і': 'i',
+})
+
+# Минимальная длина запроса для поиска по триграммам
+SEARCH_MIN_LENGTH = 3
+
+
+def normalize_search_text(value):
+    """Текст для поискового индекса: без регистра и похожих букв"""
+    if not value:
+        return ''
+    return ' '.join(value.casefold().translate(SEARCH_HOMOGLYPHS).split())
+
+
+# Значения записи, при изменении которых в режиме "только изменения"
+# создается новая строка match_stats (иначе время дописывается в clock_run)
+TRACKED_STATS_COLUMNS = ('period', 'score', 'total_points', 'total_value',
+                         'under_odds', 'over_odds', 'p1_odds', 'p2_odds')
+
+
+def expand_clock_runs(rows, timestamp_index, seq_index=None):
+    """Строки с clock_run последним столбцом -> строка на каждый отсчет времени.
+
+    clock_run - времена следующих отсчетов с теми же значениями через
+    запятую; без него строка описывает один отсчет. С seq_index последние
+    столбцы - clock_run и clock_seqs, и в столбец seq_index (id строки)
+    каждого отсчета подставляется его номер - курсор для чтения по частям.
+    """
+    expanded = []
+    for row in rows:
+        if seq_index is None:
+            values, clock_run, clock_seqs = list(row[:-1]), row[-1], None
+        else:
+            values, clock_run, clock_seqs = list(row[:-2]), row[-2], row[-1]
+        expanded.append(tuple(values))
+        if clock_run:
+            # Без clock_seqs (история до нумерации) - номер строки
+            seqs = clock_seqs.split(',') if clock_seqs else ()
+            for index, clock in enumerate(clock_run.split(',')):
+                values[timestamp_index] = clock
+                if index < len(seqs):
+                    values[seq_index] = int(seqs[index])
+                expanded.append(tuple(values))
+    return expanded
+
+
+def samples_after(rows, after_id, max_id=None):
+    """Отсчеты (expand_clock_runs с seq_index=0) с номером из (after_id, max_id]
+    по возрастанию номера"""
+    rows = [row for row in rows
+            if row[0] > after_id and (max_id is None or row[0] <= max_id)]
+    rows.sort(key=lambda row: row[0])
+    return rows
+
+
 class Database:
-    def __init__(self, db_path='basketball.db'):
+    def __init__(self, db_path='basketball.db', change_only=None):
         self.db_path = db_path
         self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=20.0)
+        self.search_enabled = False
+        # Новая строка match_stats только при изменении значений
+        self.change_only = (DATABASE_CONFIG.get('CHANGE_ONLY_STORAGE', False)
+                            if change_only is None else change_only)
         self._init_db()
+        self._init_search()
 
     def _init_db(self):
         """Инициализация таблиц"""
@@ -67,8 +168,202 @@ class Database:
             CREATE INDEX IF NOT EXISTS idx_match_stats_period 
             ON match_stats(period)
         ''')
+        # Агрегаты аналитики по завершенным матчам (см. aggregates.py):
+        # вклад каждого матча и суммы по группам турнир/формат/период
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_facts (
+                match_id INTEGER NOT NULL,
+                dimension TEXT NOT NULL,
+                key TEXT NOT NULL,
+                result TEXT,
+                deviation REAL,
+                pace REAL,
+                PRIMARY KEY (match_id, dimension, key)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_groups (
+                dimension TEXT NOT NULL,
+                key TEXT NOT NULL,
+                matches INTEGER DEFAULT 0,
+                over_count INTEGER DEFAULT 0,
+                under_count INTEGER DEFAULT 0,
+                deviation_sum REAL DEFAULT 0,
+                deviation_count INTEGER DEFAULT 0,
+                pace_sum REAL DEFAULT 0,
+                pace_count INTEGER DEFAULT 0,
+                PRIMARY KEY (dimension, key)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS analytics_histograms (
+                dimension TEXT NOT NULL,
+                key TEXT NOT NULL,
+                metric TEXT NOT NULL,
+                bin REAL NOT NULL,
+                count INTEGER DEFAULT 0,
+                PRIMARY KEY (dimension, key, metric, bin)
+            )
+        ''')
+        # Первая/последняя запись матча: MIN(id)/MAX(id) по индексу
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_match_stats_match
+            ON match_stats(match_id)
+        ''')
+        # Архив: фильтр по статусу и постраничный вывод по (updated_at, id)
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_matches_status_updated
+            ON matches(status, updated_at, id)
+        ''')
+        # Периоды матча: состояние на начало и конец каждой четверти/овертайма,
+        # обновляется при сохранении записи (match_periods.py)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS match_periods (
+                match_id INTEGER NOT NULL,
+                period_index INTEGER NOT NULL,
+                period TEXT NOT NULL,
+                start_time TEXT,
+                end_time TEXT,
+                points_before INTEGER,
+                start_score TEXT,
+                end_score TEXT,
+                start_points INTEGER,
+                end_points INTEGER,
+                start_total REAL,
+                end_total REAL,
+                samples INTEGER DEFAULT 0,
+                PRIMARY KEY (match_id, period_index)
+            )
+        ''')
+        # Параллельный пересчет производных данных (rebuild.py): параметры
+        # запуска и обработанные диапазоны id для продолжения после остановки
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS rebuild_runs (
+                job TEXT PRIMARY KEY,
+                range_size INTEGER NOT NULL,
+                max_id INTEGER NOT NULL,
+                started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at TIMESTAMP
+            )
+        ''')
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS rebuild_checkpoints (
+                job TEXT NOT NULL,
+                range_start INTEGER NOT NULL,
+                matches INTEGER DEFAULT 0,
+                done_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (job, range_start)
+            )
+        ''')
+        # Сработавшие оповещения (alerts.py)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                rule_id TEXT NOT NULL,
+                match_id INTEGER NOT NULL,
+                metric TEXT,
+                value REAL,
+                threshold REAL,
+                period TEXT,
+                match_time TEXT,
+                message TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (match_id) REFERENCES matches (id)
+            )
+        ''')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_alerts_match
+            ON alerts(match_id, id)
+        ''')
+        # Времена повторных отсчетов с неизменными значениями
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(match_stats)')]
+        if 'clock_run' not in columns:
+            self.conn.execute('ALTER TABLE match_stats ADD COLUMN clock_run TEXT')
+        # Номера отсчетов clock_run (из счетчика stats_sequence) и номер
+        # последнего из них: дописанные отсчеты читаются по тому же курсору,
+        # что и новые строки
+        if 'clock_seqs' not in columns:
+            self.conn.execute('ALTER TABLE match_stats ADD COLUMN clock_seqs TEXT')
+        if 'last_seq' not in columns:
+            self.conn.execute('ALTER TABLE match_stats ADD COLUMN last_seq INTEGER')
+        self.conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_match_stats_last_seq
+            ON match_stats(last_seq) WHERE last_seq IS NOT NULL
+        ''')
+        # Общий счетчик id строк match_stats и номеров отсчетов clock_run
+        # (одна строка): номера растут в порядке записи
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS stats_sequence (
+                seq INTEGER NOT NULL
+            )
+        ''')
+        self.conn.execute('''
+            INSERT INTO stats_sequence (seq)
+            SELECT MAX(
+                (SELECT COALESCE(MAX(id), 0) FROM match_stats),
+                (SELECT COALESCE(MAX(last_seq), 0) FROM match_stats WHERE last_seq IS NOT NULL)
+            )
+            WHERE NOT EXISTS (SELECT 1 FROM stats_sequence)
+        ''')
         self.conn.commit()
 
+    def _init_search(self):
+        """Поисковый индекс FTS5 (триграммы) по командам и турнирам"""
+        try:
+            self.conn.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS matches_search USING fts5(
+                    teams,
+                    tournament,
+                    tokenize = 'trigram'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            # Старая SQLite без FTS5/trigram - остается поиск через LIKE
+            logging.warning(f"Поисковый индекс недоступен: {e}")
+            return
+
+        # Досоздаем записи для матчей, добавленных до появления индекса
+        missing = self.conn.execute('''
+            SELECT id, teams, tournament FROM matches
+            WHERE id > (SELECT COALESCE(MAX(rowid), 0) FROM matches_search)
+        ''').fetchall()
+        if missing:
+            self.conn.executemany(
+                'INSERT INTO matches_search (rowid, teams, tournament) VALUES (?, ?, ?)',
+                [(match_id, normalize_search_text(teams), normalize_search_text(tournament))
+                 for match_id, teams, tournament in missing]
+            )
+        self.conn.commit()
+        self.search_enabled = True
+
+    def _search_condition(self, column, query):
+        """SQL-условие поиска подстроки в teams/tournament и параметр"""
+        text = normalize_search_text(query)
+        if self.search_enabled and len(text) >= SEARCH_MIN_LENGTH:
+            phrase = '"' + text.replace('"', '""') + '"'
+            return (
+                "m.id IN (SELECT rowid FROM matches_search WHERE matches_search MATCH ?)",
+                f'{column} : {phrase}'
+            )
+        return f"m.{column} LIKE ?", f'%{query}%'
+
+    @metrics.timed('db_query_seconds', query='search_suggestions')
+    def search_suggestions(self, field, query, limit=10):
+        """Подсказки для автодополнения команд или турниров"""
+        column = 'tournament' if field == 'tournament' else 'teams'
+        condition, param = self._search_condition(column, query)
+
+        cursor = self.conn.execute(f'''
+            SELECT m.{column}, MAX(m.id) AS last_id
+            FROM matches m
+            WHERE {condition}
+            GROUP BY m.{column}
+            ORDER BY last_id DESC
+            LIMIT ?
+        ''', (param, limit))
+
+        return [row[0] for row in cursor.fetchall() if row[0]]
+
     def get_or_create_match(self, match_data):
         """Получить существующий матч или создать новый"""
         teams = match_data['teams']
@@ -94,9 +389,16 @@ class Database:
             ''', (teams, match_data['tournament'], match_data['time'], match_data['total_match_time']))
 
             match_id = cursor.lastrowid
+            if self.search_enabled:
+                self.conn.execute(
+                    'INSERT INTO matches_search (rowid, teams, tournament) VALUES (?, ?, ?)',
+                    (match_id, normalize_search_text(teams),
+                     normalize_search_text(match_data['tournament']))
+                )
             self.conn.commit()
             return match_id, 'new'
 
+    @metrics.timed('db_query_seconds', query='save_match_data')
     def save_match_data(self, match_data):
         """Сохранение данных матча с сохранением последних значений"""
         try:
@@ -118,12 +420,23 @@ class Database:
             existing_timestamp = self._get_last_timestamp(match_id)
             current_timestamp = match_data['time']
 
+            # Без строки на каждый отсчет UNIQUE(match_id, timestamp) не
+            # видит времена из clock_run - повтор проверяется здесь
+            if (existing_timestamp != current_timestamp and self.change_only
+                    and self._has_timestamp(match_id, current_timestamp)):
+                return True, match_type, 'same_timestamp', match_id
+
+            if existing_timestamp != current_timestamp and self.change_only:
+                if self._extend_clock_run(match_id, current_timestamp, match_data, prepared_data):
+                    return True, match_type, 'new_timestamp', match_id
+
             if existing_timestamp != current_timestamp:
                 self.conn.execute('''
                     INSERT INTO match_stats 
-                    (match_id, timestamp, period, score, total_points, total_value, under_odds, over_odds, p1_odds, p2_odds)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    (id, match_id, timestamp, period, score, total_points, total_value, under_odds, over_odds, p1_odds, p2_odds)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                 ''', (
+                    self._next_sample_id(),
                     match_id,
                     current_timestamp,
                     match_data.get('period'),
@@ -135,15 +448,21 @@ class Database:
                     prepared_data['p1_odds'],
                     prepared_data['p2_odds']
                 ))
-                self.conn.commit()
+                self._update_match_period(
+                    match_id, match_data.get('period'), current_timestamp,
+                    prepared_data['score'], prepared_data['total_points'],
+                    prepared_data['total_value'])
+                with metrics.timer('commit_seconds', query='save_match_data'):
+                    self.conn.commit()
+                metrics.inc('rows_inserted_total')
 
-                return True, match_type, 'new_timestamp'
+                return True, match_type, 'new_timestamp', match_id
             else:
-                return True, match_type, 'same_timestamp'
+                return True, match_type, 'same_timestamp', match_id
 
         except Exception as e:
             logging.error(f"Ошибка сохранения в БД: {e}")
-            return False, 'error', 'error'
+            return False, 'error', 'error', None
 
     def _get_last_match_values(self, match_id):
         """Получить последние известные значения из БД"""
@@ -210,11 +529,121 @@ class Database:
     def _get_last_timestamp(self, match_id):
         """Получить последнюю временную метку для матча"""
         cursor = self.conn.execute(
-            'SELECT timestamp FROM match_stats WHERE match_id = ? ORDER BY recorded_at DESC LIMIT 1',
+            'SELECT timestamp, clock_run FROM match_stats WHERE match_id = ? ORDER BY recorded_at DESC LIMIT 1',
             (match_id,)
         )
         result = cursor.fetchone()
-        return result[0] if result else None
+        if not result:
+            return None
+        return result[1].rsplit(',', 1)[-1] if result[1] else result[0]
+
+    def _has_timestamp(self, match_id, timestamp):
+        """Есть ли у матча отсчет с этим временем (в строках или clock_run)"""
+        return self.conn.execute('''
+            SELECT 1 FROM match_stats
+            WHERE match_id = ?
+              AND (timestamp = ? OR ',' || clock_run || ',' LIKE '%,' || ? || ',%')
+            LIMIT 1
+        ''', (match_id, timestamp, timestamp)).fetchone() is not None
+
+    def _next_sample_id(self):
+        """Следующий номер из stats_sequence (без commit - в транзакции сохранения).
+
+        Номер больше всех прежних номеров и id строк, в том числе записанных
+        в обход счетчика (synthetic_data.py).
+        """
+        self.conn.execute('''
+            UPDATE stats_sequence
+            SET seq = MAX(seq, (SELECT COALESCE(MAX(id), 0) FROM match_stats)) + 1
+        ''')
+        return self.conn.execute('SELECT seq FROM stats_sequence').fetchone()[0]
+
+    def _extend_clock_run(self, match_id, current_timestamp, match_data, prepared_data):
+        """Дописать время к последней строке, если значения не изменились"""
+        last_row = self.conn.execute(f'''
+            SELECT id, {', '.join(TRACKED_STATS_COLUMNS)}
+            FROM match_stats WHERE match_id = ?
+            ORDER BY id DESC LIMIT 1
+        ''', (match_id,)).fetchone()
+        if not last_row:
+            return False
+
+        current = (match_data.get('period'),) + tuple(
+            prepared_data[column] for column in TRACKED_STATS_COLUMNS[1:])
+        # period хранится как есть: число или 'OT1'
+        if tuple(str(value) if value is not None else None for value in last_row[1:]) != \
+                tuple(str(value) if value is not None else None for value in current):
+            return False
+
+        # Номер отсчета из того же счетчика, что и id строк: больше всех
+        # прежних id и номеров, а id новых строк будут больше него
+        seq = self._next_sample_id()
+        self.conn.execute('''
+            UPDATE match_stats
+            SET clock_run = COALESCE(clock_run || ',', '') || ?,
+                clock_seqs = COALESCE(clock_seqs || ',', '') || ?,
+                last_seq = ?
+            WHERE id = ?
+        ''', (current_timestamp, str(seq), seq, last_row[0]))
+        self._update_match_period(
+            match_id, match_data.get('period'), current_timestamp,
+            prepared_data['score'], prepared_data['total_points'],
+            prepared_data['total_value'])
+        with metrics.timer('commit_seconds', query='save_match_data'):
+            self.conn.commit()
+        metrics.inc('rows_extended_total')
+        return True
+
+    def _update_match_period(self, match_id, period, timestamp, score, total_points, total_value):
+        """Учесть запись в match_periods (без commit - в транзакции сохранения)"""
+        index = period_index(period)
+        if index is None:
+            return
+
+        # Очки до периода - конец предыдущего известного периода;
+        # для первой четверти 0, для матча, найденного посреди игры, неизвестны
+        self.conn.execute('''
+            INSERT INTO match_periods
+            (match_id, period_index, period, start_time, end_time, points_before,
+             start_score, end_score, start_points, end_points, start_total, end_total, samples)
+            VALUES (?, ?, ?, ?, ?, COALESCE((
+                SELECT end_points FROM match_periods
+                WHERE match_id = ? AND period_index < ?
+                ORDER BY period_index DESC LIMIT 1
+            ), CASE WHEN ? = 1 THEN 0 END), ?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT(match_id, period_index) DO UPDATE SET
+                end_time = excluded.end_time,
+                end_score = excluded.end_score,
+                end_points = excluded.end_points,
+                end_total = excluded.end_total,
+                samples = samples + 1
+        ''', (match_id, index, str(period), timestamp, timestamp,
+              match_id, index, index,
+              score, score, total_points, total_points, total_value, total_value))
+
+    @metrics.timed('db_query_seconds', query='get_match_periods')
+    def get_match_periods(self, match_ids):
+        """Периоды матчей по порядку.
+
+        Строки: (match_id, period_index, period, start_time, end_time,
+        points_before, start_score, end_score, start_points, end_points,
+        start_total, end_total, samples, total_match_time)
+        """
+        if not match_ids:
+            return []
+
+        placeholders = ', '.join('?' for _ in match_ids)
+        cursor = self.conn.execute(f'''
+            SELECT mp.match_id, mp.period_index, mp.period, mp.start_time, mp.end_time,
+                   mp.points_before, mp.start_score, mp.end_score,
+                   mp.start_points, mp.end_points, mp.start_total, mp.end_total,
+                   mp.samples, m.total_match_time
+            FROM match_periods mp
+            JOIN matches m ON m.id = mp.match_id
+            WHERE mp.match_id IN ({placeholders})
+            ORDER BY mp.match_id ASC, mp.period_index ASC
+        ''', list(match_ids))
+        return cursor.fetchall()
 
     def _parse_float(self, value):
         """Парсинг числовых значений"""
@@ -225,6 +654,7 @@ class Database:
         except:
             return None
 
+    @metrics.timed('db_query_seconds', query='get_active_matches')
     def get_active_matches(self):
         """Получить только активные матчи"""
         cursor = self.conn.execute('''
@@ -252,7 +682,10 @@ class Database:
 
         return cursor.fetchall()
 
+    @metrics.timed('db_query_seconds', query='sync_match_statuses')
     def sync_match_statuses(self, current_matches_teams):
+        """Пометить пропавшие со страницы матчи завершенными, вернуть их id"""
+        finished_ids = []
         try:
             cursor = self.conn.execute('''
                 SELECT id, teams, status, current_time, total_match_time 
@@ -272,13 +705,18 @@ class Database:
                         ('finished', match_id)
                     )
                     updated_count += 1
+                    finished_ids.append(match_id)
                     logging.info(f"Матч завершен: {teams} (время: {current_time}, полное: {total_match_time})")
 
-            self.conn.commit()
+            with metrics.timer('commit_seconds', query='sync_match_statuses'):
+                self.conn.commit()
 
         except Exception as e:
             logging.error(f"Ошибка синхронизации статусов: {e}")
 
+        return finished_ids
+
+    @metrics.timed('db_query_seconds', query='get_initial_total')
     def get_initial_total(self, match_id):
         """Получить начальный тотал матча (первый сохраненный)"""
         try:
@@ -297,3 +735,291 @@ class Database:
             logging.error(f"Ошибка получения начального тотала: {e}")
             return None
 
+
+    @metrics.timed('db_query_seconds', query='get_chart_points_after')
+    def get_chart_points_after(self, match_id, after_id=0):
+        """Получить точки графика матча, добавленные после записи after_id"""
+        try:
+            cursor = self.conn.execute('''
+                SELECT
+                    ms.id,
+                    ms.timestamp,
+                    ms.score,
+                    ms.total_points,
+                    ms.total_value,
+                    m.total_match_time,
+                    ms.clock_run,
+                    ms.clock_seqs
+                FROM match_stats ms
+                JOIN matches m ON m.id = ms.match_id
+                WHERE ms.match_id = ? AND (ms.id > ? OR ms.last_seq > ?)
+                ORDER BY ms.id ASC
+            ''', (match_id, after_id, after_id))
+
+            # Строка могла быть прочитана раньше - отдаем только новые отсчеты
+            return samples_after(expand_clock_runs(cursor.fetchall(), 1, 0), after_id)
+
+        except Exception as e:
+            logging.error(f"Ошибка получения новых точек графика: {e}")
+            return []
+
+    @metrics.timed('db_query_seconds', query='get_live_rows_after')
+    def get_live_rows_after(self, after_id, limit=5000):
+        """Новые отсчеты всех матчей после курсора after_id (движение линий, прогноз).
+
+        Строки: (номер, match_id, recorded_at, total_value, under_odds,
+        over_odds, p1_odds, p2_odds, timestamp, period, total_points, score);
+        номер - id строки или номер дописанного в clock_run отсчета.
+        """
+        columns = '''id, match_id, recorded_at, total_value,
+                   under_odds, over_odds, p1_odds, p2_odds,
+                   timestamp, period, total_points, score, clock_run, clock_seqs'''
+        new_rows = self.conn.execute(f'''
+            SELECT {columns} FROM match_stats
+            WHERE id > ?
+            ORDER BY id ASC
+            LIMIT ?
+        ''', (after_id, limit)).fetchall()
+        # Прочитанные раньше строки с дописанными отсчетами (не больше
+        # строки на матч: дописывается только последняя)
+        extended_rows = self.conn.execute(f'''
+            SELECT {columns} FROM match_stats
+            WHERE last_seq > ? AND id <= ?
+        ''', (after_id, after_id)).fetchall()
+
+        # Если строк больше limit, отсчеты после последней прочитанной строки
+        # отдаются следующим вызовом: у непрочитанных строк все номера больше
+        max_id = new_rows[-1][0] if len(new_rows) == limit else None
+        return samples_after(
+            expand_clock_runs(extended_rows + new_rows, 8, 0), after_id, max_id)
+
+    def get_active_live_rows(self):
+        """Записи текущих live-матчей (начальное состояние live-моделей)"""
+        cursor = self.conn.execute('''
+            SELECT ms.id, ms.match_id, ms.recorded_at, ms.total_value,
+                   ms.under_odds, ms.over_odds, ms.p1_odds, ms.p2_odds,
+                   ms.timestamp, ms.period, ms.total_points, ms.score,
+                   ms.clock_run, ms.clock_seqs
+            FROM match_stats ms
+            WHERE ms.match_id IN (
+                SELECT id FROM matches
+                WHERE status = 'active' AND updated_at > datetime('now', '-30 minutes')
+            )
+            ORDER BY ms.id ASC
+        ''')
+        rows = expand_clock_runs(cursor.fetchall(), 8, 0)
+        # Курсор - последний номер вообще, а не только live-матчей
+        return rows, self.get_last_sample_id()
+
+    def get_last_sample_id(self):
+        """Последний выданный номер отсчета (id строки или дописанного отсчета)"""
+        return self.conn.execute('''
+            SELECT MAX(
+                (SELECT COALESCE(MAX(id), 0) FROM match_stats),
+                (SELECT COALESCE(MAX(last_seq), 0) FROM match_stats WHERE last_seq IS NOT NULL)
+            )
+        ''').fetchone()[0]
+
+    def save_alerts(self, alerts):
+        """Запись сработавших оповещений (словари AlertEngine.evaluate)"""
+        try:
+            self.conn.executemany('''
+                INSERT INTO alerts
+                (rule_id, match_id, metric, value, threshold, period, match_time, message)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', [(alert['rule_id'], alert['match_id'], alert['metric'], alert['value'],
+                   alert['threshold'], alert['period'], alert['match_time'], alert['message'])
+                  for alert in alerts])
+            self.conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка сохранения оповещений: {e}")
+
+    @metrics.timed('db_query_seconds', query='get_alerts_after')
+    def get_alerts_after(self, after_id=0, limit=100, match_id=None):
+        """Оповещения после after_id по возрастанию id (с командами и турниром)"""
+        query = '''
+            SELECT a.id, a.rule_id, a.match_id, m.teams, m.tournament, a.metric,
+                   a.value, a.threshold, a.period, a.match_time, a.message, a.created_at
+            FROM alerts a
+            JOIN matches m ON m.id = a.match_id
+            WHERE a.id > ?
+        '''
+        params = [after_id]
+        if match_id is not None:
+            query += ' AND a.match_id = ?'
+            params.append(match_id)
+        query += ' ORDER BY a.id ASC LIMIT ?'
+        params.append(limit)
+        return self.conn.execute(query, params).fetchall()
+
+    def get_last_alert_id(self):
+        return self.conn.execute('SELECT COALESCE(MAX(id), 0) FROM alerts').fetchone()[0]
+
+    def _archive_filters(self, date_from=None, date_to=None, tournament=None, team=None):
+        """SQL-условия фильтров архива и их параметры"""
+        conditions = []
+        params = []
+
+        # Диапазоны вместо DATE(updated_at), чтобы работал индекс
+        if date_from:
+            conditions.append("m.updated_at >= ?")
+            params.append(date_from)
+        if date_to:
+            conditions.append("m.updated_at < DATE(?, '+1 day')")
+            params.append(date_to)
+        if tournament:
+            condition, param = self._search_condition('tournament', tournament)
+            conditions.append(condition)
+            params.append(param)
+        if team:
+            condition, param = self._search_condition('teams', team)
+            conditions.append(condition)
+            params.append(param)
+
+        sql = ''.join(f" AND {condition}" for condition in conditions)
+        return sql, params
+
+    @metrics.timed('db_query_seconds', query='get_archive_matches')
+    def get_archive_matches(self, filters, cursor=None, limit=100):
+        """Страница архива, упорядоченная по (updated_at, id) по убыванию.
+
+        cursor - (updated_at, id) последнего матча предыдущей страницы.
+        """
+        filter_sql, params = self._archive_filters(**filters)
+
+        query = '''
+            SELECT 
+                m.id, 
+                m.teams, 
+                m.tournament, 
+                m.status,
+                m.current_time,
+                m.total_match_time,
+                m.created_at,
+                m.updated_at as finished_date,
+                ms_final.score as final_score,
+                ms_final.total_points as final_points,
+                ms_final.total_value as final_total,
+                ms_first.total_value as initial_total
+        ''' + ARCHIVE_BASE_SQL + filter_sql
+
+        if cursor:
+            query += " AND (m.updated_at, m.id) < (?, ?)"
+            params.extend(cursor)
+
+        query += " ORDER BY m.updated_at DESC, m.id DESC LIMIT ?"
+        params.append(limit)
+
+        return self.conn.execute(query, params).fetchall()
+
+    @metrics.timed('db_query_seconds', query='get_archive_stats')
+    def get_archive_stats(self, filters):
+        """Агрегаты OVER/UNDER и среднее отклонение по всему фильтру"""
+        filter_sql, params = self._archive_filters(**filters)
+
+        query = '''
+            SELECT
+                COUNT(*),
+                SUM(result = 'OVER'),
+                SUM(result = 'UNDER'),
+                AVG(CASE WHEN deviation != 0 THEN deviation END)
+            FROM (
+                SELECT
+                    CASE
+                        WHEN COALESCE(ms_final.total_points, 0) = 0
+                             OR COALESCE(ms_final.total_value, 0) = 0 THEN NULL
+                        WHEN ms_final.total_points > ms_final.total_value THEN 'OVER'
+                        ELSE 'UNDER'
+                    END AS result,
+                    CASE
+                        WHEN COALESCE(ms_final.total_points, 0) = 0
+                             OR COALESCE(ms_final.total_value, 0) = 0 THEN NULL
+                        ELSE ROUND((ms_final.total_points - ms_final.total_value)
+                                   * 100.0 / ms_final.total_value, 1)
+                    END AS deviation
+        ''' + ARCHIVE_BASE_SQL + filter_sql + '''
+            )
+        '''
+
+        return self.conn.execute(query, params).fetchone()
+
+    @metrics.timed('db_query_seconds', query='get_period_stats')
+    def get_period_stats(self, filters, total_match_time=None, overtime_minutes=5):
+        """OVER/UNDER по периодам завершенных матчей архива.
+
+        Линия периода - тотал на его начало, пропорциональный длине периода.
+        Строки: (period_index, period, matches, avg_points, avg_line,
+        over_count, under_count)
+        """
+        filter_sql, params = self._archive_filters(**filters)
+        if total_match_time:
+            filter_sql += " AND m.total_match_time = ?"
+            params.append(total_match_time)
+
+        query = '''
+            SELECT
+                period_index,
+                MIN(period),
+                COUNT(*),
+                AVG(points),
+                AVG(line),
+                SUM(points > line),
+                SUM(points <= line)
+            FROM (
+                SELECT
+                    mp.period_index,
+                    mp.period,
+                    mp.end_points - mp.points_before AS points,
+                    -- Доля периода в матче: основной период 12 минут
+                    -- для 4x12, иначе 10 (analytics.period_minutes)
+                    mp.start_total * CASE
+                        WHEN mp.period_index > 4 THEN ?
+                        WHEN COALESCE(mm.total_match_time, 40) = 48 THEN 12
+                        ELSE 10
+                    END * 1.0 / COALESCE(NULLIF(mm.total_match_time, 0), 40) AS line
+                FROM match_periods mp
+                JOIN matches mm ON mm.id = mp.match_id
+                WHERE mp.points_before IS NOT NULL
+                AND mp.start_total > 0
+                AND mp.match_id IN (SELECT m.id ''' + ARCHIVE_BASE_SQL + filter_sql + ''')
+            )
+            GROUP BY period_index
+            ORDER BY period_index
+        '''
+
+        return self.conn.execute(query, [overtime_minutes] + params).fetchall()
+
+    def get_archive_version(self):
+        """Время последнего изменения архива (для сброса кэша статистики)"""
+        cursor = self.conn.execute(
+            "SELECT MAX(updated_at) FROM matches WHERE status = 'finished'"
+        )
+        result = cursor.fetchone()
+        return result[0] if result else None
+
+    @metrics.timed('db_query_seconds', query='get_chart_histories')
+    def get_chart_histories(self, match_ids):
+        """История нескольких матчей одним запросом (по матчу и времени)"""
+        if not match_ids:
+            return []
+
+        placeholders = ', '.join('?' for _ in match_ids)
+        cursor = self.conn.execute(f'''
+            SELECT
+                ms.match_id,
+                ms.timestamp,
+                ms.score,
+                ms.total_points,
+                ms.total_value,
+                ms.id,
+                m.total_match_time,
+                m.status,
+                ms.clock_run,
+                ms.clock_seqs
+            FROM match_stats ms
+            JOIN matches m ON m.id = ms.match_id
+            WHERE ms.match_id IN ({placeholders})
+            ORDER BY ms.match_id ASC, ms.id ASC
+        ''', list(match_ids))
+
+        return expand_clock_runs(cursor.fetchall(), 1, 5)
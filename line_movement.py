@@ -0,0 +1,117 @@
+"""
+Движение линий по ходу матча: тотал, коэффициенты больше/меньше и П1/П2.
+
+Состояние каждого матча обновляется за O(1) на новую запись match_stats:
+последнее значение, время последнего изменения, экспоненциально
+затухающая частота изменений и EWMA значения по нескольким окнам.
+История матча при этом не перечитывается.
+"""
+import calendar
+import math
+import time
+
+TRACKED_LINES = ('total_value', 'under_odds', 'over_odds', 'p1_odds', 'p2_odds')
+
+
+def parse_recorded_at(value):
+    """recorded_at из SQLite (UTC, 'YYYY-MM-DD HH:MM:SS') в секунды epoch"""
+    try:
+        return calendar.timegm(time.strptime(value[:19], '%Y-%m-%d %H:%M:%S'))
+    except (TypeError, ValueError):
+        return time.time()
+
+
+class LineState:
+    """Статистика одной линии матча"""
+
+    __slots__ = ('value', 'updated_at', 'changed_at', 'last_delta',
+                 'changes', 'rate', 'ewma')
+
+    def __init__(self, windows):
+        self.value = None
+        self.updated_at = None
+        self.changed_at = None
+        self.last_delta = None
+        self.changes = 0
+        # Затухающая частота изменений (в секунду)
+        self.rate = 0.0
+        self.ewma = {window: None for window in windows}
+
+    def update(self, value, at, rate_window):
+        if value is None:
+            return
+
+        if self.updated_at is None:
+            self.value = value
+            self.updated_at = self.changed_at = at
+            self.ewma = {window: value for window in self.ewma}
+            return
+
+        dt = max(at - self.updated_at, 0.0)
+        # EWMA по времени: вес нового значения зависит от прошедшего интервала
+        for window, average in self.ewma.items():
+            alpha = 1.0 - math.exp(-dt / window)
+            self.ewma[window] = average + alpha * (value - average)
+
+        self.rate *= math.exp(-dt / rate_window)
+        if value != self.value:
+            self.rate += 1.0 / rate_window
+            self.last_delta = value - self.value
+            self.changes += 1
+            self.changed_at = at
+            self.value = value
+        self.updated_at = at
+
+    def snapshot(self, now, rate_window):
+        if self.updated_at is None:
+            return None
+        # Частота на момент запроса, а не последней записи
+        rate = self.rate * math.exp(-max(now - self.updated_at, 0.0) / rate_window)
+        result = {
+            'value': self.value,
+            'changes': self.changes,
+            'changes_per_min': round(rate * 60, 2),
+            'seconds_since_move': round(max(now - self.changed_at, 0.0), 1),
+            'last_delta': round(self.last_delta, 3) if self.last_delta is not None else None,
+        }
+        for window, average in self.ewma.items():
+            result[f'ewma_{window}s'] = round(average, 3)
+        return result
+
+
+class LineMovementTracker:
+    """Состояние линий всех live-матчей; обновляется потоком новых записей"""
+
+    def __init__(self, ewma_windows=(60, 300), rate_window=300):
+        self.ewma_windows = tuple(ewma_windows)
+        self.rate_window = rate_window
+        # {match_id: {line: LineState}}
+        self.matches = {}
+
+    def update(self, match_id, recorded_at, values):
+        """Новая запись матча; values - значения TRACKED_LINES по порядку"""
+        lines = self.matches.get(match_id)
+        if lines is None:
+            lines = self.matches[match_id] = {
+                line: LineState(self.ewma_windows) for line in TRACKED_LINES}
+        at = parse_recorded_at(recorded_at)
+        for line, value in zip(TRACKED_LINES, values):
+            lines[line].update(value, at, self.rate_window)
+
+    def ingest(self, rows):
+        """Строки Database.get_live_rows_after"""
+        for row in rows:
+            self.update(row[1], row[2], row[3:8])
+
+    def snapshot(self, match_id, now=None):
+        lines = self.matches.get(match_id)
+        if lines is None:
+            return None
+        now = time.time() if now is None else now
+        return {line: state.snapshot(now, self.rate_window) for line, state in lines.items()}
+
+    def prune(self, active_ids):
+        """Забыть матчи, которых больше нет в live"""
+        for match_id in list(self.matches):
+            if match_id not in active_ids:
+                del self.matches[match_id]
@@ -0,0 +1,238 @@
+"""
+Общий снимок live-данных для нескольких процессов веб-сервера
+(uvicorn --workers N).
+
+Один процесс, захвативший файл-блокировку (BuilderLock), читает БД и
+публикует снимок в файл, отображенный в память всеми процессами. Остальные
+только следят за счетчиком версии и рассылают готовые кадры своим
+WebSocket-клиентам, поэтому нагрузка на БД не зависит от числа процессов.
+Если процесс-сборщик завершится, блокировку освобождает ОС, и ее
+захватывает другой процесс.
+
+Формат файла: заголовок HEADER, таблица секций (смещение, длина) и данные.
+Запись защищена счетчиком seq (seqlock): нечетный - идет запись, читатель
+повторяет чтение, если seq изменился за время чтения.
+"""
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+MAGIC = b'BLS1'
+# magic, seq, version, published_at, число секций
+HEADER = struct.Struct('<4sQQdI')
+SECTION = struct.Struct('<II')
+MAX_SECTIONS = 8
+DATA_OFFSET = HEADER.size + SECTION.size * MAX_SECTIONS
+# Попыток чтения, пока сборщик перезаписывает снимок
+READ_RETRIES = 100
+
+
+class BuilderLock:
+    """Неблокирующая блокировка файла: кто захватил - тот и сборщик"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    @property
+    def acquired(self):
+        return self.file is not None
+
+    def try_acquire(self):
+        if self.file is not None:
+            return True
+        file = open(self.path, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            file.close()
+            return False
+        self.file = file
+        return True
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class SnapshotWriter:
+    """Публикация снимка (только процесс-сборщик)"""
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.size = DATA_OFFSET + capacity
+        self.file = open(path, 'r+b' if os.path.exists(path) else 'w+b')
+        if os.path.getsize(path) != self.size:
+            self.file.truncate(self.size)
+        self.mm = mmap.mmap(self.file.fileno(), self.size)
+
+        # Версия продолжается после прежнего сборщика
+        magic, seq, version, _, _ = HEADER.unpack_from(self.mm, 0)
+        valid = magic == MAGIC
+        self.seq = seq + (seq % 2) if valid else 0
+        self.version = version if valid else 0
+        # Снимок прошлого запуска или прежнего сборщика больше не отдается
+        self.reset()
+
+    @property
+    def next_version(self):
+        return self.version + 1
+
+    def reset(self):
+        """Пустой снимок (читатели получают None) без сброса версии"""
+        self.seq += 1
+        HEADER.pack_into(self.mm, 0, MAGIC, self.seq, self.version, time.time(), 0)
+        self.seq += 1
+        HEADER.pack_into(self.mm, 0, MAGIC, self.seq, self.version, time.time(), 0)
+
+    def publish(self, sections):
+        """Запись секций (bytes); возвращает версию или None, если не влезло"""
+        total = sum(len(section) for section in sections)
+        if len(sections) > MAX_SECTIONS or DATA_OFFSET + total > self.size:
+            logging.error(f"Снимок live-данных не помещается в файл: {total} байт")
+            return None
+
+        self.seq += 1
+        HEADER.pack_into(self.mm, 0, MAGIC, self.seq, self.version, time.time(), 0)
+
+        offset = DATA_OFFSET
+        for index, section in enumerate(sections):
+            self.mm[offset:offset + len(section)] = section
+            SECTION.pack_into(self.mm, HEADER.size + SECTION.size * index, offset, len(section))
+            offset += len(section)
+
+        self.version += 1
+        self.seq += 1
+        HEADER.pack_into(self.mm, 0, MAGIC, self.seq, self.version, time.time(), len(sections))
+        return self.version
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+
+class SnapshotReader:
+    """Чтение снимка любым процессом"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.mm = None
+
+    def _open(self):
+        if self.mm is not None and os.path.getsize(self.path) == len(self.mm):
+            return True
+        self.close()
+        try:
+            size = os.path.getsize(self.path)
+            if size < DATA_OFFSET:
+                return False
+            self.file = open(self.path, 'rb')
+            self.mm = mmap.mmap(self.file.fileno(), size, access=mmap.ACCESS_READ)
+            return True
+        except (OSError, ValueError):
+            self.close()
+            return False
+
+    def version(self):
+        """Версия опубликованного снимка (0 - снимка еще нет)"""
+        if not self._open():
+            return 0
+        magic, seq, version, _, _ = HEADER.unpack_from(self.mm, 0)
+        return version if magic == MAGIC else 0
+
+    def read(self):
+        """(версия, время публикации, [секции]) или None"""
+        if not self._open():
+            return None
+        for _ in range(READ_RETRIES):
+            magic, seq, version, published_at, count = HEADER.unpack_from(self.mm, 0)
+            if magic != MAGIC or count == 0:
+                return None
+            if seq % 2:
+                time.sleep(0)
+                continue
+            sections = []
+            for index in range(count):
+                offset, length = SECTION.unpack_from(self.mm, HEADER.size + SECTION.size * index)
+                sections.append(self.mm[offset:offset + length])
+            # Снимок не менялся за время чтения
+            if HEADER.unpack_from(self.mm, 0)[1] == seq:
+                return version, published_at, sections
+        return None
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+            self.mm = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class ChartTails:
+    """Последние точки графиков live-матчей для рассылки из снимка.
+
+    Пополняется тем же потоком записей, что и live-модели, без отдельных
+    запросов к БД. base_id - id, после которого хвост матча полный: клиенту
+    с курсором не меньше base_id точки отдаются из снимка, иначе из БД.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        # {match_id: deque[(id, timestamp, score, total_points, total_value)]}
+        self.rows = {}
+        self.base_ids = {}
+
+    def ingest(self, rows, complete=False):
+        """Строки Database.get_live_rows_after; complete - вся история матчей"""
+        for row in rows:
+            match_id = row[1]
+            tail = self.rows.get(match_id)
+            if tail is None:
+                tail = self.rows[match_id] = deque(maxlen=self.size)
+                # Более ранние записи матча могли быть до начала наблюдения
+                self.base_ids[match_id] = 0 if complete else row[0] - 1
+            if len(tail) == self.size:
+                self.base_ids[match_id] = tail[0][0]
+            tail.append((row[0], row[8], row[11], row[10], row[3]))
+
+    def prune(self, active_ids):
+        for match_id in list(self.rows):
+            if match_id not in active_ids:
+                del self.rows[match_id]
+                del self.base_ids[match_id]
+
+    def export(self, total_match_times):
+        """Хвосты активных матчей для снимка (ключи - строки для JSON)"""
+        return {
+            str(match_id): {
+                'base_id': self.base_ids[match_id],
+                'total_match_time': total_match_times[match_id],
+                'rows': list(tail),
+            }
+            for match_id, tail in self.rows.items() if match_id in total_match_times
+        }
+
+
+def chart_rows_after(tail, after_id):
+    """Точки хвоста после after_id в формате get_chart_points_after;
+    None - хвост не покрывает курсор"""
+    if tail is None or after_id < tail['base_id']:
+        return None
+    total_match_time = tail['total_match_time']
+    return [tuple(row) + (total_match_time,) for row in tail['rows'] if row[0] > after_id]
@@ -0,0 +1,507 @@
+"""
+Нагрузочный тест веб-сервера: WebSocket-клиенты и HTTP-запросы.
+
+Все на одной машине (Linux), без внешних сервисов:
+  1. во временном каталоге генерируется база (synthetic_data.py);
+  2. web_app запускается отдельным процессом (uvicorn) на этой базе;
+  3. имитатор парсера пишет новые записи активным матчам и шлет
+     уведомления о тике по UDP, как app.py;
+  4. открываются тысячи клиентов /ws (часть - медленные, почти не
+     читают) и идет поток HTTP-запросов к /api/matches, графикам и архиву.
+
+Отчет: p50/p99 задержки доставки table_update от момента тика, задержки
+HTTP по типам запросов, память (RSS) и CPU процесса сервера.
+Клиенты WebSocket реализованы на asyncio без сторонних библиотек.
+
+Пример: python load_test.py --clients 2000 --slow-clients 100 --duration 60
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import resource
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import synthetic_data
+from database import Database
+from notifications import TickPublisher
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Запуск сервера с портом уведомлений, отличным от рабочего парсера
+SERVER_BOOTSTRAP = '''
+import sys
+import config
+config.IPC_CONFIG['PORT'] = int(sys.argv[1])
+import uvicorn
+uvicorn.run('web_app:app', host='127.0.0.1', port=int(sys.argv[2]), log_level='warning')
+'''
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def summarize(values):
+    """p50/p99/max в миллисекундах"""
+    return {
+        'count': len(values),
+        'p50_ms': round(percentile(values, 0.5) * 1000, 2) if values else None,
+        'p99_ms': round(percentile(values, 0.99) * 1000, 2) if values else None,
+        'max_ms': round(max(values) * 1000, 2) if values else None,
+    }
+
+
+class LoadStats:
+    def __init__(self):
+        # Время отправки тиков имитатором парсера (monotonic)
+        self.tick_sent_at = []
+        self.delivery = []
+        self.http = {}
+        self.http_errors = 0
+        self.connected = 0
+        self.connect_errors = 0
+        self.close_codes = {}
+        self.messages = 0
+
+
+class WebSocketClient:
+    """Минимальный клиент WebSocket (RFC 6455) поверх asyncio streams"""
+
+    def __init__(self, host, port, path='/ws'):
+        self.host = host
+        self.port = port
+        self.path = path
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        key = base64.b64encode(os.urandom(16)).decode()
+        self.writer.write((
+            f"GET {self.path} HTTP/1.1\r\n"
+            f"Host: {self.host}:{self.port}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        ).encode())
+        await self.writer.drain()
+        response = await self.reader.readuntil(b'\r\n\r\n')
+        if b' 101 ' not in response.split(b'\r\n', 1)[0]:
+            raise ConnectionError(response.split(b'\r\n', 1)[0].decode(errors='replace'))
+
+    async def send(self, opcode, payload):
+        mask = os.urandom(4)
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 65536:
+            header += bytes([0x80 | 126]) + struct.pack('!H', length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack('!Q', length)
+        masked = bytes(byte ^ mask[index % 4] for index, byte in enumerate(payload))
+        self.writer.write(header + mask + masked)
+        await self.writer.drain()
+
+    async def send_text(self, text):
+        await self.send(0x1, text.encode('utf-8'))
+
+    async def receive(self):
+        """Следующее сообщение: (opcode, payload); 0x8 - закрытие"""
+        message = b''
+        while True:
+            first, second = await self.reader.readexactly(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack('!H', await self.reader.readexactly(2))[0]
+            elif length == 127:
+                length = struct.unpack('!Q', await self.reader.readexactly(8))[0]
+            payload = await self.reader.readexactly(length)
+
+            if opcode == 0x9:
+                await self.send(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode == 0x8:
+                return opcode, payload
+            if opcode:
+                message_opcode = opcode
+            message += payload
+            if first & 0x80:
+                return message_opcode, message
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def http_get(host, port, path):
+    """GET по HTTP/1.1 без keep-alive; возвращает код ответа"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nConnection: close\r\n\r\n".encode())
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def run_ws_client(args, stats, slow, connect_limit, match_ids, stop):
+    client = WebSocketClient(args.host, args.port)
+    async with connect_limit:
+        try:
+            await client.connect()
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+            stats.connect_errors += 1
+            logging.debug(f"Ошибка подключения клиента: {e}")
+            return
+    stats.connected += 1
+
+    try:
+        if match_ids and random.random() < args.chart_subscribers:
+            await client.send_text(json.dumps({
+                'type': 'subscribe_chart', 'match_id': random.choice(match_ids), 'last_id': 0}))
+
+        counted_tick = -1
+        while not stop.is_set():
+            opcode, payload = await client.receive()
+            received_at = time.monotonic()
+            if opcode == 0x8:
+                code = struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else None
+                stats.close_codes[code] = stats.close_codes.get(code, 0) + 1
+                return
+            stats.messages += 1
+
+            # Задержка от последнего тика до первого снимка таблицы после него
+            if b'table_update' in payload[:40] and stats.tick_sent_at:
+                tick = len(stats.tick_sent_at) - 1
+                if tick != counted_tick and not slow:
+                    counted_tick = tick
+                    stats.delivery.append(received_at - stats.tick_sent_at[tick])
+
+            if slow:
+                # Медленный клиент почти не читает: очередь сервера копится
+                await asyncio.sleep(args.slow_delay)
+    except (OSError, asyncio.IncompleteReadError):
+        stats.close_codes['reset'] = stats.close_codes.get('reset', 0) + 1
+    finally:
+        client.close()
+
+
+async def run_http_traffic(args, stats, finished_ids, stop):
+    """Поток HTTP-запросов с заданной частотой"""
+    def random_path():
+        kind = random.choice(('matches', 'chart', 'charts', 'archive'))
+        if kind == 'matches' or not finished_ids:
+            return 'matches', '/api/matches'
+        if kind == 'chart':
+            return kind, f"/api/matches/{random.choice(finished_ids)}/chart?max_points=600"
+        if kind == 'charts':
+            ids = ','.join(str(match_id) for match_id in random.sample(
+                finished_ids, min(10, len(finished_ids))))
+            return kind, f"/api/matches/charts?ids={ids}&max_points=300"
+        return kind, '/api/matches/archive?limit=100'
+
+    async def one_request():
+        kind, path = random_path()
+        started = time.monotonic()
+        try:
+            status = await http_get(args.host, args.port, path)
+        except OSError:
+            stats.http_errors += 1
+            return
+        if status != 200:
+            stats.http_errors += 1
+        stats.http.setdefault(kind, []).append(time.monotonic() - started)
+
+    tasks = set()
+    while not stop.is_set():
+        task = asyncio.create_task(one_request())
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        await asyncio.sleep(random.expovariate(args.http_rps))
+    if tasks:
+        await asyncio.wait(tasks, timeout=10)
+
+
+def fake_parser(db_path, stats, args, stop_event, loop):
+    """Имитатор парсера: новые записи активных матчей и уведомление о тике"""
+    db = Database(db_path)
+    publisher = TickPublisher('127.0.0.1', args.ipc_port)
+    # current_time без префикса таблицы - функция SQLite, а не столбец
+    matches = db.conn.execute('''
+        SELECT m.teams, m.tournament, m.current_time, m.total_match_time FROM matches m
+        WHERE m.status = 'active' AND m.updated_at > datetime('now', '-30 minutes')
+    ''').fetchall()
+    clocks = {}
+    for teams, tournament, current_time, total_match_time in matches:
+        minutes, seconds = (current_time or '0:0').split(':')
+        clocks[teams] = int(minutes) * 60 + int(seconds)
+
+    tick = 0
+    while not stop_event.wait(args.tick_interval):
+        changed_ids = []
+        for teams, tournament, _, total_match_time in matches:
+            clocks[teams] += random.randint(5, 20)
+            clock = clocks[teams]
+            success, _, timestamp_type, match_id = db.save_match_data({
+                'teams': teams, 'tournament': tournament,
+                'time': f"{clock // 60:02d}:{clock % 60:02d}",
+                'total_match_time': total_match_time, 'period': 4,
+                'score': f"{tick}:{tick}", 'total_points': 2 * tick,
+                'p1': '1.85', 'p2': '1.95', 'total': '170.5', 'under': '1.9', 'over': '1.9',
+            })
+            if timestamp_type == 'new_timestamp':
+                changed_ids.append(match_id)
+        loop.call_soon_threadsafe(stats.tick_sent_at.append, time.monotonic())
+        publisher.publish(changed_ids)
+        tick += 1
+    publisher.close()
+    db.conn.close()
+
+
+class ProcessSampler:
+    """RSS и загрузка CPU процесса по /proc (Linux)"""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks_per_second = os.sysconf('SC_CLK_TCK')
+        self.samples = []
+        self._last = None
+
+    def _cpu_seconds(self):
+        with open(f'/proc/{self.pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        # utime, stime - поля 14 и 15 (после имени процесса - 12 и 13)
+        return (int(fields[11]) + int(fields[12])) / self.ticks_per_second
+
+    def _rss_bytes(self):
+        with open(f'/proc/{self.pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    def sample(self):
+        try:
+            now, cpu = time.monotonic(), self._cpu_seconds()
+            rss = self._rss_bytes()
+        except OSError:
+            return
+        if self._last:
+            cpu_percent = (cpu - self._last[1]) / (now - self._last[0]) * 100
+            self.samples.append((rss, cpu_percent))
+        self._last = (now, cpu)
+
+    def summary(self):
+        if not self.samples:
+            return {}
+        rss = [sample[0] for sample in self.samples]
+        cpu = [sample[1] for sample in self.samples]
+        return {
+            'rss_max_mb': round(max(rss) / 1024 / 1024, 1),
+            'rss_last_mb': round(rss[-1] / 1024 / 1024, 1),
+            'cpu_avg_percent': round(sum(cpu) / len(cpu), 1),
+            'cpu_max_percent': round(max(cpu), 1),
+        }
+
+
+def prepare_workdir(args):
+    """Временный каталог с базой и шаблонами для процесса сервера"""
+    workdir = tempfile.mkdtemp(prefix='basketball-load-')
+    db_path = os.path.join(workdir, 'basketball.db')
+    if args.db:
+        shutil.copyfile(args.db, db_path)
+    else:
+        logging.info(f"Генерация базы: {args.matches} матчей")
+        synthetic_data.generate(db_path, args.matches, args.ticks)
+    shutil.copytree(os.path.join(ROOT_DIR, 'templates'), os.path.join(workdir, 'templates'))
+    return workdir, db_path
+
+
+def start_server(args, workdir):
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.Popen(
+        [sys.executable, '-c', SERVER_BOOTSTRAP, str(args.ipc_port), str(args.port)],
+        cwd=workdir, env=env)
+
+
+async def wait_for_server(args, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if await http_get(args.host, args.port, '/api/matches') == 200:
+                return True
+        except OSError:
+            pass
+        await asyncio.sleep(0.5)
+    return False
+
+
+async def run(args):
+    workdir, db_path = prepare_workdir(args)
+    server = start_server(args, workdir)
+    stats = LoadStats()
+    sampler = ProcessSampler(server.pid)
+    harness_sampler = ProcessSampler(os.getpid())
+
+    try:
+        if not await wait_for_server(args):
+            raise RuntimeError("Сервер не запустился")
+
+        conn = sqlite3.connect(db_path)
+        finished_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM matches WHERE status = 'finished' ORDER BY RANDOM() LIMIT 1000")]
+        active_ids = [row[0] for row in conn.execute(
+            "SELECT id FROM matches WHERE status = 'active' "
+            "AND updated_at > datetime('now', '-30 minutes')")]
+        conn.close()
+        # Без live-матчей имитатору парсера нечего писать - тиков и рассылок не будет
+        if not active_ids:
+            raise RuntimeError(
+                "В базе нет активных матчей: увеличьте --matches или укажите --db")
+
+        stop = asyncio.Event()
+        connect_limit = asyncio.Semaphore(args.connect_concurrency)
+        clients = [
+            asyncio.create_task(run_ws_client(
+                args, stats, index < args.slow_clients, connect_limit, active_ids, stop))
+            for index in range(args.clients + args.slow_clients)
+        ]
+        logging.info(f"Подключение клиентов: {len(clients)}")
+
+        parser_stop = threading.Event()
+        parser_thread = threading.Thread(
+            target=fake_parser,
+            args=(db_path, stats, args, parser_stop, asyncio.get_running_loop()),
+            daemon=True)
+        parser_thread.start()
+        http_task = asyncio.create_task(run_http_traffic(args, stats, finished_ids, stop))
+
+        started = time.monotonic()
+        while time.monotonic() - started < args.duration:
+            await asyncio.sleep(1)
+            sampler.sample()
+            harness_sampler.sample()
+            logging.info(
+                f"{int(time.monotonic() - started)} с: клиентов {stats.connected}, "
+                f"тиков {len(stats.tick_sent_at)}, доставок {len(stats.delivery)}, "
+                f"HTTP {sum(len(values) for values in stats.http.values())}")
+
+        stop.set()
+        parser_stop.set()
+        await http_task
+
+        ws_metrics = None
+        try:
+            reader, writer = await asyncio.open_connection(args.host, args.port)
+            writer.write(f"GET /api/ws/metrics HTTP/1.1\r\nHost: {args.host}\r\n"
+                         "Connection: close\r\n\r\n".encode())
+            response = await reader.read()
+            writer.close()
+            ws_metrics = json.loads(response.split(b'\r\n\r\n', 1)[1])
+            ws_metrics.pop('client_stats', None)
+        except (OSError, ValueError, IndexError):
+            pass
+
+        for task in clients:
+            task.cancel()
+        await asyncio.gather(*clients, return_exceptions=True)
+        parser_thread.join(timeout=10)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'config': {key: value for key, value in vars(args).items() if key != 'output'},
+        'clients_connected': stats.connected,
+        'connect_errors': stats.connect_errors,
+        'close_codes': {str(code): count for code, count in stats.close_codes.items()},
+        'messages_received': stats.messages,
+        'ticks': len(stats.tick_sent_at),
+        'broadcast_delivery': summarize(stats.delivery),
+        'http': {kind: summarize(values) for kind, values in sorted(stats.http.items())},
+        'http_errors': stats.http_errors,
+        'server': sampler.summary(),
+        # Если нагрузчик сам упирается в CPU, задержки завышены
+        'harness': harness_sampler.summary(),
+        'server_ws_metrics': ws_metrics,
+    }
+
+
+def raise_file_limit():
+    """Тысячи соединений не помещаются в стандартный лимит дескрипторов"""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Нагрузочный тест веб-сервера')
+    parser.add_argument('--clients', type=int, default=1000, help='обычные клиенты /ws')
+    parser.add_argument('--slow-clients', type=int, default=50, help='медленные клиенты')
+    parser.add_argument('--slow-delay', type=float, default=30.0,
+                        help='пауза медленного клиента между чтениями (с)')
+    parser.add_argument('--chart-subscribers', type=float, default=0.1,
+                        help='доля клиентов с подпиской на график')
+    parser.add_argument('--http-rps', type=float, default=20.0)
+    parser.add_argument('--duration', type=int, default=60, help='секунды')
+    parser.add_argument('--tick-interval', type=float, default=5.0,
+                        help='период тиков имитатора парсера (с)')
+    parser.add_argument('--matches', type=int, default=2000, help='матчей в базе')
+    parser.add_argument('--ticks', type=int, default=120, help='записей на матч')
+    parser.add_argument('--db', help='готовая база вместо генерации (копируется)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8800)
+    parser.add_argument('--ipc-port', type=int, default=18765)
+    parser.add_argument('--connect-concurrency', type=int, default=100)
+    parser.add_argument('--keep', action='store_true', help='не удалять рабочий каталог')
+    parser.add_argument('--output', help='файл JSON (по умолчанию - stdout)')
+    args = parser.parse_args()
+
+    # Логи записи в БД от имитатора парсера не нужны
+    for handler in logging.getLogger().handlers:
+        handler.addFilter(lambda record: record.module != 'database')
+
+    raise_file_limit()
+    report = asyncio.run(run(args))
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Поквартальная статистика матчей из таблицы match_periods.
+
+Таблица ведется при сохранении каждой записи (Database._update_match_period):
+строка на матч и период (четверти и овертаймы 'OT1', 'OT2'...) со счетом,
+очками и тоталом на начало и конец периода. Поэтому очки за период и
+OVER/UNDER по четвертям не требуют перебора match_stats.
+
+Линия периода - тотал букмекера на его начало, пропорциональный доле
+периода в матче (четверть 4x10 - 1/4, половина 2x10 - 1/2, овертайм -
+5 минут от полного времени).
+
+Заполнение для истории: python match_periods.py --backfill
+(параллельно: python rebuild.py --job periods)
+"""
+import argparse
+import itertools
+import logging
+
+from analytics import OVERTIME_MINUTES, period_minutes
+from config import DATABASE_CONFIG
+from database import Database, expand_clock_runs, period_index
+
+
+def period_line(index, start_total, total_match_time):
+    """Тотал на период по тоталу матча на его начало"""
+    if not start_total:
+        return None
+    total_match_time = total_match_time or 40
+    minutes = period_minutes(total_match_time) if index <= 4 else OVERTIME_MINUTES
+    return start_total * minutes / total_match_time
+
+
+def format_period(row):
+    """Строка Database.get_match_periods -> описание периода для API"""
+    (_, index, period, start_time, end_time, points_before, start_score, end_score,
+     start_points, end_points, start_total, end_total, samples, total_match_time) = row
+
+    points = end_points - points_before if points_before is not None else None
+    line = period_line(index, start_total, total_match_time)
+    result = None
+    if points is not None and line:
+        result = 'OVER' if points > line else 'UNDER'
+
+    return {
+        'period': period,
+        'start_time': start_time,
+        'end_time': end_time,
+        'start_score': start_score,
+        'score': end_score,
+        'points': points,
+        'total_points': end_points,
+        'start_total': start_total,
+        'end_total': end_total,
+        'line': round(line, 1) if line else None,
+        'result': result,
+        'samples': samples,
+    }
+
+
+def get_match_periods(db, match_ids):
+    """{match_id: [периоды по порядку]}"""
+    return {
+        match_id: [format_period(row) for row in rows]
+        for match_id, rows in itertools.groupby(
+            db.get_match_periods(match_ids), key=lambda row: row[0])
+    }
+
+
+def get_period_stats(db, filters, total_match_time=None):
+    """OVER/UNDER и средние очки по периодам завершенных матчей"""
+    stats = []
+    for index, period, matches, avg_points, avg_line, over_count, under_count in \
+            db.get_period_stats(filters, total_match_time, OVERTIME_MINUTES):
+        stats.append({
+            'period': period,
+            'matches': matches,
+            'avg_points': round(avg_points, 1) if avg_points is not None else None,
+            'avg_line': round(avg_line, 1) if avg_line is not None else None,
+            'over_count': over_count or 0,
+            'under_count': under_count or 0,
+            'over_percentage': round((over_count or 0) * 100.0 / matches, 1) if matches else 0.0,
+        })
+    return stats
+
+
+def fold_periods(match_id, history):
+    """Строки match_periods по истории матча - то же, что дает
+    Database._update_match_period для каждой записи по порядку.
+
+    history - (timestamp, period, score, total_points, total_value).
+    """
+    periods = {}
+    for timestamp, period, score, total_points, total_value in history:
+        index = period_index(period)
+        if index is None:
+            continue
+        state = periods.get(index)
+        if state is None:
+            previous = [i for i in periods if i < index]
+            points_before = periods[max(previous)][9] if previous else None
+            if points_before is None and index == 1:
+                points_before = 0
+            periods[index] = [match_id, index, str(period), timestamp, timestamp, points_before,
+                              score, score, total_points, total_points, total_value, total_value, 1]
+        else:
+            state[4], state[7], state[9], state[11] = timestamp, score, total_points, total_value
+            state[12] += 1
+    return [tuple(periods[index]) for index in sorted(periods)]
+
+
+def load_history(conn, match_id):
+    return expand_clock_runs(conn.execute('''
+        SELECT timestamp, period, score, total_points, total_value, clock_run
+        FROM match_stats
+        WHERE match_id = ?
+        ORDER BY id ASC
+    ''', (match_id,)).fetchall(), 0)
+
+
+def replace_match_periods(conn, match_id, rows):
+    """Записать периоды матча вместо прежних (без commit)"""
+    conn.execute('DELETE FROM match_periods WHERE match_id = ?', (match_id,))
+    conn.executemany('''
+        INSERT INTO match_periods
+        (match_id, period_index, period, start_time, end_time, points_before,
+         start_score, end_score, start_points, end_points, start_total, end_total, samples)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', rows)
+
+
+def backfill_match(db, match_id):
+    """Пересобрать периоды матча по его истории (без commit)"""
+    replace_match_periods(
+        db.conn, match_id, fold_periods(match_id, load_history(db.conn, match_id)))
+
+
+def backfill(db, only_missing=True, batch_size=500):
+    """Заполнить match_periods по истории; возвращает число матчей"""
+    query = 'SELECT id FROM matches'
+    if only_missing:
+        query += ' WHERE id NOT IN (SELECT DISTINCT match_id FROM match_periods)'
+    match_ids = [row[0] for row in db.conn.execute(query + ' ORDER BY id')]
+
+    for index, match_id in enumerate(match_ids, 1):
+        backfill_match(db, match_id)
+        if index % batch_size == 0:
+            db.conn.commit()
+            logging.info(f"Периоды заполнены: {index}/{len(match_ids)}")
+    db.conn.commit()
+    return len(match_ids)
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Периоды матчей (match_periods)')
+    parser.add_argument('--backfill', action='store_true',
+                        help='заполнить периоды по истории match_stats')
+    parser.add_argument('--all', action='store_true',
+                        help='пересобрать периоды всех матчей, а не только без периодов')
+    parser.add_argument('--db', default=DATABASE_CONFIG['DB_PATH'])
+    args = parser.parse_args()
+
+    if args.backfill:
+        db = Database(args.db)
+        updated = backfill(db, only_missing=not args.all)
+        logging.info(f"Заполнение завершено: матчей {updated}")
+    else:
+        parser.print_help()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Метрики процессов: счетчики, текущие значения и гистограммы задержек.
+
+Каждый процесс пишет в свой реестр REGISTRY. Парсер сохраняет снимок
+реестра в JSON-файл после каждого тика, веб-сервер отдает свои метрики
+и метрики парсера на /metrics в текстовом формате Prometheus
+(с меткой process="web" / "parser").
+
+Запись в реестр - поиск в словаре и bisect, без блокировок (гонка
+потоков стоит в худшем случае одного наблюдения).
+"""
+import bisect
+import json
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Корзины гистограмм задержек (секунды)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+                   0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+PREFIX = 'basketball_'
+PROMETHEUS_TYPES = {'counters': 'counter', 'gauges': 'gauge', 'histograms': 'histogram'}
+
+# Описание метрик для # HELP
+DESCRIPTIONS = {
+    'tick_seconds': 'Длительность тика парсера по этапам',
+    'find_tournament_seconds': 'Поиск турнира для одного матча',
+    'matches_parsed_total': 'Матчи, разобранные парсером',
+    'matches_skipped_total': 'Матчи, пропущенные фильтрами',
+    'rows_inserted_total': 'Записи match_stats, добавленные в БД',
+    'commit_seconds': 'Длительность COMMIT',
+    'db_query_seconds': 'Задержка запросов к БД по имени запроса',
+    'ws_clients': 'Подключенные WebSocket-клиенты',
+    'broadcast_seconds': 'Длительность рассылки обновлений',
+    'ws_dropped_messages_total': 'Сообщения WebSocket, не доставленные клиентам',
+    'ws_backpressure_disconnects_total': 'Клиенты, отключенные из-за переполнения очереди',
+    'metrics_snapshot_age_seconds': 'Возраст снимка метрик процесса',
+    'alerts_fired_total': 'Сработавшие оповещения по правилам',
+    'live_snapshot_builder': 'Процесс строит общий live-снимок (1) или читает его (0)',
+    'live_snapshot_version': 'Версия опубликованного live-снимка',
+    'live_snapshot_bytes': 'Размер опубликованного live-снимка',
+}
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        # Последняя корзина - +Inf
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    def __init__(self):
+        # {name: {label_key: value}}
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        series = self.counters.setdefault(name, {})
+        key = _label_key(labels)
+        series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        series = self.histograms.setdefault(name, {})
+        key = _label_key(labels)
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram()
+        histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """Замер длительности блока в гистограмму name"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def timed(self, name, **labels):
+        """Декоратор: длительность вызова функции в гистограмму name"""
+        def decorator(func):
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.observe(name, time.perf_counter() - started, **labels)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """Состояние реестра в виде, пригодном для JSON"""
+        return {
+            'created_at': time.time(),
+            'counters': {
+                name: [[dict(key), value] for key, value in series.items()]
+                for name, series in self.counters.items()
+            },
+            'gauges': {
+                name: [[dict(key), value] for key, value in series.items()]
+                for name, series in self.gauges.items()
+            },
+            'histograms': {
+                name: [[dict(key), list(h.buckets), list(h.counts), h.sum, h.count]
+                       for key, h in series.items()]
+                for name, series in self.histograms.items()
+            },
+        }
+
+    def write_snapshot(self, path):
+        """Атомарная запись снимка в файл (читатель не увидит половину)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+inc = REGISTRY.inc
+set_gauge = REGISTRY.set_gauge
+observe = REGISTRY.observe
+timer = REGISTRY.timer
+timed = REGISTRY.timed
+
+
+def read_snapshot(path):
+    """Снимок метрик другого процесса (None - файла нет или он битый)"""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(snapshots):
+    """Текстовый формат Prometheus для снимков [(process, snapshot)].
+
+    Серии одной метрики из разных процессов выводятся одним блоком.
+    """
+    families = {}
+    for process, snapshot in snapshots:
+        for kind in ('counters', 'gauges', 'histograms'):
+            for name, series in snapshot.get(kind, {}).items():
+                family = families.setdefault(name, (kind, []))
+                for item in series:
+                    labels = dict(item[0], process=process)
+                    family[1].append((labels, item[1:]))
+
+    lines = []
+    for name in sorted(families):
+        kind, series = families[name]
+        full_name = PREFIX + name
+        if name in DESCRIPTIONS:
+            lines.append(f'# HELP {full_name} {DESCRIPTIONS[name]}')
+        lines.append(f'# TYPE {full_name} {PROMETHEUS_TYPES[kind]}')
+
+        for labels, values in series:
+            if kind != 'histograms':
+                lines.append(f'{full_name}{_format_labels(labels)} {_format_value(values[0])}')
+                continue
+
+            buckets, counts, total, count = values
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + [float('inf')], counts):
+                cumulative += bucket_count
+                bucket_labels = dict(labels, le=_format_value(bound))
+                lines.append(f'{full_name}_bucket{_format_labels(bucket_labels)} {cumulative}')
+            lines.append(f'{full_name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{full_name}_count{_format_labels(labels)} {count}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,124 @@
+"""
+Уведомления парсер -> веб-сервер о записанном тике.
+
+Используются UDP-датаграммы на localhost: работает и на Windows, где нет
+Unix-сокетов, а отправка никогда не блокирует парсер, даже если веб-сервер
+не запущен.
+"""
+import asyncio
+import json
+import logging
+import socket
+import time
+
+# Ограничение размера датаграммы: лишние id не передаем, веб-сервер
+# в этом случае обновляет все матчи
+MAX_MATCH_IDS = 500
+
+
+class TickPublisher:
+    """Отправка события "тик записан" со списком измененных матчей"""
+
+    def __init__(self, host='127.0.0.1', port=8765):
+        self.address = (host, port)
+        self.tick = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def publish(self, match_ids):
+        self.tick += 1
+        match_ids = sorted(set(match_ids))
+        message = {
+            'type': 'tick',
+            'tick': self.tick,
+            'sent_at': time.time(),
+            # None - изменилось слишком много матчей, обновить все
+            'match_ids': match_ids if len(match_ids) <= MAX_MATCH_IDS else None
+        }
+
+        try:
+            self.sock.sendto(json.dumps(message).encode('utf-8'), self.address)
+        except OSError as e:
+            logging.debug(f"Не удалось отправить уведомление о тике: {e}")
+
+    def close(self):
+        self.sock.close()
+
+
+class TickSubscriber(asyncio.DatagramProtocol):
+    """Прием событий парсера в веб-сервере"""
+
+    def __init__(self, heartbeat_timeout=15):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.transport = None
+        self.event = asyncio.Event()
+        self.changed_match_ids = set()
+        self.update_all = False
+        self.last_event_at = None
+        self.received_ticks = 0
+
+    async def start(self, host='127.0.0.1', port=8765):
+        """Открытие сокета; False - канал недоступен (работаем опросом)"""
+        loop = asyncio.get_event_loop()
+        try:
+            await loop.create_datagram_endpoint(
+                lambda: self, local_addr=(host, port))
+            return True
+        except OSError as e:
+            logging.warning(
+                f"Канал уведомлений парсера недоступен ({host}:{port}): {e}")
+            return False
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def connection_lost(self, exc):
+        self.transport = None
+
+    def datagram_received(self, data, addr):
+        try:
+            message = json.loads(data.decode('utf-8'))
+        except ValueError:
+            return
+
+        if not isinstance(message, dict) or message.get('type') != 'tick':
+            return
+
+        match_ids = message.get('match_ids')
+        if match_ids is None:
+            self.update_all = True
+        else:
+            self.changed_match_ids.update(match_ids)
+
+        self.received_ticks += 1
+        self.last_event_at = time.monotonic()
+        self.event.set()
+
+    @property
+    def is_alive(self):
+        """Парсер присылал события недавно"""
+        return (self.transport is not None
+                and self.last_event_at is not None
+                and time.monotonic() - self.last_event_at < self.heartbeat_timeout)
+
+    async def wait_for_tick(self, timeout):
+        """Ожидание события парсера.
+
+        Возвращает множество id измененных матчей, None - по таймауту
+        или если нужно обновить все матчи.
+        """
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+        self.event.clear()
+        match_ids, self.changed_match_ids = self.changed_match_ids, set()
+        if self.update_all:
+            self.update_all = False
+            return None
+        return match_ids
+
+    def close(self):
+        if self.transport:
+            self.transport.close()
@@ -0,0 +1,126 @@
+"""
+Прогноз итогового тотала live-матча по темпу четвертей.
+
+Для каждого матча хранится EWMA темпа (очков в минуту игрового времени)
+отдельно по периодам и общий разброс темпа. Новая запись обновляет
+состояние за O(1); прогноз = текущие очки + темп текущего периода *
+оставшееся время, с доверительным интервалом.
+"""
+import math
+
+from analytics import clock_to_minutes
+
+# z для 90% интервала
+CONFIDENCE_Z = 1.645
+
+
+class MatchProjection:
+    __slots__ = ('minutes', 'points', 'period', 'rate', 'rate_var',
+                 'last_alpha', 'period_rates')
+
+    def __init__(self):
+        self.minutes = None
+        self.points = None
+        self.period = None
+        # Общий EWMA темпа и его дисперсия
+        self.rate = None
+        self.rate_var = 0.0
+        self.last_alpha = 1.0
+        # {период: EWMA темпа в этом периоде}
+        self.period_rates = {}
+
+    def update(self, minutes, points, period, tau):
+        if minutes != minutes or points is None:
+            return
+        period = str(period) if period is not None else None
+
+        if self.minutes is None:
+            self.minutes, self.points, self.period = minutes, points, period
+            if minutes > 0:
+                self.rate = points / minutes
+                self.period_rates[period] = self.rate
+            return
+
+        dt = minutes - self.minutes
+        if dt <= 0:
+            # Время не сдвинулось: учитываем только изменение счета
+            self.points = max(self.points, points)
+            return
+
+        instant = max(points - self.points, 0) / dt
+        alpha = 1.0 - math.exp(-dt / tau)
+
+        if self.rate is None:
+            self.rate = instant
+        else:
+            # Экспоненциально взвешенные среднее и дисперсия
+            delta = instant - self.rate
+            self.rate += alpha * delta
+            self.rate_var = (1.0 - alpha) * (self.rate_var + alpha * delta * delta)
+        self.last_alpha = alpha
+
+        # Новый период стартует с общего темпа
+        period_rate = self.period_rates.get(period)
+        if period_rate is None:
+            period_rate = self.rate
+        self.period_rates[period] = period_rate + alpha * (instant - period_rate)
+
+        self.minutes, self.points, self.period = minutes, points, period
+
+    def snapshot(self, total_match_time, dispersion):
+        if self.rate is None:
+            return None
+
+        rate = self.period_rates.get(self.period, self.rate)
+        remaining = max(total_match_time - self.minutes, 0.0)
+        projected = self.points + rate * remaining
+
+        # Разброс: случайность оставшихся очков + неточность оценки темпа
+        estimate_var = self.rate_var * self.last_alpha / (2.0 - self.last_alpha)
+        std = math.sqrt(dispersion * max(rate, 0.0) * remaining
+                        + remaining * remaining * estimate_var)
+
+        return {
+            'projected_total': round(projected, 1),
+            'low': round(max(projected - CONFIDENCE_Z * std, self.points), 1),
+            'high': round(projected + CONFIDENCE_Z * std, 1),
+            'confidence': 0.9,
+            'pace': round(rate * total_match_time, 1),
+            'period_paces': {
+                period: round(period_rate * total_match_time, 1)
+                for period, period_rate in self.period_rates.items() if period is not None
+            },
+        }
+
+
+class ProjectionTracker:
+    """Прогнозы всех live-матчей, обновляемые потоком новых записей"""
+
+    def __init__(self, tau_minutes=4.0, dispersion=2.0):
+        # Постоянная EWMA в минутах игрового времени
+        self.tau = tau_minutes
+        # Отношение дисперсии очков к среднему (очки идут по 2-3)
+        self.dispersion = dispersion
+        self.matches = {}
+
+    def update(self, match_id, timestamp, period, total_points):
+        projection = self.matches.get(match_id)
+        if projection is None:
+            projection = self.matches[match_id] = MatchProjection()
+        projection.update(clock_to_minutes(timestamp), total_points, period, self.tau)
+
+    def snapshot(self, match_id, total_match_time):
+        projection = self.matches.get(match_id)
+        if projection is None:
+            return None
+        return projection.snapshot(total_match_time or 40, self.dispersion)
+
+    def ingest(self, rows):
+        """Строки Database.get_live_rows_after"""
+        for row in rows:
+            self.update(row[1], row[8], row[9], row[10])
+
+    def prune(self, active_ids):
+        for match_id in list(self.matches):
+            if match_id not in active_ids:
+                del self.matches[match_id]
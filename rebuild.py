@@ -0,0 +1,234 @@
+"""
+Параллельный пересчет производных данных по истории match_stats.
+
+Матчи делятся на диапазоны id. Диапазоны считаются в пуле процессов, у
+каждого свое соединение только для чтения. Записывает результаты один
+процесс (основной) крупными транзакциями, вместе с отметками обработанных
+диапазонов (rebuild_checkpoints): остановленный пересчет продолжается с
+места остановки.
+
+Данные матча записываются заменой, как при обычном обновлении, поэтому
+пересчет можно запускать при работающем парсере: транзакции короткие, а
+матчи, появившиеся после старта, парсер и веб-сервер ведут сами.
+
+Пример:
+    python rebuild.py --job periods --workers 4
+    python rebuild.py --job analytics --restart --reset
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from urllib.request import pathname2url
+
+import aggregates
+import match_periods
+from config import DATABASE_CONFIG
+from database import Database
+
+
+class ReadOnlyDatabase:
+    """Соединение только для чтения: без создания таблиц и блокировок записи"""
+
+    def __init__(self, db_path):
+        uri = f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro"
+        self.conn = sqlite3.connect(uri, uri=True, timeout=20.0)
+
+
+def compute_analytics(db, match_ids):
+    return [(match_id, aggregates.match_facts(db, match_id)) for match_id in match_ids]
+
+
+def write_analytics(conn, results):
+    for match_id, facts in results:
+        aggregates.replace_facts(conn, match_id, facts)
+
+
+def reset_analytics(conn):
+    conn.execute('DELETE FROM analytics_facts')
+    conn.execute('DELETE FROM analytics_groups')
+    conn.execute('DELETE FROM analytics_histograms')
+
+
+def compute_periods(db, match_ids):
+    return [
+        (match_id, match_periods.fold_periods(
+            match_id, match_periods.load_history(db.conn, match_id)))
+        for match_id in match_ids
+    ]
+
+
+def write_periods(conn, results):
+    for match_id, rows in results:
+        match_periods.replace_match_periods(conn, match_id, rows)
+
+
+def reset_periods(conn):
+    # Периоды live-матчей ведутся при сохранении записей - их не трогаем
+    conn.execute('''
+        DELETE FROM match_periods
+        WHERE match_id IN (SELECT id FROM matches WHERE status = 'finished')
+    ''')
+
+
+# where - отбор матчей; compute - в процессе пула, write/reset - у писателя
+JOBS = {
+    'analytics': {
+        'where': "status = 'finished'",
+        'compute': compute_analytics,
+        'write': write_analytics,
+        'reset': reset_analytics,
+    },
+    'periods': {
+        'where': "status = 'finished'",
+        'compute': compute_periods,
+        'write': write_periods,
+        'reset': reset_periods,
+    },
+}
+
+_worker_db = None
+
+
+def _init_worker(db_path):
+    global _worker_db
+    _worker_db = ReadOnlyDatabase(db_path)
+
+
+def compute_range(job, range_start, range_end):
+    """Расчет диапазона id в процессе пула: (начало, число матчей, результаты)"""
+    match_ids = [row[0] for row in _worker_db.conn.execute(f'''
+        SELECT id FROM matches
+        WHERE id >= ? AND id < ? AND {JOBS[job]['where']}
+        ORDER BY id
+    ''', (range_start, range_end))]
+    return range_start, len(match_ids), JOBS[job]['compute'](_worker_db, match_ids)
+
+
+def start_run(conn, job, range_size, restart=False, reset=False):
+    """Параметры запуска: прежние для незавершенного пересчета или новые"""
+    run = conn.execute(
+        'SELECT range_size, max_id, finished_at FROM rebuild_runs WHERE job = ?', (job,)
+    ).fetchone()
+    if run and run[2] is None and not restart:
+        logging.info(f"Продолжение пересчета {job}: диапазоны по {run[0]} id, до id {run[1]}")
+        if reset:
+            logging.warning("--reset игнорируется при продолжении (нужен --restart)")
+        return run[0], run[1]
+
+    # Матчи после max_id ведутся обычным обновлением
+    max_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM matches').fetchone()[0]
+    conn.execute('DELETE FROM rebuild_checkpoints WHERE job = ?', (job,))
+    conn.execute('''
+        INSERT OR REPLACE INTO rebuild_runs (job, range_size, max_id) VALUES (?, ?, ?)
+    ''', (job, range_size, max_id))
+    if reset:
+        JOBS[job]['reset'](conn)
+    conn.commit()
+    return range_size, max_id
+
+
+def write_batch(conn, job, batch):
+    """Результаты нескольких диапазонов и их отметки - одной транзакцией"""
+    try:
+        for range_start, matches, results in batch:
+            JOBS[job]['write'](conn, results)
+            conn.execute('''
+                INSERT OR REPLACE INTO rebuild_checkpoints (job, range_start, matches)
+                VALUES (?, ?, ?)
+            ''', (job, range_start, matches))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def rebuild(db_path, job, workers=None, range_size=1000, batch_matches=2000,
+            restart=False, reset=False):
+    """Пересчет job по всем матчам; возвращает число обработанных матчей"""
+    db = Database(db_path)
+    conn = db.conn
+    range_size, max_id = start_run(conn, job, range_size, restart, reset)
+
+    done = {row[0] for row in conn.execute(
+        'SELECT range_start FROM rebuild_checkpoints WHERE job = ?', (job,))}
+    all_ranges = range(1, max_id + 1, range_size)
+    pending_ranges = iter([start for start in all_ranges if start not in done])
+    ranges_done = len(done)
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+
+    processed = 0
+    started = time.perf_counter()
+    batch, batch_size = [], 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(db_path,)) as pool:
+        # Не больше двух диапазонов на процесс: результаты не копятся в памяти
+        running = set()
+
+        def submit_next():
+            range_start = next(pending_ranges, None)
+            if range_start is not None:
+                running.add(pool.submit(
+                    compute_range, job, range_start, min(range_start + range_size, max_id + 1)))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while running:
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                batch.append(result)
+                batch_size += result[1]
+                submit_next()
+
+            if batch_size >= batch_matches or not running:
+                write_batch(conn, job, batch)
+                ranges_done += len(batch)
+                processed += batch_size
+                batch, batch_size = [], 0
+
+                elapsed = time.perf_counter() - started
+                rate = processed / elapsed if elapsed else 0
+                left = len(all_ranges) - ranges_done
+                eta = left * elapsed / max(ranges_done - len(done), 1)
+                logging.info(
+                    f"{job}: диапазонов {ranges_done}/{len(all_ranges)}, матчей {processed} "
+                    f"({rate:.0f}/с), осталось ~{eta:.0f} с")
+
+    conn.execute(
+        'UPDATE rebuild_runs SET finished_at = CURRENT_TIMESTAMP WHERE job = ?', (job,))
+    conn.commit()
+    conn.close()
+    return processed
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Параллельный пересчет производных данных')
+    parser.add_argument('--job', required=True, choices=sorted(JOBS))
+    parser.add_argument('--db', default=DATABASE_CONFIG['DB_PATH'])
+    parser.add_argument('--workers', type=int, help='процессов (по умолчанию - ядра - 1)')
+    parser.add_argument('--range-size', type=int, default=1000, help='id матчей в диапазоне')
+    parser.add_argument('--batch-matches', type=int, default=2000,
+                        help='матчей в одной транзакции записи')
+    parser.add_argument('--restart', action='store_true',
+                        help='начать заново, даже если прошлый пересчет не завершен')
+    parser.add_argument('--reset', action='store_true',
+                        help='очистить производные данные перед новым пересчетом')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    processed = rebuild(args.db, args.job, args.workers, args.range_size,
+                        args.batch_matches, args.restart, args.reset)
+    logging.info(f"Пересчет {args.job} завершен: матчей {processed} "
+                 f"за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
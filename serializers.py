@@ -0,0 +1,73 @@
+"""
+Сериализация ответов API и сообщений WebSocket.
+
+JSON кодируется через orjson, если он установлен (иначе стандартный json),
+MessagePack доступен при установленном msgpack. Формат выбирается по
+заголовку Accept или подпротоколу WebSocket ("json" / "msgpack").
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = 'application/json'
+MSGPACK_MEDIA_TYPE = 'application/msgpack'
+MSGPACK_MEDIA_TYPES = (MSGPACK_MEDIA_TYPE, 'application/x-msgpack')
+
+# Подпротоколы WebSocket
+WS_JSON = 'json'
+WS_MSGPACK = 'msgpack'
+
+
+def dumps_json(payload):
+    """JSON в байтах (UTF-8, без экранирования кириллицы)"""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(payload, ensure_ascii=False).encode('utf-8')
+
+
+def dumps_msgpack(payload):
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def loads_msgpack(data):
+    return msgpack.unpackb(data, raw=False)
+
+
+def negotiate_media_type(accept):
+    """Формат ответа по заголовку Accept (по умолчанию JSON)"""
+    if msgpack is not None and accept:
+        accept = accept.lower()
+        if any(media_type in accept for media_type in MSGPACK_MEDIA_TYPES):
+            return MSGPACK_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def encode(payload, media_type):
+    if media_type == MSGPACK_MEDIA_TYPE:
+        return dumps_msgpack(payload)
+    return dumps_json(payload)
+
+
+def negotiate_subprotocol(requested):
+    """Подпротокол WebSocket из запрошенных клиентом (None - JSON по умолчанию)"""
+    for subprotocol in requested or []:
+        if subprotocol == WS_MSGPACK and msgpack is not None:
+            return WS_MSGPACK
+        if subprotocol == WS_JSON:
+            return WS_JSON
+    return None
+
+
+def encode_frame(payload, encoding):
+    """Кадр WebSocket: bytes для MessagePack, str для JSON"""
+    if encoding == WS_MSGPACK:
+        return dumps_msgpack(payload)
+    return dumps_json(payload).decode('utf-8')
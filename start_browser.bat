@@ -0,0 +1,23 @@
+@echo off
+chcp 65001
+title Basketball Parser - Chrome
+
+echo ========================================
+echo    Basketball Parser - Shared Chrome
+echo ========================================
+echo.
+
+cd /d "%~dp0"
+
+rem Chrome for the parser to attach to: set in config.py
+rem BROWSER_CONFIG['DEBUGGER_ADDRESS'] = '127.0.0.1:9222'
+set CHROME="C:\Program Files\Google\Chrome\Application\chrome.exe"
+if not exist %CHROME% set CHROME="%LOCALAPPDATA%\Google\Chrome\Application\chrome.exe"
+
+echo Starting Chrome with remote debugging on port 9222...
+start "" %CHROME% --remote-debugging-port=9222 --user-data-dir="%~dp0chrome_profile" --disk-cache-dir="%~dp0chrome_cache" --blink-settings=imagesEnabled=false https://fon.bet/live/basketball
+
+echo.
+echo Chrome started. Parser restarts will reuse this browser.
+timeout /t 2 /nobreak >nul
+exit
\ No newline at end of file
@@ -0,0 +1,175 @@
+"""
+Генератор синтетической базы: matches + match_stats с историей по тикам.
+
+Матчи разного формата (40 и 48 минут), в основном завершенные, часть
+активных (свежих и "зависших"), часть недоигранных. Счет растет с
+темпом матча, тотал букмекера дрейфует вокруг прогноза. После генерации
+заполняются поисковый индекс, match_periods и агрегаты аналитики.
+
+Пример: python synthetic_data.py --db bench.db --matches 10000 --ticks 120
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+import aggregates
+import match_periods
+from database import Database
+
+TOURNAMENTS_48 = ['США. NBA', 'США. NBA. G-Лига', 'Китай. CBA', 'Филиппины. PBA']
+TOURNAMENTS_40 = [
+    'Европа. Евролига', 'Европа. Еврокубок', 'Испания. ACB', 'Италия. Серия A',
+    'Германия. BBL', 'Франция. LNB', 'Турция. BSL', 'Греция. A1',
+    'Россия. Единая лига ВТБ', 'Россия. Суперлига', 'Литва. LKL', 'Австралия. NBL',
+    'Аргентина. Лига', 'Бразилия. NBB', 'Япония. B-Лига', 'Корея. KBL',
+]
+
+# Доли статусов
+FINISHED_SHARE = 0.9
+ACTIVE_SHARE = 0.02
+# Доля завершенных матчей, оборванных до конца (не попадают в архив)
+ABANDONED_SHARE = 0.05
+
+
+def _odds(rng):
+    return round(rng.uniform(1.7, 2.1), 2)
+
+
+def match_history(rng, match_id, total_match_time, ticks, started_at, played_share=1.0):
+    """Записи match_stats одного матча: (match_id, timestamp, period, score,
+    total_points, total_value, under, over, p1, p2, recorded_at)"""
+    period_length = total_match_time / 4
+    pace = rng.gauss(175 if total_match_time == 40 else 220, 15)
+    line = round(pace + rng.gauss(0, 6)) + 0.5
+    home_share = rng.uniform(0.42, 0.58)
+
+    played_seconds = int(total_match_time * 60 * played_share)
+    # Последняя запись - почти конец матча (как у реального парсера)
+    seconds = sorted(rng.sample(range(1, max(played_seconds, ticks + 1)), ticks))
+    if played_share >= 1.0:
+        seconds[-1] = max(seconds[-1], played_seconds - rng.randint(0, 10))
+
+    rows = []
+    home = away = 0
+    previous_second = 0
+    real_time = started_at
+    for second in seconds:
+        # Очки за интервал с темпом матча
+        expected = pace / (total_match_time * 60) * (second - previous_second)
+        scored = max(0, int(round(rng.gauss(expected, max(expected, 1) ** 0.5))))
+        home_points = int(scored * home_share + rng.random())
+        home += home_points
+        away += scored - home_points
+        # Перерывы между периодами растягивают реальное время
+        real_time += timedelta(seconds=(second - previous_second) * rng.uniform(1.2, 2.0))
+        previous_second = second
+
+        if rng.random() < 0.2:
+            line += rng.choice((-1, 1)) * rng.choice((0.5, 1.0, 1.5))
+        rows.append((
+            match_id,
+            f"{second // 60:02d}:{second % 60:02d}",
+            min(int(second // (period_length * 60)) + 1, 4),
+            f"{home}:{away}",
+            home + away,
+            line,
+            _odds(rng), _odds(rng), _odds(rng), _odds(rng),
+            real_time.strftime('%Y-%m-%d %H:%M:%S')
+        ))
+    return rows
+
+
+def generate(db_path, matches=1000, ticks=120, days=180, seed=42, batch_size=1000):
+    """Заполнение базы db_path синтетическими матчами; возвращает число записей"""
+    rng = random.Random(seed)
+    db = Database(db_path)
+    conn = db.conn
+    conn.execute('PRAGMA synchronous = OFF')
+
+    # CURRENT_TIMESTAMP в SQLite - UTC
+    now = datetime.utcnow()
+    first_id = (conn.execute('SELECT COALESCE(MAX(id), 0) FROM matches').fetchone()[0]) + 1
+    stats_rows = 0
+
+    for batch_start in range(0, matches, batch_size):
+        match_rows = []
+        history_rows = []
+        for index in range(batch_start, min(batch_start + batch_size, matches)):
+            match_id = first_id + index
+            if rng.random() < 0.3:
+                tournament = rng.choice(TOURNAMENTS_48)
+                total_match_time = 48
+            else:
+                tournament = rng.choice(TOURNAMENTS_40)
+                total_match_time = 40
+
+            roll = rng.random()
+            if roll < ACTIVE_SHARE:
+                # Идет сейчас, обновлен только что
+                status, played_share = 'active', rng.uniform(0.1, 0.9)
+                started_at = now - timedelta(minutes=total_match_time * played_share * 1.6)
+            elif roll < FINISHED_SHARE + ACTIVE_SHARE:
+                status = 'finished'
+                played_share = rng.uniform(0.3, 0.9) if rng.random() < ABANDONED_SHARE else 1.0
+                started_at = now - timedelta(days=rng.uniform(0.1, days))
+            else:
+                # "Зависший" активный матч, пропавший со страницы давно
+                status, played_share = 'active', rng.uniform(0.2, 1.0)
+                started_at = now - timedelta(days=rng.uniform(0.1, days))
+
+            history = match_history(
+                rng, match_id, total_match_time, ticks, started_at, played_share)
+            created_at = started_at.strftime('%Y-%m-%d %H:%M:%S')
+            match_rows.append((
+                match_id, f"Команда {2 * match_id} - Команда {2 * match_id + 1}",
+                tournament, history[-1][1], total_match_time, status,
+                created_at, history[-1][-1]))
+            history_rows.extend(history)
+
+        conn.executemany('''
+            INSERT INTO matches
+            (id, teams, tournament, current_time, total_match_time, status, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', match_rows)
+        conn.executemany('''
+            INSERT INTO match_stats
+            (match_id, timestamp, period, score, total_points, total_value,
+             under_odds, over_odds, p1_odds, p2_odds, recorded_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', history_rows)
+        conn.commit()
+        stats_rows += len(history_rows)
+        logging.info(f"Сгенерировано матчей: {min(batch_start + batch_size, matches)}/{matches}")
+
+    # Поисковый индекс досоздается для новых матчей, периоды и агрегаты
+    # аналитики - как у базы, заполненной парсером
+    db._init_search()
+    match_periods.backfill(db)
+    aggregates.rebuild(db)
+    conn.close()
+    return stats_rows
+
+
+def main():
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+    )
+    parser = argparse.ArgumentParser(description='Синтетическая база матчей')
+    parser.add_argument('--db', required=True, help='файл SQLite (дополняется)')
+    parser.add_argument('--matches', type=int, default=1000)
+    parser.add_argument('--ticks', type=int, default=120, help='записей на матч')
+    parser.add_argument('--days', type=int, default=180, help='глубина истории')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = generate(args.db, args.matches, args.ticks, args.days, args.seed)
+    logging.info(
+        f"Готово: {args.matches} матчей, {rows} записей за {time.perf_counter() - started:.1f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -24,14 +24,29 @@ window.onclick = function(event) {
     }
 }
 
-// Функция загрузки архивных матчей
-function loadArchiveMatches() {
-    const dateFrom = document.getElementById('dateFrom').value;
-    const dateTo = document.getElementById('dateTo').value;
-    const tournament = document.getElementById('tournament').value;
-    const team = document.getElementById('team').value;
+// Загруженные страницы архива и курсор следующей страницы
+let archiveMatches = [];
+let archiveNextCursor = null;
+let archiveTotalMatches = 0;
+// Фильтры первой страницы: следующие страницы запрашиваются с ними же
+let archiveFilters = {};
+const ARCHIVE_FILTER_IDS = ['dateFrom', 'dateTo', 'tournament', 'team'];
 
-    document.getElementById('matches-table').innerHTML = '<div class="loading">🔄 Загрузка архивных матчей...</div>';
+// Функция загрузки архивных матчей (append - следующая страница)
+function loadArchiveMatches(append = false) {
+    if (!append) {
+        archiveFilters = {};
+        ARCHIVE_FILTER_IDS.forEach(id => {
+            archiveFilters[id] = document.getElementById(id).value;
+        });
+    }
+    const { dateFrom, dateTo, tournament, team } = archiveFilters;
+
+    if (!append) {
+        archiveMatches = [];
+        archiveNextCursor = null;
+        document.getElementById('matches-table').innerHTML = '<div class="loading">🔄 Загрузка архивных матчей...</div>';
+    }
     document.getElementById('stats').innerHTML = 'Загрузка...';
 
     let url = '/api/matches/archive?';
@@ -41,13 +56,17 @@ function loadArchiveMatches() {
     if (dateTo) params.push(`date_to=${dateTo}`);
     if (tournament) params.push(`tournament=${encodeURIComponent(tournament)}`);
     if (team) params.push(`team=${encodeURIComponent(team)}`);
+    if (append && archiveNextCursor) params.push(`cursor=${encodeURIComponent(archiveNextCursor)}`);
     
     url += params.join('&');
 
     fetch(url)
         .then(response => response.json())
         .then(data => {
-            updateArchiveTable(data.matches);
+            archiveMatches = archiveMatches.concat(data.matches || []);
+            archiveNextCursor = data.next_cursor;
+            archiveTotalMatches = data.stats ? data.stats.total_matches || 0 : 0;
+            updateArchiveTable(archiveMatches);
             updateArchiveStats(data.stats);
         })
         .catch(error => {
@@ -68,7 +87,7 @@ function updateArchiveTable(matches) {
     }
 
     document.getElementById('stats').innerHTML = 
-        `📊 Найдено матчей: ${matches.length}`;
+        `📊 Найдено матчей: ${archiveTotalMatches || matches.length} | Показано: ${matches.length}`;
 
     let html = `
         <table>
@@ -147,6 +166,9 @@ function updateArchiveTable(matches) {
     });
 
     html += '</tbody></table>';
+    if (archiveNextCursor) {
+        html += '<div class="load-more"><button class="btn" onclick="loadArchiveMatches(true)">⬇️ Загрузить еще</button></div>';
+    }
     document.getElementById('matches-table').innerHTML = html;
 }
 
@@ -223,7 +245,7 @@ function showArchiveChart(matchId, teams) {
     
     currentOpenMatchId = matchId;
     
-    fetch(`/api/matches/${matchId}/chart`)
+    fetch(`/api/matches/${matchId}/chart?max_points=${CHART_MAX_POINTS}`)
         .then(response => response.json())
         .then(data => {
             if (data.error) {
@@ -285,9 +307,52 @@ function getDeviationClass(deviation) {
     return 'neutral';
 }
 
+// Автодополнение фильтров команды и турнира
+function setupSuggestions(inputId, listId, field) {
+    const input = document.getElementById(inputId);
+    const list = document.getElementById(listId);
+    if (!input || !list) return;
+
+    let timer = null;
+    input.addEventListener('input', function() {
+        clearTimeout(timer);
+        const query = input.value.trim();
+        if (query.length < SEARCH_MIN_LENGTH) {
+            list.innerHTML = '';
+            return;
+        }
+
+        timer = setTimeout(() => {
+            fetch(`/api/search/suggest?field=${field}&q=${encodeURIComponent(query)}`)
+                .then(response => response.json())
+                .then(data => {
+                    list.innerHTML = (data.suggestions || [])
+                        .map(value => `<option value="${escapeHtml(value)}"></option>`)
+                        .join('');
+                })
+                .catch(error => console.error('Ошибка автодополнения:', error));
+        }, 250);
+    });
+}
+
+// Фильтр изменен - загруженные страницы относятся к прежним фильтрам,
+// продолжить их нельзя: следующая загрузка - только через "Применить"
+function resetArchiveCursor() {
+    archiveNextCursor = null;
+    const loadMore = document.querySelector('#matches-table .load-more');
+    if (loadMore) loadMore.remove();
+}
+
 // Загрузка архива при открытии страницы
 document.addEventListener('DOMContentLoaded', function() {
     loadArchiveMatches();
+    setupSuggestions('team', 'teamSuggestions', 'team');
+    setupSuggestions('tournament', 'tournamentSuggestions', 'tournament');
+    ARCHIVE_FILTER_IDS.forEach(id => {
+        const input = document.getElementById(id);
+        input.addEventListener('input', resetArchiveCursor);
+        input.addEventListener('change', resetArchiveCursor);
+    });
     
     // Устанавливаем даты по умолчанию (последние 7 дней)
     const today = new Date();
@@ -409,7 +409,7 @@ function showMatchChart(matchId, teams) {
         matchInfo: matchInfo
     });
     
-    fetch(`/api/matches/${matchId}/chart`)
+    fetch(`/api/matches/${matchId}/chart?max_points=${CHART_MAX_POINTS}`)
         .then(response => response.json())
         .then(data => {
             if (data.error) {
@@ -425,6 +425,11 @@ function showMatchChart(matchId, teams) {
             
             createChart(data, teams, matchInfo.tournament, matchInfo.currentTime);
             modal.style.display = 'block';
+
+            // Дальше сервер присылает только новые точки
+            if (typeof subscribeChart === 'function') {
+                subscribeChart(matchId, data.last_id);
+            }
         })
         .catch(error => {
             console.error('Ошибка загрузки графика:', error);
@@ -495,6 +500,23 @@ function createChart(chartData, teams, tournament, currentTime) {
             }
         });
     }
+    // Счет на конец каждого периода (match_periods)
+    if (chartData.period_markers) {
+        chartData.period_markers.forEach(marker => {
+            if (!marker.end_time || marker.total_points === null) return;
+            const points = marker.points !== null ? ` (+${marker.points})` : '';
+            periodAnnotations[`period_score_${marker.period}`] = {
+                type: 'label',
+                xValue: timeToMinutes(marker.end_time),
+                yValue: marker.total_points,
+                content: `${marker.score}${points}`,
+                position: { x: 'end', y: 'end' },
+                backgroundColor: 'rgba(255, 165, 0, 0.15)',
+                color: '#555',
+                font: { size: 10 }
+            };
+        });
+    }
     if (betTimestampIndex !== -1) {
         const betMinutes = timeToMinutes(chartData.bet_timestamp);
         annotations.betLine = {
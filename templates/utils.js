@@ -12,6 +12,9 @@ const BET_CONFIG = {
     WARNING_PERCENT: 10
 };
 
+// Максимум точек графика: длинная история прореживается на сервере
+const CHART_MAX_POINTS = 600;
+
 // ==================== ОБЩИЕ УТИЛИТЫ ====================
 
 // Экранирование HTML
@@ -235,6 +238,9 @@ function closeChartModal() {
         currentChart.destroy();
         currentChart = null;
     }
+    if (currentOpenMatchId && typeof unsubscribeChart === 'function') {
+        unsubscribeChart(currentOpenMatchId);
+    }
     currentOpenMatchId = null;
 }
 
@@ -5,12 +5,18 @@ function connectWebSocket() {
     const wsUrl = `${protocol}//${window.location.host}/ws`;
     
     const socket = new WebSocket(wsUrl);
+    window.wsSocket = socket;
     
     socket.onopen = function() {
         console.log('✅ WebSocket connected');
         wsConnected = true;
         window.wsConnected = true;
         document.getElementById('stats').innerHTML = '🟢 Подключено | Ожидание данных...';
+
+        // После переподключения восстанавливаем подписку на открытый график
+        if (window.currentOpenMatchId && window.currentChartData) {
+            subscribeChart(window.currentOpenMatchId, window.currentChartData.last_id);
+        }
     };
     
     socket.onmessage = function(event) {
@@ -19,6 +25,10 @@ function connectWebSocket() {
             if (data.type === "table_update") {
                 updateTable(data.data.matches);
                 updateOpenChart(data.data.matches);
+            } else if (data.type === "chart_points") {
+                appendChartPoints(data.match_id, data.data);
+            } else if (data.type === "alerts") {
+                showAlerts(data.data);
             }
         } catch (error) {
             console.error('❌ Error parsing WebSocket message:', error);
@@ -29,6 +39,7 @@ function connectWebSocket() {
         console.log('❌ WebSocket disconnected');
         wsConnected = false;
         window.wsConnected = false;
+        window.chartSubscribed = false;
         document.getElementById('stats').innerHTML = '🟡 Переподключение...';
         setTimeout(connectWebSocket, 5000);
     };
@@ -38,17 +49,86 @@ function connectWebSocket() {
     };
 }
 
-// Функция обновления открытого графика
+// Оповещения по правилам: последние сообщения в углу страницы
+const ALERTS_SHOWN = 5;
+
+function showAlerts(alerts) {
+    let container = document.getElementById('alerts');
+    if (!container) {
+        container = document.createElement('div');
+        container.id = 'alerts';
+        container.className = 'alerts';
+        document.body.appendChild(container);
+    }
+
+    alerts.forEach(alert => {
+        const item = document.createElement('div');
+        item.className = 'alert-item';
+        item.textContent = `🔔 ${alert.teams} (${alert.match_time || '-'}): ${alert.message}`;
+        container.prepend(item);
+    });
+    while (container.children.length > ALERTS_SHOWN) {
+        container.removeChild(container.lastChild);
+    }
+}
+
+// Подписка на новые точки графика открытого матча
+function subscribeChart(matchId, lastId) {
+    const socket = window.wsSocket;
+    if (!socket || socket.readyState !== WebSocket.OPEN) {
+        window.chartSubscribed = false;
+        return;
+    }
+    socket.send(JSON.stringify({
+        type: 'subscribe_chart',
+        match_id: matchId,
+        last_id: lastId || 0
+    }));
+    window.chartSubscribed = true;
+}
+
+function unsubscribeChart(matchId) {
+    const socket = window.wsSocket;
+    window.chartSubscribed = false;
+    if (!socket || socket.readyState !== WebSocket.OPEN) return;
+    socket.send(JSON.stringify({
+        type: 'unsubscribe_chart',
+        match_id: matchId
+    }));
+}
+
+// Добавление присланных сервером точек к текущему графику
+function appendChartPoints(matchId, points) {
+    if (matchId !== window.currentOpenMatchId || !window.currentChart) return;
+
+    const chartData = window.currentChartData;
+    if (!chartData || !chartData.timestamps) return;
+
+    const merged = Object.assign({}, chartData, {
+        timestamps: chartData.timestamps.concat(points.timestamps),
+        scores: chartData.scores.concat(points.scores),
+        total_points: chartData.total_points.concat(points.total_points),
+        total_values: chartData.total_values.concat(points.total_values),
+        pace_data: chartData.pace_data.concat(points.pace_data),
+        last_id: points.last_id
+    });
+
+    refreshChart(merged);
+}
+
+// Функция обновления открытого графика (если подписка недоступна)
 function updateOpenChart(matches) {
     if (!window.currentOpenMatchId || !window.currentChart) return;
+    if (window.chartSubscribed) return;
     
     const currentMatch = matches.find(match => match.id === window.currentOpenMatchId);
     if (currentMatch) {
-        fetch(`/api/matches/${window.currentOpenMatchId}/chart`)
+        fetch(`/api/matches/${window.currentOpenMatchId}/chart?max_points=${CHART_MAX_POINTS}`)
             .then(response => response.json())
             .then(data => {
                 if (!data.error) {
                     refreshChart(data);
+                    subscribeChart(window.currentOpenMatchId, data.last_id);
                 }
             })
             .catch(error => console.error('❌ Error updating chart:', error));
@@ -0,0 +1,64 @@
+from alerts import AlertEngine, AlertRule
+
+
+def match_data(clock, points, total='160.5'):
+    return {
+        'teams': 'Команда А - Команда Б', 'tournament': 'Лига', 'time': clock,
+        'total_match_time': 40, 'period': 3, 'score': f'{points // 2}:{points - points // 2}',
+        'total_points': points, 'total': total,
+    }
+
+
+def pace_engine(cooldown=300):
+    return AlertEngine([AlertRule({
+        'id': 'pace', 'metric': 'pace_deviation', 'op': '<', 'value': -15,
+        'period': '3', 'cooldown': cooldown,
+    })])
+
+
+def test_pace_rule_fires_during_scoreless_stretch():
+    engine = pace_engine()
+    assert engine.evaluate(1, match_data('20:00', 80), now=0) == []
+
+    # Очки не меняются, темп падает только со временем
+    assert engine.evaluate(1, match_data('22:00', 80), now=120) == []
+    alerts = engine.evaluate(1, match_data('25:00', 80), now=300)
+    assert [alert['rule_id'] for alert in alerts] == ['pace']
+    # Пока условие выполняется, повторно не срабатывает
+    assert engine.evaluate(1, match_data('25:30', 80), now=330) == []
+
+
+def test_rising_edge_during_cooldown_fires_after_it():
+    engine = pace_engine(cooldown=600)
+    assert len(engine.evaluate(1, match_data('25:00', 80), now=0)) == 1
+    # Условие перестало выполняться и снова выполнилось во время паузы
+    assert engine.evaluate(1, match_data('25:10', 100), now=10) == []
+    assert engine.evaluate(1, match_data('29:00', 100), now=240) == []
+    assert engine.evaluate(1, match_data('30:00', 100), now=500) == []
+
+    alerts = engine.evaluate(1, match_data('30:30', 100), now=610)
+    assert [alert['rule_id'] for alert in alerts] == ['pace']
+
+
+def total_move_engine():
+    return AlertEngine([AlertRule({
+        'id': 'move', 'metric': 'total_move', 'op': '>=', 'value': 5, 'abs': True,
+        'window_seconds': 60,
+    })])
+
+
+def test_total_move_after_flat_line_longer_than_window():
+    engine = total_move_engine()
+    assert engine.evaluate(1, match_data('20:00', 80, '150.5'), now=0) == []
+    # Линия стоит дольше окна, затем резко сдвигается
+    assert engine.evaluate(1, match_data('22:00', 82, '150.5'), now=200) == []
+    alerts = engine.evaluate(1, match_data('22:10', 82, '157.5'), now=210)
+    assert [(alert['rule_id'], alert['value']) for alert in alerts] == [('move', 7.0)]
+
+
+def test_total_move_ignores_changes_before_window():
+    engine = total_move_engine()
+    engine.evaluate(1, match_data('20:00', 80, '150.5'), now=0)
+    engine.evaluate(1, match_data('20:10', 80, '153.5'), now=10)
+    # Сдвиг на 6 очков растянут дольше окна: в окне только +3
+    assert engine.evaluate(1, match_data('22:00', 82, '156.5'), now=120) == []
@@ -0,0 +1,93 @@
+import pytest
+
+from database import Database
+
+
+def match_data(clock, score='10:8', total='160.5'):
+    home, away = score.split(':')
+    return {
+        'teams': 'Команда А - Команда Б', 'tournament': 'Лига', 'time': clock,
+        'total_match_time': 40, 'period': 1, 'score': score,
+        'total_points': int(home) + int(away), 'total': total,
+        'p1': '1.8', 'p2': '2.0', 'under': '1.9', 'over': '1.9',
+    }
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'test.db'), change_only=True)
+    yield database
+    database.conn.close()
+
+
+def test_clock_only_ticks_are_read_incrementally(db):
+    _, _, _, match_id = db.save_match_data(match_data('01:00'))
+    _, cursor = db.get_active_live_rows()
+    chart_cursor = db.get_chart_points_after(match_id)[-1][0]
+
+    for clock in ('01:05', '01:10', '01:15'):
+        db.save_match_data(match_data(clock))
+
+    # Значения не менялись - новых строк нет, отсчеты дописаны в clock_run
+    assert db.conn.execute('SELECT COUNT(*) FROM match_stats').fetchone()[0] == 1
+
+    live_rows = db.get_live_rows_after(cursor)
+    assert [row[8] for row in live_rows] == ['01:05', '01:10', '01:15']
+    chart_rows = db.get_chart_points_after(match_id, chart_cursor)
+    assert [row[1] for row in chart_rows] == ['01:05', '01:10', '01:15']
+
+    # Курсор по последнему отсчету - повторно ничего не отдается
+    assert db.get_live_rows_after(live_rows[-1][0]) == []
+    assert db.get_chart_points_after(match_id, chart_rows[-1][0]) == []
+
+    # Полный график совпадает с полученным по частям
+    full = db.get_chart_points_after(match_id)
+    assert [row[1] for row in full] == ['01:00', '01:05', '01:10', '01:15']
+    assert [row[0] for row in full[1:]] == [row[0] for row in chart_rows]
+
+
+def test_incremental_reads_mix_new_rows_and_clock_runs(db):
+    _, _, _, match_id = db.save_match_data(match_data('01:00'))
+    cursor = db.get_last_sample_id()
+
+    db.save_match_data(match_data('01:05'))
+    db.save_match_data(match_data('01:10', score='12:8'))
+    db.save_match_data(match_data('01:15', score='12:8'))
+
+    rows = db.get_live_rows_after(cursor)
+    assert [(row[8], row[11]) for row in rows] == [
+        ('01:05', '10:8'), ('01:10', '12:8'), ('01:15', '12:8')]
+    assert [row[0] for row in rows] == sorted(row[0] for row in rows)
+
+    # По одной строке за вызов: отсчеты не теряются и не повторяются
+    clocks = []
+    while True:
+        batch = db.get_live_rows_after(cursor, limit=1)
+        if not batch:
+            break
+        clocks.extend(row[8] for row in batch)
+        cursor = batch[-1][0]
+    assert clocks == ['01:05', '01:10', '01:15']
+
+
+def test_replayed_timestamp_is_not_stored_again(db):
+    _, _, _, match_id = db.save_match_data(match_data('01:00'))
+    db.save_match_data(match_data('01:05'))
+    db.save_match_data(match_data('01:10', score='12:8'))
+    cursor = db.get_last_sample_id()
+
+    # Повтор времени из clock_run и из строки (с теми же и с другими значениями)
+    for replay in (match_data('01:05'), match_data('01:05', score='12:8'),
+                   match_data('01:00', score='12:8')):
+        assert db.save_match_data(replay)[2] == 'same_timestamp'
+
+    assert db.get_live_rows_after(cursor) == []
+    full = db.get_chart_points_after(match_id)
+    assert [row[1] for row in full] == ['01:00', '01:05', '01:10']
+
+    # Номера новых отсчетов по-прежнему растут
+    db.save_match_data(match_data('01:15', score='12:8'))
+    db.save_match_data(match_data('01:20', score='14:8'))
+    rows = db.get_live_rows_after(cursor)
+    assert [row[8] for row in rows] == ['01:15', '01:20']
+    assert cursor < rows[0][0] < rows[1][0] == db.get_last_sample_id()
@@ -0,0 +1,48 @@
+import pytest
+
+import match_periods
+from database import Database
+
+
+def save(db, clock, period, score, total, total_match_time):
+    home, away = score.split(':')
+    db.save_match_data({
+        'teams': 'Команда А - Команда Б', 'tournament': 'Лига', 'time': clock,
+        'total_match_time': total_match_time, 'period': period, 'score': score,
+        'total_points': int(home) + int(away), 'total': str(total),
+        'p1': '1.8', 'p2': '2.0', 'under': '1.9', 'over': '1.9',
+    })
+
+
+@pytest.fixture
+def db(tmp_path):
+    database = Database(str(tmp_path / 'test.db'))
+    yield database
+    database.conn.close()
+
+
+def test_period_line_uses_period_share():
+    assert match_periods.period_line(1, 160.0, 40) == 40.0
+    assert match_periods.period_line(2, 200.0, 48) == 50.0
+    assert match_periods.period_line(2, 80.0, 20) == 40.0
+    assert match_periods.period_line(3, 80.0, 20) == 40.0
+    # Овертайм - 5 минут от полного времени
+    assert match_periods.period_line(5, 160.0, 40) == 20.0
+
+
+def test_two_halves_format(db):
+    # 2x10: две половины по 10 минут, линия половины - половина тотала
+    save(db, '00:30', 1, '2:0', 80.5, 20)
+    save(db, '09:50', 1, '22:20', 80.5, 20)
+    save(db, '10:30', 2, '24:20', 80.5, 20)
+    save(db, '19:50', 2, '36:30', 80.5, 20)
+    db.sync_match_statuses(set())
+
+    match_id = db.conn.execute('SELECT id FROM matches').fetchone()[0]
+    periods = match_periods.get_match_periods(db, [match_id])[match_id]
+    assert [(p['period'], p['points'], p['line'], p['result']) for p in periods] == [
+        ('1', 42, 40.2, 'OVER'), ('2', 24, 40.2, 'UNDER')]
+
+    stats = match_periods.get_period_stats(db, {})
+    assert [(s['period'], s['avg_line'], s['over_count'], s['under_count'])
+            for s in stats] == [('1', 40.2, 1, 0), ('2', 40.2, 0, 1)]
@@ -0,0 +1,189 @@
+"""
+Трассировка медленных тиков и запросов, профилирование по требованию.
+
+Каждый тик парсера (и каждый HTTP-запрос веб-сервера) собирает список
+этапов (span). Если тик уложился в бюджет, трасса выбрасывается; если
+нет - записывается строкой JSON в ротируемый файл.
+
+Профилирование: Profiler.request(n) включает cProfile на следующие n
+тиков, результат сохраняется в .prof (смотреть через pstats/snakeviz).
+Парсер принимает запрос через файл-флаг (его пишет веб-сервер
+в /api/admin/profile) или сигнал SIGUSR1 там, где он есть.
+"""
+import contextvars
+import cProfile
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+import metrics
+
+_current_trace = contextvars.ContextVar('current_trace', default=None)
+
+
+class Trace:
+    """Этапы одного тика или запроса"""
+
+    def __init__(self, kind, name, **attrs):
+        self.kind = kind
+        self.name = name
+        self.attrs = attrs
+        self.started_at = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, metric=None, **attrs):
+        """Этап трассы; metric - заодно записать длительность в гистограмму"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - started
+            self.spans.append({
+                'name': name,
+                'start_ms': round((started - self._started) * 1000, 3),
+                'duration_ms': round(duration * 1000, 3),
+                **attrs
+            })
+            if metric:
+                metrics.observe(metric, duration, stage=name)
+
+    def finish(self):
+        self.duration = time.perf_counter() - self._started
+
+    def to_dict(self):
+        return {
+            'kind': self.kind,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round((self.duration or 0) * 1000, 3),
+            'attrs': self.attrs,
+            'spans': self.spans,
+        }
+
+
+class SlowTraceLog:
+    """Ротируемый JSONL-файл трасс, превысивших бюджет"""
+
+    def __init__(self, path, budget, max_bytes=10 * 1024 * 1024, backup_count=5):
+        self.budget = budget
+        self.logger = logging.getLogger(f'{__name__}.{path}')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        if not self.logger.handlers:
+            # delay - файл создается при первой медленной трассе, а не при импорте
+            handler = RotatingFileHandler(
+                path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8',
+                delay=True)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            self.logger.addHandler(handler)
+
+    def record(self, trace):
+        if trace.duration is None or trace.duration < self.budget:
+            return False
+        self.logger.info(json.dumps(trace.to_dict(), ensure_ascii=False))
+        return True
+
+
+@contextmanager
+def trace(kind, name, log=None, **attrs):
+    """Трасса тика/запроса: этапы внутри добавляются через span()"""
+    current = Trace(kind, name, **attrs)
+    token = _current_trace.set(current)
+    try:
+        yield current
+    finally:
+        _current_trace.reset(token)
+        current.finish()
+        if log is not None:
+            try:
+                log.record(current)
+            except Exception as e:
+                logging.debug(f"Не удалось записать трассу: {e}")
+
+
+@contextmanager
+def span(name, metric=None, **attrs):
+    """Этап текущей трассы (без трассы - только метрика)"""
+    current = _current_trace.get()
+    if current is not None:
+        with current.span(name, metric, **attrs):
+            yield
+    elif metric:
+        with metrics.timer(metric, stage=name):
+            yield
+    else:
+        yield
+
+
+class Profiler:
+    """cProfile для следующих N тиков, результат - один .prof файл"""
+
+    def __init__(self, output_dir, prefix, request_file=None):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.request_file = request_file
+        self.remaining = 0
+        self.profile = None
+
+    def request(self, ticks):
+        ticks = max(int(ticks), 1)
+        logging.info(f"Профилирование: следующие {ticks} тиков ({self.prefix})")
+        self.remaining = ticks
+        self.profile = cProfile.Profile()
+
+    def poll_request_file(self):
+        """Запрос от другого процесса: файл {"ticks": N}"""
+        if not self.request_file or not os.path.exists(self.request_file):
+            return
+        try:
+            with open(self.request_file, encoding='utf-8') as f:
+                ticks = json.load(f).get('ticks', 1)
+            os.remove(self.request_file)
+        except (OSError, ValueError, AttributeError) as e:
+            logging.warning(f"Некорректный запрос профилирования: {e}")
+            try:
+                os.remove(self.request_file)
+            except OSError:
+                pass
+            return
+        self.request(ticks)
+
+    @contextmanager
+    def tick(self):
+        if not self.remaining:
+            yield
+            return
+
+        self.profile.enable()
+        try:
+            yield
+        finally:
+            self.profile.disable()
+            self.remaining -= 1
+            if not self.remaining:
+                self._dump()
+
+    def _dump(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(
+            self.output_dir, f"{self.prefix}-{time.strftime('%Y%m%d-%H%M%S')}.prof")
+        try:
+            self.profile.dump_stats(path)
+            logging.info(f"Профиль сохранен: {path}")
+        except OSError as e:
+            logging.error(f"Ошибка сохранения профиля: {e}")
+        self.profile = None
+
+
+def write_profile_request(path, ticks):
+    """Запрос профилирования для процесса, который опрашивает файл"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'ticks': int(ticks), 'requested_at': time.time()}, f)
+    os.replace(tmp_path, path)
@@ -3,54 +3,187 @@
 Веб-интерфейс на FastAPI
 """
 import asyncio
+import base64
+import itertools
 import logging
 import json
+import os
+import time
+from collections import OrderedDict, deque
 from datetime import datetime
 
 from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from database import Database, safe_float, safe_int
+import aggregates
+import analytics
+import live_snapshot
+import match_periods
+import metrics
+import serializers
+import tracing
+from chart_cache import ChartCache
+from config import (IPC_CONFIG, LINE_MOVEMENT_CONFIG, METRICS_CONFIG,
+                    MULTI_WORKER_CONFIG, PROJECTION_CONFIG, TRACE_CONFIG,
+                    WEB_CONFIG)
+from database import (SEARCH_MIN_LENGTH, Database, expand_clock_runs,
+                      normalize_search_text, safe_float, safe_int)
+from line_movement import LineMovementTracker
+from notifications import TickSubscriber
+from projection import ProjectionTracker
+from ws_clients import (DISCONNECT_BACKPRESSURE, DISCONNECT_CLOSED,
+                        ClientConnection)
 
 app = FastAPI(title="Basketball Parser")
 templates = Jinja2Templates(directory="templates")
 app.mount("/static", StaticFiles(directory="templates"), name="static")
 db = Database()
+chart_cache = ChartCache(WEB_CONFIG['CHART_CACHE_MAX_BYTES'])
+tick_subscriber = TickSubscriber(IPC_CONFIG['HEARTBEAT_TIMEOUT'])
+line_tracker = LineMovementTracker(
+    LINE_MOVEMENT_CONFIG['EWMA_WINDOWS'], LINE_MOVEMENT_CONFIG['RATE_WINDOW'])
+projection_tracker = ProjectionTracker(
+    PROJECTION_CONFIG['TAU_MINUTES'], PROJECTION_CONFIG['DISPERSION'])
+# id последней записи match_stats, учтенной live-моделями
+live_models_state = {'last_id': 0}
+# id последнего разосланного оповещения (None - еще не прочитан при старте)
+alerts_state = {'last_id': None}
+
+# Несколько процессов: live-снимок строит процесс, захвативший блокировку,
+# остальные читают его из общего файла (live_snapshot.py)
+builder_lock = live_snapshot.BuilderLock(MULTI_WORKER_CONFIG['LOCK_FILE'])
+snapshot_reader = live_snapshot.SnapshotReader(MULTI_WORKER_CONFIG['SNAPSHOT_FILE'])
+chart_tails = live_snapshot.ChartTails(MULTI_WORKER_CONFIG['CHART_TAIL'])
+# writer - только у процесса-сборщика; остальное - последний прочитанный снимок,
+# alert_id - последнее оповещение, разосланное клиентам этого процесса
+shared_live = {'writer': None, 'version': 0, 'table_frame': None,
+               'matches': None, 'chart_tails': {}, 'alert_id': None}
+# Сборщик: последние версии с измененными матчами и последние оповещения -
+# процесс, пропустивший версию снимка, догоняет по ним
+recent_changes = deque(maxlen=MULTI_WORKER_CONFIG['CHANGE_BACKLOG'])
+recent_alerts = deque(maxlen=MULTI_WORKER_CONFIG['ALERT_BACKLOG'])
+
+trace_log = None
+if TRACE_CONFIG['ENABLED']:
+    trace_log = tracing.SlowTraceLog(
+        TRACE_CONFIG['WEB_TRACE_FILE'], TRACE_CONFIG['REQUEST_BUDGET'],
+        TRACE_CONFIG['MAX_BYTES'], TRACE_CONFIG['BACKUP_COUNT'])
+# Профиль веб-сервера снимается по циклам рассылки
+profiler = tracing.Profiler(TRACE_CONFIG['PROFILE_DIR'], 'web')
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Трасса запроса: в файл попадают только запросы дольше бюджета"""
+    with tracing.trace('request', request.url.path, trace_log,
+                       method=request.method, query=str(request.url.query)) as trace:
+        response = await call_next(request)
+        trace.attrs['status'] = response.status_code
+    return response
+
+
+def api_response(payload, request: Request, headers=None):
+    """Ответ API в формате из заголовка Accept (JSON или MessagePack).
+
+    Payload сериализуется напрямую, минуя jsonable_encoder FastAPI.
+    """
+    media_type = serializers.negotiate_media_type(request.headers.get('accept'))
+    response_headers = {'Vary': 'Accept'}
+    if headers:
+        response_headers.update(headers)
+    return Response(serializers.encode(payload, media_type),
+                    media_type=media_type, headers=response_headers)
 
 
 @app.get("/api/matches")
-async def get_matches():
+async def get_matches(request: Request):
     """API для получения активных матчей"""
+    matches = shared_matches()
+    if matches is not None:
+        return api_response(matches, request)
+    return api_response(await collect_active_matches(), request)
+
+
+LIVE_ROWS_BATCH = 5000
+
+
+def ingest_live_rows(rows, complete=False):
+    line_tracker.ingest(rows)
+    projection_tracker.ingest(rows)
+    if MULTI_WORKER_CONFIG['ENABLED']:
+        chart_tails.ingest(rows, complete)
+    if rows:
+        live_models_state['last_id'] = max(live_models_state['last_id'], rows[-1][0])
+
+
+async def update_live_models():
+    """Учесть в движении линий и прогнозах записи, добавленные с прошлого тика"""
+    loop = asyncio.get_event_loop()
+    if live_models_state['last_id'] == 0:
+        rows, last_id = await loop.run_in_executor(None, db.get_active_live_rows)
+        ingest_live_rows(rows, complete=True)
+        live_models_state['last_id'] = max(live_models_state['last_id'], last_id)
+        return
+
+    while True:
+        rows = await loop.run_in_executor(
+            None, db.get_live_rows_after, live_models_state['last_id'], LIVE_ROWS_BATCH)
+        ingest_live_rows(rows)
+        if len(rows) < LIVE_ROWS_BATCH:
+            break
+
+
+async def collect_active_matches():
+    """Активные матчи с темпом и аналитикой (для API и рассылки)"""
     try:
         loop = asyncio.get_event_loop()
-        matches = await loop.run_in_executor(None, db.get_active_matches)
+        with tracing.span('active_matches'):
+            matches = await loop.run_in_executor(None, db.get_active_matches)
+
+        # Столбцы считаются заранее: словарь матча строится один раз из строки БД
+        initial_totals = [
+            await loop.run_in_executor(None, db.get_initial_total, match[0])
+            for match in matches
+        ]
+        total_match_times = [safe_int(match[4]) for match in matches]
+        scores = [match[5] if match[5] else '-' for match in matches]
+        total_points = [safe_int(match[6]) for match in matches]
+        total_values = [safe_float(match[7]) for match in matches]
+
+        # Вычисляем темп и аналитику сразу для всех матчей
+        with tracing.span('pace', matches=len(matches)):
+            paces = analytics.live_pace_batch(
+                [match[3] for match in matches], scores, total_points,
+                total_match_times, total_values)
 
         formatted_matches = []
-        for match in matches:
+        for index, match in enumerate(matches):
             match_data = {
                 'id': match[0],
                 'teams': match[1],
                 'tournament': match[2],
                 'current_time': match[3],
-                'total_match_time': safe_int(match[4]),
-                'score': match[5] if match[5] else '-',
-                'total_points': safe_int(match[6]),
-                'total_value': safe_float(match[7])
+                'total_match_time': total_match_times[index],
+                'score': scores[index],
+                'total_points': total_points[index],
+                'total_value': total_values[index],
+                'initial_total': safe_float(initial_totals[index]),
+                # Движение линий и прогноз - из состояния в памяти, без запросов истории
+                'line_movement': line_tracker.snapshot(match[0]),
+                'projection': projection_tracker.snapshot(match[0], total_match_times[index]),
             }
-
-            # Получаем начальный тотал
-            initial_total = await loop.run_in_executor(
-                None, db.get_initial_total, match_data['id']
-            )
-            match_data['initial_total'] = safe_float(initial_total)
-
-            # Вычисляем темп и аналитику
-            pace_data = calculate_pace(match_data)
-            match_data.update(pace_data)
-
+            if paces[index] is not None:
+                (match_data['current_pace'], match_data['total_deviation'],
+                 match_data['minutes_elapsed']) = paces[index]
+                match_data['pace_validated'] = True  # Флаг что темп прошел валидацию
             formatted_matches.append(match_data)
 
+        active_ids = {match[0] for match in matches}
+        line_tracker.prune(active_ids)
+        projection_tracker.prune(active_ids)
+        chart_tails.prune(active_ids)
+
         return {"matches": formatted_matches}
 
     except Exception as e:
@@ -65,26 +198,103 @@ async def main_page(request: Request):
 
 
 @app.get("/api/matches/{match_id}/chart")
-async def get_match_chart(match_id: int):
-    """API для получения данных графика матча (работает и для архивных)"""
+async def get_match_chart(match_id: int, request: Request, max_points: int = None):
+    """API для получения данных графика матча (работает и для архивных).
+
+    max_points - прореживание длинной истории (LTTB) до заданного числа точек.
+    """
+    loop = asyncio.get_event_loop()
+    if max_points is not None:
+        max_points = max(CHART_MIN_POINTS, max_points)
+
+    # Статус и время обновления матча - дешевый запрос по первичному ключу
+    match_state = await loop.run_in_executor(
+        None,
+        lambda: db.conn.execute(
+            'SELECT status, updated_at FROM matches WHERE id = ?',
+            (match_id,)
+        ).fetchone()
+    )
+
+    if not match_state or match_state[0] != 'finished':
+        # Матч идет (или снова открыт) - кэшированная копия больше не нужна
+        chart_cache.invalidate(match_id)
+        chart_response = await build_match_chart(match_id, max_points)
+        if 'error' not in chart_response:
+            chart_response['projection'] = live_projection(
+                match_id, chart_response['total_match_time'])
+        return api_response(chart_response, request, headers={
+            'Cache-Control': f"private, max-age={WEB_CONFIG['LIVE_CHART_MAX_AGE']}"
+        })
+
+    # Формат - как у остальных ответов API: по заголовку Accept
+    media_type = serializers.negotiate_media_type(request.headers.get('accept'))
+    variant = (max_points, media_type)
+    entry = chart_cache.get(match_id, match_state[1], variant)
+    if entry is None:
+        chart_response = await build_match_chart(match_id, max_points)
+        if 'error' in chart_response:
+            return chart_response
+        entry = await loop.run_in_executor(
+            None, chart_cache.put, match_id, match_state[1], chart_response, variant,
+            media_type
+        )
+
+    return cached_chart_response(entry, request)
+
+
+def cached_chart_response(entry, request: Request):
+    """Ответ из кэша с ETag, долгим Cache-Control и gzip"""
+    use_gzip = 'gzip' in request.headers.get('accept-encoding', '')
+    # Сжатое и несжатое представления получают разные сильные ETag
+    etag = entry.etag[:-1] + '-gzip"' if use_gzip else entry.etag
+    headers = {
+        'ETag': etag,
+        'Cache-Control': f"public, max-age={WEB_CONFIG['ARCHIVE_CHART_MAX_AGE']}",
+        'Vary': 'Accept, Accept-Encoding'
+    }
+
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')]:
+        return Response(status_code=304, headers=headers)
+
+    if use_gzip:
+        headers['Content-Encoding'] = 'gzip'
+        return Response(entry.body_gzip, media_type=entry.media_type, headers=headers)
+
+    return Response(entry.body(), media_type=entry.media_type, headers=headers)
+
+
+CHART_MIN_POINTS = 50
+# Сколько графиков можно запросить одним вызовом /api/matches/charts
+CHART_BATCH_MAX_IDS = 50
+
+
+async def build_match_chart(match_id: int, max_points: int = None):
+    """Построение данных графика матча из истории match_stats"""
     try:
         loop = asyncio.get_event_loop()
 
         # Получаем историю матча из БД
-        history = await loop.run_in_executor(
-            None,
-            lambda: db.conn.execute('''
-                SELECT 
-                    ms.timestamp,
-                    ms.score,
-                    ms.total_points,
-                    ms.total_value,
-                    ms.recorded_at
-                FROM match_stats ms
-                WHERE ms.match_id = ?
-                ORDER BY ms.recorded_at ASC
-            ''', (match_id,)).fetchall()
-        )
+        with tracing.span('history'):
+            history = await loop.run_in_executor(
+                None,
+                lambda: db.conn.execute('''
+                    SELECT 
+                        ms.timestamp,
+                        ms.score,
+                        ms.total_points,
+                        ms.total_value,
+                        ms.recorded_at,
+                        ms.id,
+                        ms.clock_run,
+                        ms.clock_seqs
+                    FROM match_stats ms
+                    WHERE ms.match_id = ?
+                    ORDER BY ms.id ASC
+                ''', (match_id,)).fetchall()
+            )
+            history = expand_clock_runs(history, 0, 5)
 
         if not history:
             return {"error": "Данные матча не найдены"}
@@ -98,56 +308,17 @@ async def get_match_chart(match_id: int):
             ).fetchone()
         )
         total_match_time = match_info[0] if match_info else 40
-        # Определяем линии периодов
-        if total_match_time == 48:
-            period_lines = [12, 24, 36, 48]
-        else:  # 40 минут по умолчанию
-            period_lines = [10, 20, 30, 40]
         match_status = match_info[1] if match_info else 'finished'
 
-        # Форматируем данные для графика
-        timestamps = []
-        scores = []
-        total_points = []
-        total_values = []
-        pace_data = []
-
-        for record in history:
-            timestamp = record[0] if record[0] else '0:00'
-            score = record[1] if record[1] else '-'
-            points = record[2] if record[2] is not None else 0
-            total_value = record[3] if record[3] is not None else 0
-
-            timestamps.append(timestamp)
-            scores.append(score)
-            total_points.append(points)
-            total_values.append(total_value)
-
-            # ВЫЧИСЛЯЕМ ТЕМП ДЛЯ АРХИВНЫХ МАТЧЕЙ
-            pace = calculate_pace_for_record(
-                timestamp, points, total_match_time, total_value)
-            pace_data.append(pace)
-
-        # Для архивных матчей добавляем финальную информацию
-        final_result = None
-        if match_status == 'finished' and total_points:
-            final_points = total_points[-1] if total_points else 0
-            final_total = total_values[-1] if total_values else 0
-            if final_total > 0:
-                final_result = 'OVER' if final_points > final_total else 'UNDER'
-
-        chart_response = {
-            "timestamps": timestamps,
-            "scores": scores,
-            "total_points": total_points,
-            "total_values": total_values,
-            "pace_data": pace_data,
-            "period_lines": period_lines,
-            "total_match_time": total_match_time,
-            "final_result": final_result,
-            "match_status": match_status
-        }
+        # Маркеры периодов с реальным счетом на их конец
+        periods = await loop.run_in_executor(
+            None, match_periods.get_match_periods, db, [match_id])
 
+        with tracing.span('format', points=len(history)):
+            chart_response = format_match_chart(
+                [record[:4] + (record[5],) for record in history],
+                total_match_time, match_status, max_points)
+        chart_response['period_markers'] = periods.get(match_id, [])
         return chart_response
 
     except Exception as e:
@@ -155,285 +326,787 @@ async def get_match_chart(match_id: int):
         return {"error": "Ошибка загрузки данных"}
 
 
+
+@app.get("/api/matches/charts")
+async def get_match_charts(request: Request, ids: str, max_points: int = None):
+    """Графики нескольких матчей за один запрос: ?ids=1,2,3.
+
+    История читается одним запросом к БД, формат каждого графика как
+    в /api/matches/{match_id}/chart.
+    """
+    try:
+        match_ids = list(dict.fromkeys(
+            int(match_id) for match_id in ids.split(',') if match_id.strip()))
+    except ValueError:
+        return {"error": "Некорректный список id"}
+
+    if not match_ids:
+        return {"error": "Не указаны id матчей"}
+    if len(match_ids) > CHART_BATCH_MAX_IDS:
+        return {"error": f"Не более {CHART_BATCH_MAX_IDS} матчей за запрос"}
+
+    if max_points is not None:
+        max_points = max(CHART_MIN_POINTS, max_points)
+
+    try:
+        loop = asyncio.get_event_loop()
+        rows = await loop.run_in_executor(None, db.get_chart_histories, match_ids)
+        periods = await loop.run_in_executor(
+            None, match_periods.get_match_periods, db, match_ids)
+
+        # Строки отсортированы по матчу - группируем за один проход
+        histories = {}
+        for match_id, group in itertools.groupby(rows, key=lambda row: row[0]):
+            group = list(group)
+            histories[match_id] = (
+                [row[1:6] for row in group], group[0][6], group[0][7])
+
+        # Ключи - строки: так их отдают и JSON, и MessagePack
+        charts = {}
+        for match_id in match_ids:
+            if match_id not in histories:
+                charts[str(match_id)] = {"error": "Данные матча не найдены"}
+                continue
+            history, total_match_time, match_status = histories[match_id]
+            chart = format_match_chart(history, total_match_time, match_status, max_points)
+            chart['period_markers'] = periods.get(match_id, [])
+            # Как в /api/matches/{match_id}/chart: прогноз у незавершенных матчей
+            if match_status != 'finished':
+                chart['projection'] = live_projection(match_id, chart['total_match_time'])
+            charts[str(match_id)] = chart
+
+        return api_response({"charts": charts}, request, headers={
+            'Cache-Control': f"private, max-age={WEB_CONFIG['LIVE_CHART_MAX_AGE']}"
+        })
+
+    except Exception as e:
+        logging.error(f"Ошибка получения графиков матчей: {e}")
+        return {"error": "Ошибка загрузки данных"}
+
+def format_match_chart(history, total_match_time, match_status, max_points=None):
+    """Данные графика из строк (timestamp, score, total_points, total_value, id)"""
+    total_match_time = total_match_time or 40
+
+    # Определяем линии периодов
+    if total_match_time == 48:
+        period_lines = [12, 24, 36, 48]
+    else:  # 40 минут по умолчанию
+        period_lines = [10, 20, 30, 40]
+
+    # Форматируем данные для графика (темп считается для всей истории сразу)
+    timestamps, scores, total_points, total_values, pace_data = \
+        analytics.chart_series(history, total_match_time)
+    original_points = len(timestamps)
+
+    # Длинную историю прореживаем, сохраняя границы периодов
+    timestamps, scores, total_points, total_values, pace_data = \
+        analytics.downsample_chart(
+            timestamps, scores, total_points, total_values, pace_data,
+            total_match_time, max_points)
+
+    # Для архивных матчей добавляем финальную информацию
+    final_result = None
+    if match_status == 'finished' and total_points:
+        final_points = total_points[-1] if total_points else 0
+        final_total = total_values[-1] if total_values else 0
+        if final_total > 0:
+            final_result = 'OVER' if final_points > final_total else 'UNDER'
+
+    chart_response = {
+        "timestamps": timestamps,
+        "scores": scores,
+        "total_points": total_points,
+        "total_values": total_values,
+        "pace_data": pace_data,
+        "period_lines": period_lines,
+        "total_match_time": total_match_time,
+        "final_result": final_result,
+        "match_status": match_status,
+        "last_id": history[-1][4],
+        "original_points": original_points
+    }
+
+    return chart_response
+
+
+ARCHIVE_COLUMNS = (
+    'id', 'teams', 'tournament', 'status', 'current_time', 'total_match_time',
+    'created_at', 'finished_date', 'final_score', 'final_points', 'final_total',
+    'initial_total'
+)
+
+
 @app.get("/api/matches/archive")
 async def get_archive_matches(
+    request: Request,
     date_from: str = None,
     date_to: str = None,
     tournament: str = None,
     team: str = None,
-    limit: int = 100
+    limit: int = 100,
+    cursor: str = None
 ):
-    """Получение завершенных матчей с полной информацией"""
+    """Получение завершенных матчей с полной информацией (постранично)"""
     try:
         loop = asyncio.get_event_loop()
+        limit = max(1, min(limit, ARCHIVE_MAX_LIMIT))
+        filters = {
+            'date_from': date_from,
+            'date_to': date_to,
+            'tournament': tournament,
+            'team': team
+        }
 
-        query = '''
-            SELECT 
-                m.id, 
-                m.teams, 
-                m.tournament, 
-                m.status,
-                m.current_time,
-                m.total_match_time,
-                m.created_at,
-                m.updated_at as finished_date,
-                ms_final.score as final_score,
-                ms_final.total_points as final_points,
-                ms_final.total_value as final_total,
-                ms_first.total_value as initial_total
-            FROM matches m
-            JOIN match_stats ms_final ON m.id = ms_final.match_id
-            JOIN match_stats ms_first ON m.id = ms_first.match_id
-            WHERE m.status = 'finished'
-            AND (
-                -- МАТЧ СЧИТАЕТСЯ ЗАВЕРШЕННЫМ ЕСЛИ:
-                -- 1. Время матча близко к полному (39+/47+ минут)
-                (m.total_match_time = 40 AND CAST(SUBSTR(m.current_time, 1, 2) AS INTEGER) >= 39) OR
-                (m.total_match_time = 48 AND CAST(SUBSTR(m.current_time, 1, 2) AS INTEGER) >= 47) OR
-                (m.total_match_time != 40 AND m.total_match_time != 48 AND 
-                CAST(SUBSTR(m.current_time, 1, 2) AS INTEGER) >= m.total_match_time - 1)
-            )
-            AND ms_final.recorded_at = (
-                SELECT MAX(recorded_at) FROM match_stats WHERE match_id = m.id
-            )
-            AND ms_first.recorded_at = (
-                SELECT MIN(recorded_at) FROM match_stats WHERE match_id = m.id
-            )
-        '''
-
-        params = []
-
-        # Добавляем фильтры
-        if date_from:
-            query += " AND DATE(m.updated_at) >= ?"
-            params.append(date_from)
-        if date_to:
-            query += " AND DATE(m.updated_at) <= ?"
-            params.append(date_to)
-        if tournament:
-            query += " AND m.tournament LIKE ?"
-            params.append(f'%{tournament}%')
-        if team:
-            query += " AND m.teams LIKE ?"
-            params.append(f'%{team}%')
-
-        query += " ORDER BY m.updated_at DESC LIMIT ?"
-        params.append(limit)
-
-        # Выполняем запрос
+        # Берем на одну запись больше, чтобы понять, есть ли следующая страница
         matches = await loop.run_in_executor(
-            None,
-            lambda: db.conn.execute(query, params).fetchall()
+            None, db.get_archive_matches, filters, decode_archive_cursor(cursor), limit + 1
         )
+        has_more = len(matches) > limit
+        matches = matches[:limit]
 
         # Форматируем результат
-        formatted_matches = []
-        for match in matches:
-            match_data = {
-                'id': match[0],
-                'teams': match[1],
-                'tournament': match[2],
-                'status': match[3],
-                'current_time': match[4],
-                'total_match_time': match[5],
-                'created_at': match[6],
-                'finished_date': match[7],
-                'final_score': match[8],
-                'final_points': match[9],
-                'final_total': match[10],
-                'initial_total': match[11]
-            }
+        formatted_matches = [dict(zip(ARCHIVE_COLUMNS, match)) for match in matches]
+
+        # Рассчитываем дополнительные показатели для всех матчей сразу
+        final_points = [m['final_points'] for m in formatted_matches]
+        final_totals = [m['final_total'] for m in formatted_matches]
+        deviations = analytics.rounded_list(
+            analytics.archive_deviations(final_points, final_totals))
+
+        for match_data, deviation in zip(formatted_matches, deviations):
+            if deviation is None:
+                continue
+            final_pace = match_data['final_points']
+            match_data['final_pace'] = round(final_pace, 1)
+            match_data['final_deviation'] = deviation
+            match_data['total_result'] = 'OVER' if final_pace > match_data['final_total'] else 'UNDER'
+
+        # Статистика по всему фильтру, а не по текущей странице
+        stats = await get_archive_stats(filters)
+
+        next_cursor = None
+        if has_more:
+            next_cursor = encode_archive_cursor(matches[-1][7], matches[-1][0])
+
+        return api_response({
+            "matches": formatted_matches,
+            "stats": stats,
+            "next_cursor": next_cursor
+        }, request)
 
-            # Рассчитываем дополнительные показатели
-            if match_data['final_points'] and match_data['final_total']:
-                final_pace = match_data['final_points']
-                deviation = (
-                    (final_pace - match_data['final_total']) / match_data['final_total']) * 100
-                match_data['final_pace'] = round(final_pace, 1)
-                match_data['final_deviation'] = round(deviation, 1)
-                match_data['total_result'] = 'OVER' if final_pace > match_data['final_total'] else 'UNDER'
+    except Exception as e:
+        logging.error(f"Ошибка получения архива: {e}")
+        return {"matches": [], "stats": {}, "next_cursor": None}
 
-            formatted_matches.append(match_data)
 
-        # Базовая статистика
-        stats = {
-            'total_matches': len(formatted_matches),
-            'over_matches': len([m for m in formatted_matches if m.get('total_result') == 'OVER']),
-            'under_matches': len([m for m in formatted_matches if m.get('total_result') == 'UNDER']),
-        }
+ARCHIVE_MAX_LIMIT = 500
+ARCHIVE_STATS_CACHE_SIZE = 256
+ARCHIVE_STATS_TTL = 60
+# (фильтры) -> (версия архива, время расчета, статистика)
+archive_stats_cache = OrderedDict()
 
-        if stats['total_matches'] > 0:
-            stats['over_percentage'] = round(
-                (stats['over_matches'] / stats['total_matches']) * 100, 1)
-            stats['under_percentage'] = round(
-                (stats['under_matches'] / stats['total_matches']) * 100, 1)
 
-            # Среднее отклонение
-            deviations = [m.get('final_deviation', 0)
-                          for m in formatted_matches if m.get('final_deviation')]
-            if deviations:
-                stats['avg_deviation'] = round(
-                    sum(deviations) / len(deviations), 1)
+def encode_archive_cursor(updated_at, match_id):
+    """Непрозрачный курсор страницы архива"""
+    raw = json.dumps([updated_at, match_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
 
-        return {
-            "matches": formatted_matches,
-            "stats": stats
-        }
 
-    except Exception as e:
-        logging.error(f"Ошибка получения архива: {e}")
-        return {"matches": [], "stats": {}}
+def decode_archive_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        updated_at, match_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return updated_at, int(match_id)
+    except (ValueError, TypeError):
+        return None
 
 
-@app.get("/archive", response_class=HTMLResponse)
-async def archive_page(request: Request):
-    """Страница архива матчей"""
-    return templates.TemplateResponse("archive.html", {"request": request})
+async def get_archive_stats(filters):
+    """Статистика архива из SQL с кэшем на каждую комбинацию фильтров"""
+    loop = asyncio.get_event_loop()
+    key = tuple(sorted(filters.items()))
+    version = await loop.run_in_executor(None, db.get_archive_version)
+
+    cached = archive_stats_cache.get(key)
+    if cached and cached[0] == version and time.monotonic() - cached[1] < ARCHIVE_STATS_TTL:
+        archive_stats_cache.move_to_end(key)
+        return cached[2]
+
+    row = await loop.run_in_executor(None, db.get_archive_stats, filters)
+    total_matches, over_matches, under_matches, avg_deviation = row
 
+    stats = {
+        'total_matches': total_matches,
+        'over_matches': over_matches or 0,
+        'under_matches': under_matches or 0,
+    }
+
+    if stats['total_matches'] > 0:
+        stats['over_percentage'] = round(
+            (stats['over_matches'] / stats['total_matches']) * 100, 1)
+        stats['under_percentage'] = round(
+            (stats['under_matches'] / stats['total_matches']) * 100, 1)
+
+        if avg_deviation is not None:
+            stats['avg_deviation'] = round(avg_deviation, 1)
+
+    archive_stats_cache[key] = (version, time.monotonic(), stats)
+    archive_stats_cache.move_to_end(key)
+    while len(archive_stats_cache) > ARCHIVE_STATS_CACHE_SIZE:
+        archive_stats_cache.popitem(last=False)
+
+    return stats
+
+
+@app.get("/api/search/suggest")
+async def get_search_suggestions(q: str = '', field: str = 'team', limit: int = 10):
+    """Автодополнение команд и турниров для фильтров архива"""
+    # Короче минимума поиск по триграммам невозможен - без сканирования LIKE
+    if len(normalize_search_text(q)) < SEARCH_MIN_LENGTH:
+        return {"suggestions": []}
 
-def calculate_pace_for_record(timestamp, total_points, total_match_time, total_value=None):
-    """Расчет темпа для конкретной записи в истории с валидацией"""
     try:
-        if timestamp == '-' or ':' not in timestamp or total_points == 0:
-            return None
+        loop = asyncio.get_event_loop()
+        suggestions = await loop.run_in_executor(
+            None, db.search_suggestions, field, q.strip(), max(1, min(limit, 50))
+        )
+        return {"suggestions": suggestions}
 
-        # Парсим время матча
-        time_parts = timestamp.split(':')
-        minutes_elapsed = safe_int(time_parts[0])
-        seconds_elapsed = safe_int(time_parts[1]) if len(time_parts) > 1 else 0
-        total_minutes_elapsed = minutes_elapsed + (seconds_elapsed / 60)
+    except Exception as e:
+        logging.error(f"Ошибка поиска подсказок: {e}")
+        return {"suggestions": []}
 
-        if total_minutes_elapsed <= 0:
-            return None
 
-        # Расчет темпа
-        current_pace = (total_points * total_match_time) / \
-            total_minutes_elapsed
+@app.get("/api/analytics")
+async def get_analytics(request: Request, dimension: str = None, min_matches: int = 1):
+    """Аналитика архива по турнирам, форматам и периодам (из агрегатов)"""
+    if dimension and dimension not in aggregates.DIMENSIONS:
+        return {"error": f"Неизвестная группировка: {dimension}"}
 
-        # ВАЛИДАЦИЯ: темп не может превышать тотал более чем на 50%
-        if total_value and total_value > 0:
-            max_allowed_pace = total_value * 1.5  # +50% от тотала
-            if current_pace > max_allowed_pace:
-                return round(max_allowed_pace, 1)
+    try:
+        loop = asyncio.get_event_loop()
+        breakdowns = await loop.run_in_executor(
+            None, aggregates.get_breakdowns, db, dimension, max(1, min_matches)
+        )
+        return api_response({"breakdowns": breakdowns}, request)
 
-        # Дополнительная валидация: разумные пределы для баскетбола
-        if current_pace > 300:  # Максимальный разумный темп
-            return 300.0
+    except Exception as e:
+        logging.error(f"Ошибка получения аналитики: {e}")
+        return {"breakdowns": {}}
 
-        if current_pace < 50:   # Минимальный разумный темп
-            return 50.0
 
-        return round(current_pace, 1)
+@app.get("/api/matches/{match_id}/periods")
+async def get_match_periods(request: Request, match_id: int):
+    """Очки, тотал и OVER/UNDER по периодам матча"""
+    try:
+        loop = asyncio.get_event_loop()
+        periods = await loop.run_in_executor(
+            None, match_periods.get_match_periods, db, [match_id])
+        return api_response({"match_id": match_id, "periods": periods.get(match_id, [])}, request)
 
     except Exception as e:
-        logging.debug(f"Ошибка расчета темпа для записи: {e}")
-        return None
+        logging.error(f"Ошибка получения периодов матча: {e}")
+        return {"match_id": match_id, "periods": []}
 
 
-def calculate_pace(match_data):
-    """Расчет темпа и производных показателей с валидацией"""
+@app.get("/api/periods")
+async def get_period_stats(
+    request: Request,
+    date_from: str = None,
+    date_to: str = None,
+    tournament: str = None,
+    team: str = None,
+    total_match_time: int = None
+):
+    """OVER/UNDER по периодам завершенных матчей с фильтрами архива"""
+    filters = {
+        'date_from': date_from,
+        'date_to': date_to,
+        'tournament': tournament,
+        'team': team
+    }
     try:
-        if (match_data['score'] == '-' or
-            match_data['current_time'] == '-' or
-            ':' not in match_data['current_time'] or
-                match_data['total_points'] == 0):
-            return {}
-
-        time_parts = match_data['current_time'].split(':')
-        minutes_elapsed = safe_int(time_parts[0])
-        seconds_elapsed = safe_int(time_parts[1]) if len(time_parts) > 1 else 0
-        total_minutes_elapsed = minutes_elapsed + (seconds_elapsed / 60)
-
-        if total_minutes_elapsed <= 0:
-            return {}
-
-        total_match_time = safe_int(match_data.get('total_match_time', 40))
-
-        # Расчет темпа
-        current_pace = (match_data['total_points']
-                        * total_match_time) / total_minutes_elapsed
-
-        # ВАЛИДАЦИЯ: темп не может превышать тотал более чем на 50%
-        if match_data.get('total_value') and match_data['total_value'] > 0:
-            # +50% от тотала
-            max_allowed_pace = match_data['total_value'] * 1.5
-            if current_pace > max_allowed_pace:
-                current_pace = max_allowed_pace
-
-        # Дополнительные разумные пределы
-        if current_pace > 300:
-            current_pace = 300.0
-        elif current_pace < 50:
-            current_pace = 50.0
-
-        total_deviation = None
-        if match_data['total_value']:
-            total_deviation = (
-                (current_pace - match_data['total_value']) / match_data['total_value']) * 100
+        loop = asyncio.get_event_loop()
+        stats = await loop.run_in_executor(
+            None, match_periods.get_period_stats, db, filters, total_match_time)
+        return api_response({"periods": stats}, request)
+
+    except Exception as e:
+        logging.error(f"Ошибка получения статистики периодов: {e}")
+        return {"periods": []}
 
-        return {
-            'current_pace': round(current_pace, 1),
-            'total_deviation': round(total_deviation, 1) if total_deviation else None,
-            'minutes_elapsed': round(total_minutes_elapsed, 1),
-            'pace_validated': True  # Флаг что темп прошел валидацию
-        }
+
+ALERT_COLUMNS = (
+    'id', 'rule_id', 'match_id', 'teams', 'tournament', 'metric', 'value',
+    'threshold', 'period', 'match_time', 'message', 'created_at'
+)
+ALERTS_MAX_LIMIT = 500
+
+
+async def collect_new_alerts():
+    """Оповещения, записанные парсером после прошлого цикла рассылки"""
+    loop = asyncio.get_event_loop()
+    if alerts_state['last_id'] is None:
+        # Старые оповещения при запуске не рассылаем
+        alerts_state['last_id'] = await loop.run_in_executor(None, db.get_last_alert_id)
+        return []
+
+    rows = await loop.run_in_executor(
+        None, db.get_alerts_after, alerts_state['last_id'], ALERTS_MAX_LIMIT)
+    if rows:
+        alerts_state['last_id'] = rows[-1][0]
+    return [dict(zip(ALERT_COLUMNS, row)) for row in rows]
+
+
+@app.get("/api/alerts")
+async def get_alerts(request: Request, after_id: int = 0, limit: int = 100, match_id: int = None):
+    """История оповещений по возрастанию id (after_id - курсор)"""
+    try:
+        loop = asyncio.get_event_loop()
+        rows = await loop.run_in_executor(
+            None, db.get_alerts_after, after_id, max(1, min(limit, ALERTS_MAX_LIMIT)), match_id)
+        return api_response({"alerts": [dict(zip(ALERT_COLUMNS, row)) for row in rows]}, request)
 
     except Exception as e:
-        logging.error(
-            f"Ошибка расчета темпа для {match_data.get('teams', 'unknown')}: {e}")
-        return {}
+        logging.error(f"Ошибка получения оповещений: {e}")
+        return {"alerts": []}
+
+
+@app.get("/archive", response_class=HTMLResponse)
+async def archive_page(request: Request):
+    """Страница архива матчей"""
+    return templates.TemplateResponse("archive.html", {
+        "request": request, "search_min_length": SEARCH_MIN_LENGTH})
 
 
 class ConnectionManager:
     def __init__(self):
-        self.active_connections = []
+        # websocket -> ClientConnection
+        self.clients = {}
+        self.backpressure_disconnects = 0
+        self.dropped_messages = 0
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
-        self.active_connections.append(websocket)
+        # Формат кадров выбирается подпротоколом: "msgpack" или JSON
+        subprotocol = serializers.negotiate_subprotocol(
+            websocket.scope.get('subprotocols'))
+        await websocket.accept(subprotocol=subprotocol)
+        client = ClientConnection(
+            websocket,
+            encoding=subprotocol or serializers.WS_JSON,
+            queue_size=WEB_CONFIG['WS_QUEUE_SIZE'],
+            send_timeout=WEB_CONFIG['WS_SEND_TIMEOUT'],
+            on_disconnect=self._on_client_closed
+        )
+        self.clients[websocket] = client
+        metrics.set_gauge('ws_clients', len(self.clients))
+        client.start()
+
+    async def disconnect(self, websocket: WebSocket, reason=DISCONNECT_CLOSED):
+        client = self.clients.get(websocket)
+        if client:
+            await client.close(reason)
+
+    def _on_client_closed(self, client, reason):
+        self.clients.pop(client.websocket, None)
+        metrics.set_gauge('ws_clients', len(self.clients))
+        self.dropped_messages += client.dropped_messages
+        if reason == DISCONNECT_BACKPRESSURE:
+            self.backpressure_disconnects += 1
+            metrics.inc('ws_backpressure_disconnects_total')
+
+    def subscribe_chart(self, websocket: WebSocket, match_id: int, last_id: int):
+        """Подписка клиента на новые точки графика матча"""
+        client = self.clients.get(websocket)
+        if client:
+            client.chart_subscriptions[match_id] = last_id
+
+    def unsubscribe_chart(self, websocket: WebSocket, match_id: int = None):
+        """Отписка от графика матча (или от всех графиков)"""
+        client = self.clients.get(websocket)
+        if client is None:
+            return
+        if match_id is None:
+            client.chart_subscriptions.clear()
+        else:
+            client.chart_subscriptions.pop(match_id, None)
+
+    def send(self, client, message, kind: str, replaceable=False):
+        """Постановка в очередь клиента; переполнение - отключение клиента"""
+        if not client.enqueue(message, kind, replaceable):
+            asyncio.create_task(client.close(DISCONNECT_BACKPRESSURE))
+
+    def broadcast(self, payload, kind='table_update', frames=None, replaceable=True):
+        """Рассылка без ожидания: сообщение только ставится в очереди.
+
+        Payload кодируется один раз для каждого формата клиентов;
+        frames - уже закодированные кадры {формат: кадр} (из live-снимка).
+        replaceable - неотправленное сообщение того же типа заменяется новым.
+        """
+        frames = dict(frames or {})
+        for client in list(self.clients.values()):
+            if client.encoding not in frames:
+                frames[client.encoding] = serializers.encode_frame(
+                    payload, client.encoding)
+            self.send(client, frames[client.encoding], kind, replaceable=replaceable)
+
+    def metrics(self):
+        clients = [client.stats() for client in self.clients.values()]
+        return {
+            'clients': len(clients),
+            'backpressure_disconnects': self.backpressure_disconnects,
+            'dropped_messages': self.dropped_messages + sum(
+                client['dropped_messages'] for client in clients),
+            'max_lag': max((client['max_lag'] for client in clients), default=0.0),
+            'client_stats': clients
+        }
+
+    async def push_chart_points(self, match_ids=None):
+        """Рассылка подписчикам только новых точек графика"""
+        # Один запрос на матч: начиная с самого старого курсора подписчиков
+        cursors = {}
+        for client in self.clients.values():
+            for match_id, last_id in client.chart_subscriptions.items():
+                if match_ids is not None and match_id not in match_ids:
+                    continue
+                cursors[match_id] = min(last_id, cursors.get(match_id, last_id))
+
+        if not cursors:
+            return
 
-    def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
+        loop = asyncio.get_event_loop()
+        for match_id, after_id in cursors.items():
+            # Из хвоста live-снимка, если он покрывает курсор, иначе из БД
+            rows = live_snapshot.chart_rows_after(
+                shared_live['chart_tails'].get(str(match_id)), after_id)
+            if rows is None:
+                rows = await loop.run_in_executor(
+                    None, db.get_chart_points_after, match_id, after_id
+                )
+            if not rows:
+                continue
+
+            for client in list(self.clients.values()):
+                last_id = client.chart_subscriptions.get(match_id)
+                if last_id is None:
+                    continue
+                new_rows = [row for row in rows if row[0] > last_id]
+                if not new_rows:
+                    continue
+
+                client.chart_subscriptions[match_id] = new_rows[-1][0]
+                self.send(client, serializers.encode_frame({
+                    "type": "chart_points",
+                    "match_id": match_id,
+                    "data": format_chart_points(new_rows)
+                }, client.encoding), 'chart_points')
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики веб-сервера и парсера в текстовом формате Prometheus"""
+    if not METRICS_CONFIG['ENABLED']:
+        return Response(status_code=404)
+
+    snapshots = [('web', metrics.REGISTRY.snapshot())]
+    parser_snapshot = metrics.read_snapshot(METRICS_CONFIG['PARSER_METRICS_FILE'])
+    if parser_snapshot:
+        # Старый снимок - признак того, что парсер остановился
+        parser_snapshot.setdefault('gauges', {})['metrics_snapshot_age_seconds'] = [
+            [{}, round(time.time() - parser_snapshot.get('created_at', 0), 3)]]
+        snapshots.append(('parser', parser_snapshot))
+
+    return Response(metrics.render(snapshots),
+                    media_type='text/plain; version=0.0.4')
+
+
+PROFILE_TARGETS = ('parser', 'web')
+
+
+@app.post("/api/admin/profile")
+async def request_profile(request: Request, target: str = 'parser', ticks: int = 5):
+    """Профилирование следующих N тиков парсера или циклов рассылки.
+
+    Доступно только с localhost. Профиль сохраняется в PROFILE_DIR.
+    """
+    if request.client is None or request.client.host not in ('127.0.0.1', '::1'):
+        return Response(status_code=403)
+    if target not in PROFILE_TARGETS:
+        return {"error": f"Неизвестная цель: {target}"}
+
+    ticks = min(max(ticks, 1), 100)
+    if target == 'web':
+        profiler.request(ticks)
+    else:
+        try:
+            tracing.write_profile_request(TRACE_CONFIG['PROFILE_REQUEST_FILE'], ticks)
+        except OSError as e:
+            logging.error(f"Ошибка запроса профилирования: {e}")
+            return {"error": "Не удалось передать запрос парсеру"}
+
+    return {"target": target, "ticks": ticks, "output_dir": TRACE_CONFIG['PROFILE_DIR']}
+
+
+def format_chart_points(rows):
+    """Формат инкрементального обновления графика (как в /chart)"""
+    total_match_time = rows[0][5] if rows and rows[0][5] else 40
+    timestamps, scores, total_points, total_values, pace_data = \
+        analytics.chart_series([row[1:5] for row in rows], total_match_time)
 
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                self.active_connections.remove(connection)
+    return {
+        "timestamps": timestamps,
+        "scores": scores,
+        "total_points": total_points,
+        "total_values": total_values,
+        "pace_data": pace_data,
+        "last_id": rows[-1][0] if rows else None
+    }
 
 
 manager = ConnectionManager()
 
 
+@app.get("/api/ws/metrics")
+async def get_ws_metrics():
+    """Метрики WebSocket-рассылки: отставание клиентов и отключения"""
+    return manager.metrics()
+
+
+def decode_client_message(message):
+    """Команда клиента из текстового (JSON) или бинарного (MessagePack) кадра"""
+    try:
+        if message.get('text') is not None:
+            return json.loads(message['text'])
+        if message.get('bytes') is not None and serializers.msgpack is not None:
+            return serializers.loads_msgpack(message['bytes'])
+    except ValueError:
+        pass
+    return None
+
+
+async def handle_client_message(websocket: WebSocket, message):
+    """Обработка команд клиента (подписка на графики)"""
+    if not isinstance(message, dict):
+        return
+
+    if message.get("type") == "subscribe_chart":
+        match_id = safe_int(message.get("match_id"), None)
+        if match_id is None:
+            return
+        manager.subscribe_chart(
+            websocket, match_id, safe_int(message.get("last_id")))
+        # Сразу досылаем точки, появившиеся после загрузки графика
+        await manager.push_chart_points({match_id})
+
+    elif message.get("type") == "unsubscribe_chart":
+        manager.unsubscribe_chart(
+            websocket, safe_int(message.get("match_id"), None))
+
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     await manager.connect(websocket)
     try:
         while True:
-            # Ждем сообщения от клиента (или просто поддерживаем соединение)
-            data = await websocket.receive_text()
-            # Можно обрабатывать команды от клиента если нужно
+            # Ждем команды от клиента (подписка на графики)
+            message = await websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            await handle_client_message(websocket, decode_client_message(message))
     except WebSocketDisconnect:
-        manager.disconnect(websocket)
+        pass
+    finally:
+        await manager.disconnect(websocket)
 
 # Отдельная задача для рассылки обновлений
 async def broadcast_updates():
+    # None - обновляем все матчи (первый проход и опрос по таймауту)
+    changed_ids = None
     while True:
         try:
-            matches_data = await get_matches()
-            await manager.broadcast(json.dumps({
-                "type": "table_update",
-                "data": matches_data
-            }))
-            await asyncio.sleep(3)
+            if changed_ids is None or changed_ids:
+                with profiler.tick(), tracing.trace(
+                        'tick', 'broadcast', trace_log,
+                        clients=len(manager.clients),
+                        changed=None if changed_ids is None else len(changed_ids)):
+                    with tracing.span('live_models', metric='broadcast_seconds'):
+                        await update_live_models()
+                    with tracing.span('collect', metric='broadcast_seconds'):
+                        matches_data = await collect_active_matches()
+                    with tracing.span('alerts', metric='broadcast_seconds'):
+                        new_alerts = await collect_new_alerts()
+                    if shared_live['writer'] is not None:
+                        # Рассылают все процессы из снимка (shared_fanout)
+                        with tracing.span('publish', metric='broadcast_seconds'):
+                            publish_live_snapshot(matches_data, changed_ids, new_alerts)
+                    else:
+                        with tracing.span('table', metric='broadcast_seconds'):
+                            manager.broadcast({
+                                "type": "table_update",
+                                "data": matches_data
+                            })
+                            if new_alerts:
+                                manager.broadcast({"type": "alerts", "data": new_alerts},
+                                                  kind='alerts', replaceable=False)
+                        with tracing.span('chart_points', metric='broadcast_seconds'):
+                            await manager.push_chart_points(changed_ids)
+
+            # Рассылаем сразу по событию парсера; если канал молчит - опрос БД
+            if tick_subscriber.is_alive:
+                timeout = IPC_CONFIG['SAFETY_POLL_INTERVAL']
+            else:
+                timeout = IPC_CONFIG['FALLBACK_POLL_INTERVAL']
+            changed_ids = await tick_subscriber.wait_for_tick(timeout)
         except Exception as e:
             logging.error(f"WebSocket broadcast error: {e}")
+            changed_ids = None
             await asyncio.sleep(5)
 
+def publish_live_snapshot(matches_data, changed_ids, new_alerts=()):
+    """Запись live-снимка для всех процессов (только сборщик)"""
+    total_match_times = {
+        match['id']: match['total_match_time'] for match in matches_data['matches']}
+    recent_changes.append((
+        shared_live['writer'].next_version,
+        sorted(changed_ids) if changed_ids is not None else None))
+    recent_alerts.extend(new_alerts)
+    meta = {
+        'changes': list(recent_changes),
+        'chart_tails': chart_tails.export(total_match_times),
+        'alerts': list(recent_alerts),
+        'alert_id': alerts_state['last_id'],
+    }
+    frame = {"type": "table_update", "data": matches_data}
+    sections = [serializers.dumps_json(meta), serializers.dumps_json(frame)]
+    if serializers.msgpack is not None:
+        sections.append(serializers.dumps_msgpack(frame))
+
+    version = shared_live['writer'].publish(sections)
+    if version is not None:
+        metrics.set_gauge('live_snapshot_version', version)
+        metrics.set_gauge('live_snapshot_bytes', sum(len(section) for section in sections))
+
+
+def changes_since(changes, last_version):
+    """Матчи, измененные в версиях после last_version; None - обновить все"""
+    missed = [ids for version, ids in changes if version > last_version]
+    # Первое чтение или пропущено больше версий, чем хранит снимок
+    if not last_version or not missed or changes[-len(missed)][0] != last_version + 1:
+        return None
+
+    changed_ids = set()
+    for ids in missed:
+        if ids is None:
+            return None
+        changed_ids.update(ids)
+    return changed_ids
+
+
+async def broadcast_shared_alerts(meta):
+    """Рассылка оповещений после последнего разосланного этим процессом"""
+    last_id = meta['alert_id']
+    if shared_live['alert_id'] is None:
+        # Оповещения до запуска процесса не рассылаем
+        shared_live['alert_id'] = last_id
+        return
+    if last_id is None or last_id <= shared_live['alert_id']:
+        return
+
+    alerts = [alert for alert in meta['alerts'] if alert['id'] > shared_live['alert_id']]
+    if not alerts or alerts[0]['id'] > shared_live['alert_id'] + 1:
+        # Пропущено больше, чем хранит снимок (или сменился сборщик) - из БД
+        loop = asyncio.get_event_loop()
+        rows = await loop.run_in_executor(
+            None, db.get_alerts_after, shared_live['alert_id'], ALERTS_MAX_LIMIT)
+        alerts = [dict(zip(ALERT_COLUMNS, row)) for row in rows if row[0] <= last_id]
+
+    shared_live['alert_id'] = last_id
+    if alerts:
+        manager.broadcast({"type": "alerts", "data": alerts},
+                          kind='alerts', replaceable=False)
+
+
+async def apply_live_snapshot(version, sections):
+    """Рассылка своим клиентам кадров из прочитанного снимка;
+    возвращает матчи, измененные после прошлой прочитанной версии"""
+    meta = json.loads(bytes(sections[0]))
+    frames = {serializers.WS_JSON: bytes(sections[1]).decode('utf-8')}
+    if len(sections) > 2:
+        frames[serializers.WS_MSGPACK] = bytes(sections[2])
+
+    shared_live['table_frame'] = frames[serializers.WS_JSON]
+    shared_live['matches'] = None
+    shared_live['chart_tails'] = meta['chart_tails']
+    manager.broadcast(None, frames=frames)
+    await broadcast_shared_alerts(meta)
+
+    changed_ids = changes_since(meta['changes'], shared_live['version'])
+    shared_live['version'] = version
+    return changed_ids
+
+
+def shared_matches():
+    """Таблица live-матчей из снимка (None - снимка нет или один процесс)"""
+    if not MULTI_WORKER_CONFIG['ENABLED'] or shared_live['table_frame'] is None:
+        return None
+    # Разбор JSON - один раз на версию снимка
+    if shared_live['matches'] is None:
+        shared_live['matches'] = json.loads(shared_live['table_frame'])['data']
+    return shared_live['matches']
+
+
+def live_projection(match_id, total_match_time):
+    """Прогноз тотала: у сборщика/единственного процесса - из модели, иначе из снимка"""
+    matches = shared_matches() if shared_live['writer'] is None else None
+    if matches is None:
+        return projection_tracker.snapshot(match_id, total_match_time)
+    for match in matches['matches']:
+        if match['id'] == match_id:
+            return match.get('projection')
+    return None
+
+
+async def shared_fanout():
+    """Слежение за версией live-снимка и рассылка своим клиентам (каждый процесс)"""
+    while True:
+        try:
+            version = snapshot_reader.version()
+            if version and version != shared_live['version']:
+                snapshot = snapshot_reader.read()
+                if snapshot is not None:
+                    changed_ids = await apply_live_snapshot(snapshot[0], snapshot[2])
+                    await manager.push_chart_points(changed_ids)
+        except Exception as e:
+            logging.error(f"Ошибка чтения live-снимка: {e}")
+        await asyncio.sleep(MULTI_WORKER_CONFIG['POLL_INTERVAL'])
+
+
+async def elect_builder():
+    """Ожидание блокировки сборщика; захвативший процесс читает БД и публикует снимок"""
+    while not builder_lock.try_acquire():
+        await asyncio.sleep(MULTI_WORKER_CONFIG['ELECTION_INTERVAL'])
+
+    logging.info(f"Процесс {os.getpid()} строит live-снимок")
+    shared_live['writer'] = live_snapshot.SnapshotWriter(
+        MULTI_WORKER_CONFIG['SNAPSHOT_FILE'], MULTI_WORKER_CONFIG['CAPACITY'])
+    metrics.set_gauge('live_snapshot_builder', 1)
+    if IPC_CONFIG['ENABLED']:
+        await tick_subscriber.start(IPC_CONFIG['HOST'], IPC_CONFIG['PORT'])
+    await broadcast_updates()
+
+
 # Запускаем при старте приложения
 @app.on_event("startup")
 async def startup_event():
+    if MULTI_WORKER_CONFIG['ENABLED']:
+        metrics.set_gauge('live_snapshot_builder', 0)
+        asyncio.create_task(elect_builder())
+        asyncio.create_task(shared_fanout())
+        return
+
+    if IPC_CONFIG['ENABLED']:
+        await tick_subscriber.start(IPC_CONFIG['HOST'], IPC_CONFIG['PORT'])
     asyncio.create_task(broadcast_updates())
 
 
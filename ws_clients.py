@@ -0,0 +1,142 @@
+"""
+Очереди отправки для WebSocket-клиентов: медленный клиент не задерживает
+рассылку остальным
+"""
+import asyncio
+import itertools
+import logging
+import time
+from collections import deque
+
+import metrics
+
+# Причины отключения клиента
+DISCONNECT_CLOSED = 'closed'
+DISCONNECT_BACKPRESSURE = 'backpressure'
+
+_client_ids = itertools.count(1)
+
+
+class ClientConnection:
+    """Ограниченная очередь и задача-писатель одного клиента"""
+
+    def __init__(self, websocket, encoding='json', queue_size=16, send_timeout=10.0,
+                 on_disconnect=None):
+        self.id = next(_client_ids)
+        self.websocket = websocket
+        # Формат кадров клиента: 'json' (текст) или 'msgpack' (бинарные)
+        self.encoding = encoding
+        self.queue_size = queue_size
+        self.send_timeout = send_timeout
+        self.on_disconnect = on_disconnect
+
+        # (kind, message, enqueued_at)
+        self.queue = deque()
+        self.has_messages = asyncio.Event()
+        self.writer_task = None
+        self.closed = False
+
+        # {match_id: id последней отправленной записи match_stats}
+        self.chart_subscriptions = {}
+
+        # Метрики
+        self.sent_messages = 0
+        self.dropped_messages = 0
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+
+    def start(self):
+        self.writer_task = asyncio.create_task(self._writer())
+
+    def enqueue(self, message, kind, replaceable=False):
+        """Постановка сообщения в очередь без ожидания.
+
+        replaceable - сообщение заменяет еще не отправленное сообщение того
+        же типа (устаревший снимок таблицы). Возвращает False, если очередь
+        переполнена и клиент не успевает читать.
+        """
+        if self.closed:
+            return False
+
+        if replaceable:
+            for index, (queued_kind, _, _) in enumerate(self.queue):
+                if queued_kind == kind:
+                    del self.queue[index]
+                    self.dropped_messages += 1
+                    metrics.inc('ws_dropped_messages_total', reason='superseded')
+                    break
+
+        if len(self.queue) >= self.queue_size:
+            metrics.inc('ws_dropped_messages_total', reason='queue_full')
+            return False
+
+        self.queue.append((kind, message, time.monotonic()))
+        self.has_messages.set()
+        return True
+
+    @property
+    def current_lag(self):
+        """Сколько ждет самое старое неотправленное сообщение (секунды)"""
+        if not self.queue:
+            return 0.0
+        return time.monotonic() - self.queue[0][2]
+
+    def stats(self):
+        return {
+            'client_id': self.id,
+            'queued': len(self.queue),
+            'current_lag': round(self.current_lag, 3),
+            'last_lag': round(self.last_lag, 3),
+            'max_lag': round(self.max_lag, 3),
+            'sent_messages': self.sent_messages,
+            'dropped_messages': self.dropped_messages,
+            'chart_subscriptions': len(self.chart_subscriptions)
+        }
+
+    async def close(self, reason=DISCONNECT_CLOSED):
+        """Остановка писателя и закрытие соединения"""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+
+        if self.writer_task and self.writer_task is not asyncio.current_task():
+            self.writer_task.cancel()
+
+        if reason == DISCONNECT_BACKPRESSURE:
+            try:
+                # 1013 - Try Again Later
+                await self.websocket.close(code=1013)
+            except Exception:
+                pass
+
+        if self.on_disconnect:
+            self.on_disconnect(self, reason)
+
+    async def _writer(self):
+        while not self.closed:
+            if not self.queue:
+                self.has_messages.clear()
+                await self.has_messages.wait()
+                continue
+
+            kind, message, enqueued_at = self.queue.popleft()
+            if isinstance(message, bytes):
+                send = self.websocket.send_bytes(message)
+            else:
+                send = self.websocket.send_text(message)
+
+            try:
+                await asyncio.wait_for(send, self.send_timeout)
+            except asyncio.TimeoutError:
+                logging.warning(
+                    f"WebSocket клиент #{self.id} не успевает читать, отключаем")
+                await self.close(DISCONNECT_BACKPRESSURE)
+                return
+            except Exception:
+                await self.close(DISCONNECT_CLOSED)
+                return
+
+            self.sent_messages += 1
+            self.last_lag = time.monotonic() - enqueued_at
+            self.max_lag = max(self.max_lag, self.last_lag)